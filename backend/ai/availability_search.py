@@ -0,0 +1,96 @@
+# ai/availability_search.py
+"""
+Recherche du premier créneau disponible tous médecins confondus.
+
+L'occupation de tous les médecins éligibles sur l'horizon est lue en une seule
+requête indexée ($in sur medecin_id, plage de dates). Chaque médecin fournit
+ensuite un générateur paresseux de ses débuts libres, déjà triés par date puis
+heure (index d'intervalles de la journée) ; `heapq.merge` fusionne ces flux et
+la recherche s'arrête dès que les k premiers créneaux globaux sont trouvés.
+"""
+
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import db
+from ai.interval_index import minutes_to_time
+from utils import occupancy
+
+users_collection = db["users"]
+
+DEFAULT_HORIZON_DAYS = 14
+
+
+def eligible_doctor_ids(medecin_ids: Optional[List[str]] = None) -> Dict[str, str]:
+    """Médecins éligibles : {medecin_id: nom} (tous les médecins si aucune liste)"""
+    doctors = {
+        str(user["_id"]): user.get("nom", "")
+        for user in users_collection.find({"role": "medecin"}, {"nom": 1})
+    }
+    if medecin_ids:
+        return {mid: doctors.get(mid, "") for mid in medecin_ids}
+    return doctors
+
+
+def _working_days(start: datetime, horizon_days: int) -> List[str]:
+    days = []
+    for offset in range(horizon_days):
+        current = (start + timedelta(days=offset)).date()
+        if current.weekday() < 5:
+            days.append(current.strftime("%Y-%m-%d"))
+    return days
+
+
+def _doctor_starts(medecin_id: str, days: List[str], day_docs: Dict[str, dict],
+                   duree: int, today: str, now_minutes: int) -> Iterator[Tuple[str, int, int, str]]:
+    """Débuts libres d'un médecin, triés : (date, minutes, charge du jour, medecin_id)"""
+    for date_str in days:
+        doc = day_docs.get(date_str)
+        load = doc.get("count", 0) if doc else 0
+        after = now_minutes + 1 if date_str == today else 0
+        for start in occupancy.day_intervals(doc).fitting_starts(duree, after):
+            yield (date_str, start, load, medecin_id)
+
+
+def find_first_available(medecin_ids: Optional[List[str]] = None,
+                         duree: int = occupancy.DEFAULT_DURATION,
+                         horizon_days: int = DEFAULT_HORIZON_DAYS,
+                         limit: int = 5,
+                         now: Optional[datetime] = None) -> Dict:
+    """
+    Les `limit` créneaux les plus proches, tous médecins confondus, où loge
+    une consultation de `duree` minutes. À heure égale, le médecin le moins
+    chargé ce jour-là passe en premier.
+    """
+    now = now or datetime.now()
+    doctors = eligible_doctor_ids(medecin_ids)
+    days = _working_days(now, horizon_days)
+    if not doctors or not days:
+        return {"slots": [], "doctors_searched": len(doctors)}
+
+    # Une seule lecture pour tous les médecins et tout l'horizon
+    by_doctor: Dict[str, Dict[str, dict]] = {mid: {} for mid in doctors}
+    for doc in occupancy.find_days(list(doctors), days[0], days[-1]):
+        by_doctor.setdefault(doc["medecin_id"], {})[doc["date"]] = doc
+
+    today = now.strftime("%Y-%m-%d")
+    now_minutes = now.hour * 60 + now.minute
+    streams = [
+        _doctor_starts(mid, days, by_doctor.get(mid, {}), duree, today, now_minutes)
+        for mid in doctors
+    ]
+
+    slots = [
+        {
+            "medecin_id": medecin_id,
+            "medecin_nom": doctors.get(medecin_id, ""),
+            "date": date_str,
+            "time": minutes_to_time(start),
+            "duree": duree,
+            "day_load": load
+        }
+        for date_str, start, load, medecin_id in islice(heapq.merge(*streams), limit)
+    ]
+    return {"slots": slots, "doctors_searched": len(doctors)}
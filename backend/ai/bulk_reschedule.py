@@ -0,0 +1,302 @@
+# ai/bulk_reschedule.py
+"""
+Reprogrammation en masse des rendez-vous d'un médecin absent.
+
+1. Les RDV actifs du médecin sur la période d'absence sont chargés en une requête.
+2. Les créneaux candidats (même médecin hors absence, ou médecins remplaçants)
+   sont dérivés de l'occupation et de l'index d'intervalles de chaque journée.
+3. Pour chaque classe de durée (des plus longues aux plus courtes), les
+   fenêtres libres sont découpées en blocs disjoints et une affectation de coût
+   minimal RDV -> bloc est calculée (scipy.optimize.linear_sum_assignment).
+   Le coût pondère le décalage par l'urgence du motif et pénalise le
+   changement de médecin. Il n'est calculé, pour chaque RDV, que sur les
+   blocs les plus proches de son horaire chez chaque médecin : aucune
+   matrice RDV x blocs complète n'est construite.
+4. Le plan est appliqué en un seul `bulk_write` ; les créneaux pris entre-temps
+   (index unique des créneaux actifs) sont signalés comme échecs.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import db
+from ai import schedule_bitmap as bitmap
+from ai.interval_index import DayIntervals, minutes_to_time, STEP
+from ai.availability_search import eligible_doctor_ids
+from ai.workload_heatmap import working_days
+from utils import occupancy, doctor_patterns, counters
+from utils.booking import slot_fields
+from utils.response_cache import response_cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+rendezvous_collection = db["rendezvous"]
+
+# Catégories d'urgence de `_analyze_motif_priority` (urgent/modere/routine),
+# déduites ici des catégories de motif sans appel IA par rendez-vous
+URGENCY_BY_CATEGORY = {
+    "urgence": "urgent",
+    "douleur": "modere",
+    "infection": "modere",
+}
+URGENCY_WEIGHTS = {"urgent": 10.0, "modere": 3.0, "routine": 1.0}
+SUBSTITUTE_PENALTY_HOURS = 2.0  # Préférence pour le médecin habituel
+EARLIER_DISCOUNT = 0.5  # Avancer un RDV coûte moins que le retarder
+CANDIDATES_PER_RDV = 20  # Blocs les moins coûteux retenus par RDV avant affectation
+
+
+def motif_urgency(motif: Optional[str]) -> str:
+    return URGENCY_BY_CATEGORY.get(doctor_patterns.simplify_motif(motif or ""), "routine")
+
+
+def _rdv_datetime(rdv: dict) -> Optional[datetime]:
+    minutes = bitmap.time_to_minutes(rdv.get("heure", ""))
+    try:
+        day = datetime.strptime(occupancy.format_rdv_date(rdv["date_rendez_vous"]), "%Y-%m-%d")
+    except ValueError:
+        return None
+    return day + timedelta(minutes=minutes or 0)
+
+
+def _blocks(intervals: DayIntervals, duration: int, after: int) -> List[int]:
+    """Débuts de blocs disjoints de `duration` minutes dans les fenêtres libres"""
+    starts = []
+    for window_start, window_end in intervals.free_windows(after):
+        start = bitmap.DAY_START_MINUTES + -(-(window_start - bitmap.DAY_START_MINUTES) // STEP) * STEP
+        while start + duration <= window_end:
+            starts.append(start)
+            start += duration
+    return starts
+
+
+def _shift_costs(candidate_times: np.ndarray, substitute: np.ndarray,
+                 original_times: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Coût (heures de décalage pondérées par l'urgence) de chaque RDV vers les blocs donnés"""
+    shift = candidate_times - original_times[:, None]
+    shift = np.where(shift < 0, -shift * EARLIER_DISCOUNT, shift)
+    return (weights[:, None] * shift + SUBSTITUTE_PENALTY_HOURS * substitute).astype(np.float32)
+
+
+def _shortlists(original_times: np.ndarray, weights: np.ndarray,
+                candidate_times: np.ndarray, substitute: np.ndarray,
+                by_doctor: List[np.ndarray], free: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pour chaque RDV, les CANDIDATES_PER_RDV blocs libres les moins coûteux,
+    sans matrice RDV x blocs complète : à médecin fixé, le coût croît avec
+    l'écart d'horaire de part et d'autre de l'horaire d'origine, les meilleurs
+    blocs d'un médecin sont donc parmi les k plus proches de chaque côté.
+    Retourne (colonnes, coûts), deux tableaux (RDV x candidats).
+    """
+    k = CANDIDATES_PER_RDV
+    windows = []
+    for columns in by_doctor:  # blocs d'un médecin, triés par horaire
+        columns = columns[free[columns]]
+        if not columns.size:
+            continue
+        width = min(2 * k, columns.size)
+        nearest = np.searchsorted(candidate_times[columns], original_times)
+        first = np.clip(nearest - k, 0, columns.size - width)
+        windows.append(columns[first[:, None] + np.arange(width)])
+    cols = np.hstack(windows)
+    costs = _shift_costs(candidate_times[cols], substitute[cols], original_times, weights)
+    if cols.shape[1] > k:
+        best = np.argpartition(costs, k - 1, axis=1)[:, :k]
+        cols = np.take_along_axis(cols, best, axis=1)
+        costs = np.take_along_axis(costs, best, axis=1)
+    return cols, costs
+
+
+def _min_cost_assignment(original_times: np.ndarray, weights: np.ndarray,
+                         candidate_times: np.ndarray, substitute: np.ndarray,
+                         doctor_codes: np.ndarray) -> List[Tuple[int, int, float]]:
+    """
+    Affectation de coût minimal RDV -> blocs : (ligne, colonne, coût).
+    Chaque tour ne soumet au solveur que l'union des meilleurs blocs libres de
+    chaque RDV restant (matrice réduite) ; les RDV non servis passent au tour suivant.
+    """
+    from scipy.optimize import linear_sum_assignment  # Import à la demande (démarrage rapide)
+
+    order = np.lexsort((candidate_times, doctor_codes))
+    by_doctor = np.split(order, np.flatnonzero(np.diff(doctor_codes[order])) + 1)
+
+    pairs = []
+    rows_left = np.arange(original_times.size)
+    free = np.ones(candidate_times.size, dtype=bool)
+    while rows_left.size and free.any():
+        cols, costs = _shortlists(
+            original_times[rows_left], weights[rows_left],
+            candidate_times, substitute, by_doctor, free
+        )
+        shortlist, position = np.unique(cols, return_inverse=True)
+        # Paires hors liste : coût prohibitif, écartées après résolution
+        unlisted = float(costs.max()) * 2 + 1
+        sub = np.full((rows_left.size, shortlist.size), unlisted, dtype=np.float32)
+        sub[np.arange(rows_left.size)[:, None], position.reshape(cols.shape)] = costs
+        rows, picked = linear_sum_assignment(sub)
+        listed = sub[rows, picked] < unlisted
+        rows, picked = rows[listed], picked[listed]
+        chosen = shortlist[picked]
+        pairs.extend(zip(rows_left[rows].tolist(), chosen.tolist(), sub[rows, picked].tolist()))
+        free[chosen] = False
+        rows_left = np.delete(rows_left, rows)
+    return pairs
+
+
+def plan_reschedule(medecin_id: str, date_from: str, date_to: str,
+                    substitute_ids: Optional[List[str]] = None,
+                    horizon_days: int = 14,
+                    now: Optional[datetime] = None) -> Dict:
+    """Calcule le plan de reprogrammation (sans l'appliquer)"""
+    now = now or datetime.now()
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    absence_days = set(working_days(start, end))
+
+    appointments = [
+        rdv for rdv in rendezvous_collection.find({
+            "medecin_id": medecin_id,
+            "date_rendez_vous": {"$gte": date_from, "$lte": date_to},
+            "statut": {"$ne": occupancy.CANCELLED_STATUS}
+        })
+        if (_rdv_datetime(rdv) or now) >= now
+    ]
+    if not appointments:
+        return {"assignments": [], "unassigned": []}
+
+    # Candidats : remplaçants sur toute la fenêtre, médecin absent hors absence
+    if substitute_ids is None:
+        substitute_ids = [mid for mid in eligible_doctor_ids() if mid != medecin_id]
+    doctors = [medecin_id] + [mid for mid in substitute_ids if mid != medecin_id]
+
+    first_day = max(start, datetime(now.year, now.month, now.day))
+    days = working_days(first_day, end + timedelta(days=horizon_days))
+    if not days:
+        return {"assignments": [], "unassigned": [str(rdv["_id"]) for rdv in appointments]}
+
+    busy: Dict[Tuple[str, str], DayIntervals] = {}
+    for doc in occupancy.find_days(doctors, days[0], days[-1]):
+        busy[(doc["medecin_id"], doc["date"])] = occupancy.day_intervals(doc)
+
+    today = now.strftime("%Y-%m-%d")
+    now_minutes = now.hour * 60 + now.minute
+    cells = [
+        (mid, day) for mid in doctors for day in days
+        if not (mid == medecin_id and day in absence_days)
+    ]
+
+    # Classes de durée, des plus longues aux plus courtes (découpage en blocs disjoints)
+    by_duration: Dict[int, List[dict]] = {}
+    for rdv in appointments:
+        slots = -(-occupancy.rdv_duration(rdv) // STEP)
+        by_duration.setdefault(slots * STEP, []).append(rdv)
+
+    assignments, unassigned = [], []
+    for duration in sorted(by_duration, reverse=True):
+        group = by_duration[duration]
+
+        candidates = []  # (medecin_id, date, début en minutes)
+        for mid, day in cells:
+            intervals = busy.get((mid, day)) or DayIntervals()
+            after = now_minutes + 1 if day == today else bitmap.DAY_START_MINUTES
+            candidates.extend((mid, day, b) for b in _blocks(intervals, duration, after))
+        if not candidates:
+            unassigned.extend(str(rdv["_id"]) for rdv in group)
+            continue
+
+        # Horaires en heures depuis maintenant ; les coûts ne sont calculés que pour les blocs proches
+        day_offsets = {day: datetime.strptime(day, "%Y-%m-%d") for day in days}
+        candidate_times = np.array([
+            (day_offsets[day] + timedelta(minutes=b) - now).total_seconds() / 3600
+            for _, day, b in candidates
+        ])
+        doctor_index = {mid: i for i, mid in enumerate(doctors)}
+        doctor_codes = np.array([doctor_index[mid] for mid, _, _ in candidates])
+        substitute = doctor_codes != doctor_index[medecin_id]
+        original_times = np.array([
+            ((_rdv_datetime(rdv) or now) - now).total_seconds() / 3600 for rdv in group
+        ])
+        weights = np.array([URGENCY_WEIGHTS[motif_urgency(rdv.get("motif"))] for rdv in group])
+
+        pairs = _min_cost_assignment(original_times, weights, candidate_times, substitute, doctor_codes)
+        assigned_rows = {row for row, _, _ in pairs}
+        for row, col, cost in pairs:
+            rdv = group[row]
+            mid, day, b = candidates[col]
+            assignments.append({
+                "rendezvous": rdv,
+                "medecin_id": mid,
+                "date_rendez_vous": day,
+                "heure": minutes_to_time(b),
+                "urgency": motif_urgency(rdv.get("motif")),
+                "cost": round(cost, 2)
+            })
+            # Le bloc est désormais occupé pour les classes de durée suivantes
+            current = busy.get((mid, day)) or DayIntervals()
+            busy[(mid, day)] = DayIntervals(
+                list(zip(current.starts, current.ends)) + [(b, b + duration)]
+            )
+        unassigned.extend(
+            str(rdv["_id"]) for i, rdv in enumerate(group) if i not in assigned_rows
+        )
+
+    return {"assignments": assignments, "unassigned": unassigned}
+
+
+def apply_reschedule(assignments: List[Dict]) -> Dict:
+    """Applique le plan en un seul bulk_write et met à jour l'occupation"""
+    if not assignments:
+        return {"moved": [], "failed": []}
+
+    operations, moves = [], []
+    for item in assignments:
+        old = item["rendezvous"]
+        new = {
+            **old,
+            "medecin_id": item["medecin_id"],
+            "date_rendez_vous": item["date_rendez_vous"],
+            "heure": item["heure"]
+        }
+        to_set, to_unset = slot_fields(new)
+        update = {"$set": {
+            "medecin_id": new["medecin_id"],
+            "date_rendez_vous": new["date_rendez_vous"],
+            "heure": new["heure"],
+            "reprogramme_de": {
+                "medecin_id": old["medecin_id"],
+                "date_rendez_vous": occupancy.format_rdv_date(old["date_rendez_vous"]),
+                "heure": old.get("heure")
+            },
+            **to_set
+        }}
+        if to_unset:
+            update["$unset"] = to_unset
+        operations.append(UpdateOne({"_id": old["_id"]}, update))
+        moves.append((old, new))
+
+    failed_indexes = set()
+    try:
+        rendezvous_collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Créneaux réservés entre le calcul et l'application (index unique)
+        failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+        logger.warning(f"Reprogrammation: {len(failed_indexes)} RDV non déplacés (conflits)")
+
+    moved, failed = [], []
+    for i, (old, new) in enumerate(moves):
+        if i in failed_indexes:
+            failed.append(str(old["_id"]))
+            continue
+        occupancy.replace_rendezvous(old, new)
+        counters.replace_rendezvous(old, new)
+        moved.append(str(old["_id"]))
+
+    touched = {str(old["medecin_id"]) for old, _ in moves} | {str(new["medecin_id"]) for _, new in moves}
+    doctor_patterns.mark_stale(*touched)
+    response_cache.invalidate("rendezvous", *touched)
+    return {"moved": moved, "failed": failed}
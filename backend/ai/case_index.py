@@ -0,0 +1,251 @@
+# ai/case_index.py
+"""
+Index local de cas similaires pour l'IA diagnostique.
+
+Les suggestions IA validées par un médecin (`ai_suggestions` avec `validated=True`
+et un `selected_diagnostic`) sont projetées dans un espace vectoriel NumPy
+(n-grammes de caractères et mots hachés, pondération log, normalisation L2).
+`/api/ai/diagnostic` interroge cet index avant d'appeler Gemini : si un cas
+validé est assez proche (similarité cosinus >= seuil) et concerne le même
+profil patient (tranche d'âge et sexe), il est renvoyé immédiatement.
+La similarité porte sur le texte, pas sur le diagnostic : elle est renvoyée
+à part (`similarite`) et ne remplace pas la probabilité du diagnostic.
+
+L'index est construit au premier usage puis mis à jour de façon incrémentale
+à chaque validation.
+"""
+
+import re
+import threading
+import unicodedata
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import AI_CASE_INDEX_DIM
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (3, 4, 5)
+WORD_WEIGHT = 2.0
+# Probabilité affichée quand le cas validé ne porte pas celle de l'IA
+NEUTRAL_PROBABILITY = 50
+# Bornes (exclues) des tranches d'âge du profil patient
+AGE_BANDS = ((2, "nourrisson"), (15, "enfant"), (65, "adulte"))
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules, sans accents, ponctuation remplacée par des espaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+def case_text(motif: str, symptomes: str) -> str:
+    return f"{motif or ''} {symptomes or ''}"
+
+
+def age_band(date_naissance, at: Optional[datetime] = None) -> Optional[str]:
+    """Tranche d'âge à la date `at` (None si la date de naissance est inconnue)"""
+    try:
+        birth = datetime.strptime(str(date_naissance)[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+    age = ((at or datetime.now()) - birth).days // 365
+    return next((band for limit, band in AGE_BANDS if age < limit), "senior")
+
+
+def patient_profile(patient_info: Optional[Dict], at: Optional[datetime] = None) -> Tuple:
+    """Clé de filtrage des cas : (tranche d'âge, sexe)"""
+    patient_info = patient_info or {}
+    sexe = str(patient_info.get("sexe") or "").strip().upper()[:1] or None
+    return age_band(patient_info.get("date_naissance"), at), sexe
+
+
+class SimilarCaseIndex:
+    """Index vectoriel en mémoire des cas diagnostiques validés"""
+
+    def __init__(self, dim: int = AI_CASE_INDEX_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((64, dim), dtype=np.float32)
+        self._size = 0
+        self._cases: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._profiles = np.zeros(64, dtype=np.int32)
+        self._profile_codes: Dict[Tuple, int] = {}
+        self._loaded = False
+
+    def embed(self, text: str) -> np.ndarray:
+        """Vecteur haché (signé) des n-grammes de caractères et des mots"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = normalize_text(text).split()
+        features: List[Tuple[str, float]] = [("w:" + w, WORD_WEIGHT) for w in words]
+        for word in words:
+            padded = f" {word} "
+            for n in NGRAM_SIZES:
+                for i in range(len(padded) - n + 1):
+                    features.append((padded[i:i + n], 1.0))
+
+        for feature, weight in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % self.dim] += sign * weight
+
+        # Pondération sous-linéaire puis normalisation L2
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def _case_from_doc(self, doc: dict) -> Optional[Dict]:
+        if not doc.get("validated") or not doc.get("selected_diagnostic"):
+            return None
+        input_data = doc.get("input_data") or {}
+        motif = input_data.get("motif", "")
+        symptomes = input_data.get("symptomes", "")
+        if not (motif or symptomes):
+            return None
+        return {
+            "id": str(doc["_id"]),
+            "motif": motif,
+            "symptomes": symptomes,
+            "profile": patient_profile(input_data.get("patient_info") or input_data, doc.get("created_at")),
+            "selected_diagnostic": doc["selected_diagnostic"],
+            "ai_response": doc.get("ai_response") or {},
+        }
+
+    def _add_locked(self, case: Dict) -> None:
+        vector = self.embed(case_text(case["motif"], case["symptomes"]))
+        row = self._rows.get(case["id"])
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                grown = np.zeros((self._matrix.shape[0] * 2, self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+                self._profiles = np.resize(self._profiles, self._matrix.shape[0])
+            row = self._size
+            self._size += 1
+            self._rows[case["id"]] = row
+            self._cases.append(case)
+        else:
+            self._cases[row] = case
+        self._matrix[row] = vector
+        self._profiles[row] = self._profile_codes.setdefault(case["profile"], len(self._profile_codes))
+
+    def load(self, collection) -> None:
+        """(Re)construit l'index depuis la collection `ai_suggestions`"""
+        cursor = collection.find(
+            {"validated": True, "selected_diagnostic": {"$nin": [None, ""]}},
+            {"input_data": 1, "ai_response": 1, "selected_diagnostic": 1, "validated": 1, "created_at": 1}
+        )
+        with self._lock:
+            self._matrix = np.zeros((64, self.dim), dtype=np.float32)
+            self._size = 0
+            self._cases = []
+            self._rows = {}
+            self._profiles = np.zeros(64, dtype=np.int32)
+            self._profile_codes = {}
+            for doc in cursor:
+                case = self._case_from_doc(doc)
+                if case:
+                    self._add_locked(case)
+            self._loaded = True
+        logger.info(f"Index de cas similaires construit: {self._size} cas validés")
+
+    def ensure_loaded(self, collection) -> None:
+        if not self._loaded:
+            self.load(collection)
+
+    def add(self, doc: dict) -> bool:
+        """Ajoute ou met à jour un cas validé (mise à jour incrémentale)"""
+        case = self._case_from_doc(doc)
+        if not case or not self._loaded:
+            # Non chargé : le cas sera pris en compte à la construction complète
+            return False
+        with self._lock:
+            self._add_locked(case)
+        return True
+
+    def search(self, motif: str, symptomes: str, top_k: int = 3,
+               profile: Optional[Tuple] = None) -> List[Tuple[float, Dict]]:
+        """
+        Retourne les `top_k` cas les plus proches avec leur similarité,
+        restreints au profil patient `profile` s'il est fourni
+        """
+        if not self._size:
+            return []
+        query = self.embed(case_text(motif, symptomes))
+        with self._lock:
+            scores = self._matrix[:self._size] @ query
+            cases = list(self._cases)
+            if profile is not None:
+                code = self._profile_codes.get(profile)
+                rows = np.flatnonzero(self._profiles[:self._size] == code) if code is not None else []
+                scores = scores[rows]
+                cases = [cases[i] for i in rows]
+        if not cases:
+            return []
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), cases[i]) for i in best]
+
+    def best_match(self, collection, motif: str, symptomes: str, threshold: float,
+                   patient_info: Optional[Dict] = None) -> Optional[Tuple[float, Dict]]:
+        """Meilleur cas validé du même profil patient si sa similarité atteint le seuil, sinon None"""
+        self.ensure_loaded(collection)
+        results = self.search(motif, symptomes, top_k=1, profile=patient_profile(patient_info))
+        if results and results[0][0] >= threshold:
+            return results[0]
+        return None
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def response_from_case(case: Dict, similarity: float) -> Dict:
+    """
+    Construit une réponse de diagnostic à partir d'un cas validé :
+    le diagnostic retenu par le médecin est placé en tête
+    """
+    ai_response = case.get("ai_response") or {}
+    selected = case["selected_diagnostic"]
+    explication = (
+        f"Cas similaire validé par un médecin (similarité {round(similarity * 100)}%)"
+    )
+
+    required = ("nom", "probabilite", "explication", "examens_recommandes")
+    diagnostics = [
+        d for d in ai_response.get("diagnostics", [])
+        if isinstance(d, dict) and all(k in d for k in required)
+    ]
+    validated = next((d for d in diagnostics if d.get("nom") == selected), None)
+    others = [d for d in diagnostics if d is not validated]
+
+    # La similarité du texte n'est pas une probabilité diagnostique : celle de l'IA est conservée
+    first = {
+        "nom": selected,
+        "probabilite": validated.get("probabilite", NEUTRAL_PROBABILITY) if validated else NEUTRAL_PROBABILITY,
+        "explication": validated.get("explication", explication) if validated else explication,
+        "examens_recommandes": validated.get("examens_recommandes", []) if validated else [],
+    }
+
+    return {
+        "diagnostics": [first] + others,
+        "recommandations_generales": ai_response.get(
+            "recommandations_generales",
+            "Diagnostic issu d'un cas similaire validé - à confirmer cliniquement"
+        ),
+        "niveau_urgence": ai_response.get("niveau_urgence", "Modéré"),
+        "similarite": round(similarity * 100),
+    }
+
+
+similar_case_index = SimilarCaseIndex()
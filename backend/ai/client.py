@@ -0,0 +1,138 @@
+# ai/client.py
+"""
+Registre partagé des clients IA (Gemini) pour tout le processus.
+
+- Le SDK est importé et configuré une seule fois (`load_genai`).
+- Un `GenerativeModel` est construit une seule fois par cas d'usage puis réutilisé :
+  plus de construction de modèle à chaque appel, et tous les modèles partagent
+  le même canal de transport du SDK.
+- Chaque cas d'usage porte son niveau de modèle (light/default/heavy) et sa
+  configuration de génération.
+- `run_ai_call` exécute un appel IA bloquant hors de la boucle d'événements,
+  dans la limite de AI_MAX_CONCURRENCY appels simultanés.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Dict
+
+from config import GEMINI_MODEL, GEMINI_LIGHT_MODEL, GEMINI_HEAVY_MODEL, AI_MAX_CONCURRENCY
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_TIERS = {
+    "light": GEMINI_LIGHT_MODEL,
+    "default": GEMINI_MODEL,
+    "heavy": GEMINI_HEAVY_MODEL,
+}
+
+# Niveau de modèle et configuration de génération par cas d'usage
+USE_CASES: Dict[str, Dict] = {
+    "diagnostic": {
+        "tier": "default",
+        "generation_config": None,
+    },
+    "motif_analysis": {
+        "tier": "light",
+        # Le JSON du motif contient un texte libre (reasoning) et une liste d'exigences :
+        # plafond large pour ne jamais tronquer la réponse (une troncature = échec de parsing)
+        "generation_config": {"temperature": 0.2, "max_output_tokens": 2048},
+    },
+    "duration_estimate": {
+        "tier": "light",
+        "generation_config": {"temperature": 0.1, "max_output_tokens": 16},
+    },
+    "smart_datetime": {
+        "tier": "default",
+        "generation_config": None,
+    },
+    "slot_suggestion": {
+        "tier": "default",
+        "generation_config": None,
+    },
+    "patient_summary": {
+        "tier": "heavy",
+        # Plus conservateur pour du médical
+        "generation_config": {
+            "temperature": 0.3,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": 2048,
+        },
+    },
+}
+
+_genai_lock = threading.Lock()
+_genai_configured = False
+
+
+def load_genai():
+    """
+    Importe et configure le SDK google.generativeai à la première utilisation.
+    L'import (gRPC, protobuf) est lourd : il ne doit pas ralentir le démarrage des workers.
+    """
+    global _genai_configured
+    import google.generativeai as genai
+
+    if not _genai_configured:
+        with _genai_lock:
+            if not _genai_configured:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY n'est pas définie dans les variables d'environnement")
+                genai.configure(api_key=api_key)
+                _genai_configured = True
+
+    return genai
+
+
+class AIClientRegistry:
+    """Modèles Gemini réutilisables, un par cas d'usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def model_name_for(self, use_case: str) -> str:
+        tier = USE_CASES.get(use_case, {}).get("tier", "default")
+        return MODEL_TIERS.get(tier, GEMINI_MODEL)
+
+    def model_for(self, use_case: str):
+        """Retourne le GenerativeModel (mis en cache) du cas d'usage"""
+        model = self._models.get(use_case)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(use_case)
+            if model is None:
+                genai = load_genai()
+                config = USE_CASES.get(use_case, {}).get("generation_config")
+                model_name = self.model_name_for(use_case)
+                model = genai.GenerativeModel(
+                    model_name,
+                    generation_config=genai.types.GenerationConfig(**config) if config else None
+                )
+                self._models[use_case] = model
+                logger.info(f"Modèle IA '{model_name}' initialisé pour '{use_case}'")
+        return model
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+ai_clients = AIClientRegistry()
+
+
+# Limite de concurrence des appels IA (par worker)
+ai_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+
+
+async def run_ai_call(func, *args, **kwargs):
+    """Exécute un appel IA synchrone dans un thread, sous la limite de concurrence"""
+    async with ai_semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
@@ -0,0 +1,54 @@
+# ai/dependencies.py
+"""
+Fournisseurs FastAPI (Depends) des services IA.
+
+Les services ne sont plus instanciés à l'import des routes : ils sont construits
+au premier appel d'une route IA, puis réutilisés par tout le processus.
+Le démarrage des workers (et des tests) n'importe donc plus le SDK Gemini et
+ne dépend plus de la présence de GEMINI_API_KEY.
+"""
+
+import threading
+
+from fastapi import HTTPException, status
+
+from ai.gemini_service import GeminiService
+from ai.planning_service import PlanningService
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_services = {}
+
+
+def _get_or_create(name: str, factory):
+    service = _services.get(name)
+    if service is not None:
+        return service
+
+    with _lock:
+        service = _services.get(name)
+        if service is None:
+            try:
+                service = factory()
+            except ValueError as e:
+                # Configuration manquante (ex: GEMINI_API_KEY)
+                logger.error(f"Service IA '{name}' indisponible: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Service IA indisponible: {str(e)}"
+                )
+            _services[name] = service
+    return service
+
+
+def get_gemini_service() -> GeminiService:
+    """Dépendance FastAPI : service de diagnostic Gemini (construit à la demande)"""
+    return _get_or_create("gemini", GeminiService)
+
+
+def get_planning_service() -> PlanningService:
+    """Dépendance FastAPI : service de planification IA (construit à la demande)"""
+    return _get_or_create("planning", PlanningService)
@@ -1,10 +1,12 @@
-import google.generativeai as genai
 import os
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from ai.instrumentation import track_ai_call
+from ai.client import ai_clients
+
 logger = logging.getLogger(__name__)
 
 class GeminiService:
@@ -13,8 +15,9 @@ class GeminiService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY n'est pas définie dans les variables d'environnement")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Modèle partagé par le processus (registre des clients IA)
+        self.model = ai_clients.model_for("diagnostic")
+        self.model_name = ai_clients.model_name_for("diagnostic")
         
     def generate_diagnostic_suggestions(self, patient_info: Dict, consultation_data: Dict) -> Dict:
         """
@@ -24,17 +27,19 @@ class GeminiService:
             # Construire le prompt médical
             prompt = self._build_medical_prompt(patient_info, consultation_data)
             
-            # Générer la réponse avec Gemini
-            response = self.model.generate_content(prompt)
-            
-            # Parser la réponse JSON
-            suggestions = self._parse_gemini_response(response.text)
+            with track_ai_call("diagnostic") as call:
+                # Générer la réponse avec Gemini
+                response = self.model.generate_content(prompt)
+                call.record_response(response)
+                
+                # Parser la réponse JSON
+                suggestions = self._parse_gemini_response(response.text, call)
             
             return {
                 "success": True,
                 "suggestions": suggestions,
                 "timestamp": datetime.utcnow().isoformat(),
-                "model_used": "gemini-1.5-flash"
+                "model_used": self.model_name
             }
             
         except Exception as e:
@@ -45,11 +50,45 @@ class GeminiService:
                 "suggestions": []
             }
     
-    def _build_medical_prompt(self, patient_info: Dict, consultation_data: Dict) -> str:
+    def generate_batch_diagnostic_suggestions(self, cases: List[Tuple[Dict, Dict]]) -> List[Dict]:
         """
-        Construit un prompt médical structuré pour Gemini
+        Génère les suggestions de plusieurs cas (patient_info, consultation_data)
+        en un seul prompt. Retourne un résultat par cas, dans l'ordre.
         """
-        # Calculer l'âge approximatif
+        if len(cases) == 1:
+            return [self.generate_diagnostic_suggestions(*cases[0])]
+        
+        try:
+            prompt = self._build_batch_medical_prompt(cases)
+            
+            with track_ai_call("diagnostic_batch") as call:
+                response = self.model.generate_content(prompt)
+                call.record_response(response)
+                parsed_cases = self._parse_batch_response(response.text, len(cases), call)
+            
+            results = []
+            for index, suggestions in enumerate(parsed_cases):
+                if suggestions is None:
+                    # Cas absent de la réponse groupée : nouvel essai individuel
+                    results.append(self.generate_diagnostic_suggestions(*cases[index]))
+                else:
+                    results.append({
+                        "success": True,
+                        "suggestions": suggestions,
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "model_used": self.model_name
+                    })
+            return results
+            
+        except Exception as e:
+            logger.error(f"Erreur Gemini API (lot): {e}", exc_info=True)
+            return [
+                {"success": False, "error": str(e), "suggestions": []}
+                for _ in cases
+            ]
+    
+    def _age_info(self, patient_info: Dict) -> str:
+        """Calcule l'âge approximatif du patient pour le prompt"""
         age_info = ""
         if patient_info.get("date_naissance"):
             try:
@@ -58,6 +97,100 @@ class GeminiService:
                 age_info = f"Âge: {age} ans"
             except:
                 age_info = "Âge: Non spécifié"
+        return age_info
+    
+    def _build_batch_medical_prompt(self, cases: List[Tuple[Dict, Dict]]) -> str:
+        """
+        Construit un prompt regroupant plusieurs cas numérotés
+        """
+        cases_text = ""
+        for index, (patient_info, consultation_data) in enumerate(cases, 1):
+            cases_text += f"""
+CAS {index}:
+- {self._age_info(patient_info)}
+- Sexe: {patient_info.get('sexe', 'Non spécifié')}
+- Motif: {consultation_data.get('motif', '')}
+- Symptômes: {consultation_data.get('symptomes', '')}
+"""
+        
+        prompt = f"""
+Tu es un assistant médical IA spécialisé dans l'aide au diagnostic. Analyse indépendamment chacun des {len(cases)} cas suivants et propose des diagnostics différentiels probables.
+{cases_text}
+INSTRUCTIONS:
+1. Pour chaque cas, propose 3-4 diagnostics différentiels les plus probables
+2. Pour chaque diagnostic, fournis:
+   - Le nom du diagnostic
+   - Un score de probabilité (0-100)
+   - Une brève explication (2-3 lignes)
+   - 1-2 examens complémentaires recommandés
+
+3. Réponds UNIQUEMENT au format JSON suivant (aucun autre texte), avec un élément par cas:
+
+{{
+  "cas": [
+    {{
+      "numero": 1,
+      "diagnostics": [
+        {{
+          "nom": "Nom du diagnostic",
+          "probabilite": 85,
+          "explication": "Explication concise du diagnostic basée sur les symptômes",
+          "examens_recommandes": ["Examen 1", "Examen 2"]
+        }}
+      ],
+      "recommandations_generales": "Recommandations générales pour le patient",
+      "niveau_urgence": "Faible/Modéré/Élevé"
+    }}
+  ]
+}}
+
+IMPORTANT: 
+- Ne mélange pas les informations entre les cas
+- Base-toi uniquement sur les symptômes fournis
+- Privilégie les diagnostics les plus courants correspondant aux symptômes
+- Réponds en français
+"""
+        return prompt
+    
+    def _parse_batch_response(self, response_text: str, expected: int, call=None) -> List[Optional[Dict]]:
+        """
+        Parse la réponse groupée. Les cas manquants ou invalides valent None.
+        """
+        results: List[Optional[Dict]] = [None] * expected
+        try:
+            clean_response = response_text.strip()
+            if clean_response.startswith("```json"):
+                clean_response = clean_response[7:]
+            if clean_response.endswith("```"):
+                clean_response = clean_response[:-3]
+            
+            parsed_data = json.loads(clean_response)
+            for position, case in enumerate(parsed_data.get("cas", [])):
+                if not isinstance(case, dict) or "diagnostics" not in case:
+                    continue
+                try:
+                    index = int(case.pop("numero", position + 1)) - 1
+                except (TypeError, ValueError):
+                    index = position
+                if 0 <= index < expected:
+                    results[index] = case
+            
+            if call:
+                call.mark_parsed(all(r is not None for r in results))
+            
+        except Exception as e:
+            logger.error(f"Erreur parsing JSON (lot): {e}", extra={"response_text": response_text})
+            if call:
+                call.mark_parsed(False)
+        
+        return results
+    
+    def _build_medical_prompt(self, patient_info: Dict, consultation_data: Dict) -> str:
+        """
+        Construit un prompt médical structuré pour Gemini
+        """
+        # Calculer l'âge approximatif
+        age_info = self._age_info(patient_info)
         
         prompt = f"""
 Tu es un assistant médical IA spécialisé dans l'aide au diagnostic. Analyse les informations suivantes et propose des diagnostics différentiels probables.
@@ -101,9 +234,10 @@ IMPORTANT:
 """
         return prompt
     
-    def _parse_gemini_response(self, response_text: str) -> List[Dict]:
+    def _parse_gemini_response(self, response_text: str, call=None) -> List[Dict]:
         """
         Parse la réponse JSON de Gemini
+        `call` (optionnel) est la mesure en cours, marquée selon le succès du parsing
         """
         try:
             # Nettoyer la réponse (enlever les balises markdown si présentes)
@@ -120,10 +254,14 @@ IMPORTANT:
             if "diagnostics" not in parsed_data:
                 raise ValueError("Format de réponse invalide: 'diagnostics' manquant")
             
+            if call:
+                call.mark_parsed(True)
             return parsed_data
             
         except json.JSONDecodeError as e:
             logger.error(f"Erreur parsing JSON: {e}", extra={"response_text": response_text})
+            if call:
+                call.mark_parsed(False)
             
             # Fallback en cas d'erreur de parsing
             return {
@@ -139,6 +277,8 @@ IMPORTANT:
         
         except Exception as e:
             logger.error(f"Erreur générale parsing: {e}", exc_info=True)
+            if call:
+                call.mark_parsed(False)
             return {
                 "diagnostics": [],
                 "recommandations_generales": "Erreur lors de l'analyse",
@@ -216,21 +356,13 @@ async def generate_patient_summary(patient_data: dict) -> str:
         Réponds uniquement avec le contenu du résumé en markdown, sans introduction ni conclusion.
         """
 
-        # Génération avec Gemini
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Configuration pour un résumé médical
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.3,  # Plus conservateur pour du médical
-            top_p=0.8,
-            top_k=40,
-            max_output_tokens=2048,
-        )
-        
-        response = await model.generate_content_async(
-            prompt,
-            generation_config=generation_config
-        )
+        # Génération avec Gemini : modèle partagé, configuration "résumé médical"
+        model = ai_clients.model_for("patient_summary")
+        
+        with track_ai_call("patient_summary") as call:
+            response = await model.generate_content_async(prompt)
+            call.record_response(response)
+            call.mark_parsed(bool(response.text))
         
         if not response.text:
             raise Exception("Réponse vide de l'API Gemini")
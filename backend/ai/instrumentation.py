@@ -0,0 +1,168 @@
+# ai/instrumentation.py
+"""
+Instrumentation des appels au modèle IA (Gemini).
+
+Chaque appel est enveloppé dans `track_ai_call(caller)` qui mesure le temps réel,
+relève les tokens du prompt et de la réponse (usage_metadata), le succès du parsing
+JSON et les hits de cache. Les mesures sont agrégées par appelant
+(`diagnostic`, `motif_analysis`, `smart_datetime`, `patient_summary`, ...)
+et exposées sur l'endpoint admin `/api/ai/metrics`. Un hit de cache n'appelle
+pas le modèle : il est compté à part et exclu des latences et des tokens.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+# Nombre de latences conservées par appelant pour le calcul des percentiles
+LATENCY_WINDOW = 500
+
+
+class AICallRecord:
+    """Mesures d'un appel IA en cours"""
+
+    def __init__(self, caller: str):
+        self.caller = caller
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.parse_success: Optional[bool] = None
+        self.cache_hit = False
+        self.error: Optional[str] = None
+
+    def record_response(self, response) -> None:
+        """Relève les compteurs de tokens d'une réponse Gemini"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+        self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    def mark_parsed(self, success: bool) -> None:
+        self.parse_success = bool(success)
+
+    def mark_cache_hit(self) -> None:
+        self.cache_hit = True
+
+
+class _CallerStats:
+    """Agrégats pour un appelant"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.parse_failures = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.last_call_at: Optional[datetime] = None
+
+    @property
+    def model_calls(self) -> int:
+        """Appels ayant réellement interrogé le modèle"""
+        return self.calls - self.cache_hits
+
+    def add(self, record: AICallRecord, elapsed_ms: float) -> None:
+        self.calls += 1
+        self.last_call_at = datetime.utcnow()
+        if record.cache_hit:
+            self.cache_hits += 1
+            return
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.latencies.append(elapsed_ms)
+        self.prompt_tokens += record.prompt_tokens
+        self.output_tokens += record.output_tokens
+        if record.error:
+            self.errors += 1
+        if record.parse_success is False:
+            self.parse_failures += 1
+
+    def snapshot(self) -> Dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index], 1)
+
+        model_calls = self.model_calls
+        return {
+            "calls": self.calls,
+            "model_calls": model_calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / self.calls * 100, 1) if self.calls else 0,
+            "parse_failures": self.parse_failures,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / model_calls, 1) if model_calls else 0,
+            "avg_output_tokens": round(self.output_tokens / model_calls, 1) if model_calls else 0,
+            "latency_ms": {
+                "total": round(self.total_ms, 1),
+                "avg": round(self.total_ms / model_calls, 1) if model_calls else 0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(self.max_ms, 1),
+            },
+            "last_call_at": self.last_call_at.isoformat() if self.last_call_at else None,
+        }
+
+
+class AIMetrics:
+    """Registre des mesures IA, partagé par tout le processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _CallerStats] = {}
+        self._started_at = datetime.utcnow()
+
+    def record(self, record: AICallRecord, elapsed_ms: float) -> None:
+        with self._lock:
+            stats = self._stats.get(record.caller)
+            if stats is None:
+                stats = self._stats[record.caller] = _CallerStats()
+            stats.add(record, elapsed_ms)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            callers = {caller: stats.snapshot() for caller, stats in self._stats.items()}
+        return {
+            "since": self._started_at.isoformat(),
+            "callers": callers,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._started_at = datetime.utcnow()
+
+
+ai_metrics = AIMetrics()
+
+
+@contextmanager
+def track_ai_call(caller: str):
+    """
+    Mesure un appel IA :
+
+        with track_ai_call("diagnostic") as call:
+            response = model.generate_content(prompt)
+            call.record_response(response)
+            call.mark_parsed(...)
+    """
+    record = AICallRecord(caller)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = str(e)
+        raise
+    finally:
+        ai_metrics.record(record, (time.perf_counter() - start) * 1000)
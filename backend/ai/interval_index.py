@@ -0,0 +1,106 @@
+# ai/interval_index.py
+"""
+Index d'intervalles occupés pour une journée médecin.
+
+Les RDV ont une durée (`duree`, en minutes) : une journée est représentée par
+la liste triée et fusionnée de ses intervalles occupés [début, fin[ en minutes
+depuis minuit. Les intervalles étant disjoints et triés, une recherche
+dichotomique (bisect) suffit :
+- test de chevauchement d'un intervalle : O(log n)
+- premier créneau où loge une consultation de N minutes : O(log n + k)
+"""
+
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+from ai import schedule_bitmap as bitmap
+
+DAY_START = bitmap.DAY_START_MINUTES
+DAY_END = bitmap.DAY_START_MINUTES + bitmap.SLOT_COUNT * bitmap.SLOT_MINUTES  # 19:00
+STEP = bitmap.SLOT_MINUTES
+
+
+def minutes_to_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class DayIntervals:
+    """Intervalles occupés d'une journée, disjoints et triés"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        for start, end in sorted(i for i in intervals if i[1] > i[0]):
+            if self.ends and start <= self.ends[-1]:
+                # Chevauchement ou contiguïté : fusion
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def from_mask(cls, mask: int) -> "DayIntervals":
+        """Construit les intervalles à partir des suites de créneaux occupés"""
+        intervals = []
+        index = 0
+        mask &= bitmap.FULL_MASK
+        while mask >> index:
+            above = mask >> index
+            start = index + (above & -above).bit_length() - 1
+            run = ~(mask >> start)
+            length = (run & -run).bit_length() - 1
+            intervals.append((
+                DAY_START + start * STEP,
+                DAY_START + (start + length) * STEP
+            ))
+            index = start + length
+        return cls(intervals)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """L'intervalle [start, end[ chevauche-t-il un intervalle occupé ?"""
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            return True
+        return i + 1 < len(self.starts) and self.starts[i + 1] < end
+
+    def fits(self, start: Optional[int], duration: int) -> bool:
+        """Une consultation de `duration` minutes peut-elle commencer à `start` ?"""
+        if start is None:
+            return False
+        end = start + duration
+        return DAY_START <= start and end <= DAY_END and not self.overlaps(start, end)
+
+    def free_windows(self, after: int = DAY_START) -> List[Tuple[int, int]]:
+        """Fenêtres libres [début, fin[ de la journée à partir de `after`"""
+        windows = []
+        cursor = max(after, DAY_START)
+        i = bisect_right(self.ends, cursor)
+        for start, end in zip(self.starts[i:], self.ends[i:]):
+            if start > cursor:
+                windows.append((cursor, min(start, DAY_END)))
+            cursor = max(cursor, end)
+            if cursor >= DAY_END:
+                break
+        if cursor < DAY_END:
+            windows.append((cursor, DAY_END))
+        return windows
+
+    def fitting_starts(self, duration: int, after: int = DAY_START) -> List[int]:
+        """Tous les débuts alignés sur 15 min où loge une consultation de `duration` minutes"""
+        starts = []
+        after = max(after, DAY_START)
+        for window_start, window_end in self.free_windows(after):
+            start = DAY_START + -(-(window_start - DAY_START) // STEP) * STEP
+            while start + duration <= window_end:
+                starts.append(start)
+                start += STEP
+        return starts
+
+    def largest_free_window(self) -> int:
+        """Durée (minutes) de la plus grande fenêtre libre"""
+        return max((end - start for start, end in self.free_windows()), default=0)
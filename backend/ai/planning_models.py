@@ -0,0 +1,69 @@
+# ai/planning_models.py
+"""
+Structures internes du planning IA.
+
+Dataclasses à `__slots__` (pas de dict par instance) ; les heures y sont des
+entiers (minutes depuis minuit) analysés une seule fois, les chaînes "HH:MM"
+n'étant produites qu'à la sortie (prompts, réponses JSON).
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ai import schedule_bitmap as bitmap
+from ai.interval_index import DayIntervals, minutes_to_time
+
+WORK_START = bitmap.DAY_START_MINUTES  # 08:00
+LAST_START = bitmap.DAY_START_MINUTES + (bitmap.SLOT_COUNT - 1) * bitmap.SLOT_MINUTES  # 18:45
+
+
+@dataclass(slots=True)
+class Slot:
+    """Créneau : date et début en minutes depuis minuit"""
+    date: str
+    start: int
+    duration: int = bitmap.SLOT_MINUTES
+
+    @classmethod
+    def parse(cls, date: str, heure: str, duration: int = bitmap.SLOT_MINUTES) -> Optional["Slot"]:
+        start = bitmap.time_to_minutes(heure)
+        return cls(date, start, duration) if start is not None else None
+
+    @property
+    def end(self) -> int:
+        return self.start + self.duration
+
+    @property
+    def time(self) -> str:
+        return minutes_to_time(self.start)
+
+    def in_working_hours(self) -> bool:
+        return WORK_START <= self.start <= LAST_START
+
+
+@dataclass(slots=True)
+class DaySchedule:
+    """Planning d'une journée médecin pour une durée de consultation donnée"""
+    date: str
+    day_name: str
+    load: int
+    intervals: DayIntervals
+    duration: int
+    available_starts: List[int] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, date: str, day_name: str, load: int,
+              intervals: DayIntervals, duration: int) -> "DaySchedule":
+        return cls(date, day_name, load, intervals, duration, intervals.fitting_starts(duration))
+
+    @property
+    def available_slots(self) -> List[str]:
+        return [minutes_to_time(m) for m in self.available_starts]
+
+    def first_slot(self) -> Optional[Slot]:
+        if not self.available_starts:
+            return None
+        return Slot(self.date, self.available_starts[0], self.duration)
+
+    def fits(self, slot: Slot) -> bool:
+        return slot.date == self.date and self.intervals.fits(slot.start, self.duration)
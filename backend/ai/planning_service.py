@@ -1,9 +1,14 @@
-import google.generativeai as genai
 import os
 import json
 from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta
 from database import db
+from ai.instrumentation import track_ai_call
+from ai.client import ai_clients
+from ai import schedule_bitmap as bitmap
+from ai.interval_index import DayIntervals, minutes_to_time
+from ai.planning_models import DaySchedule, Slot
+from utils import occupancy, doctor_patterns
 import math
 import logging
 
@@ -15,8 +20,8 @@ class PlanningService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY n'est pas définie")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Modèles partagés par le processus, un par cas d'usage (registre des clients IA)
+        self.clients = ai_clients
         
         # Collections MongoDB
         self.rendezvous_collection = db["rendezvous"]
@@ -35,8 +40,9 @@ class PlanningService:
             # 2. Analyser le motif pour déterminer l'urgence et le type
             motif_analysis = self._analyze_motif_priority(motif)
             
-            # 3. Récupérer les 14 prochains jours de planning
-            upcoming_schedule = self._get_upcoming_schedule(medecin_id, 14)
+            # 3. Récupérer les 14 prochains jours de planning (débuts où loge la durée recommandée)
+            duration = self._safe_duration(motif_analysis.get("recommended_duration"))
+            upcoming_schedule = self._get_upcoming_schedule(medecin_id, 14, duration)
             
             # 4. Générer les suggestions intelligentes avec IA
             suggestions = self._generate_smart_datetime_suggestions(
@@ -88,8 +94,10 @@ class PlanningService:
             }}
             """
             
-            response = self.model.generate_content(prompt)
-            analysis = self._parse_json_response(response.text)
+            with track_ai_call("motif_analysis") as call:
+                response = self.clients.model_for("motif_analysis").generate_content(prompt)
+                call.record_response(response)
+                analysis = self._parse_json_response(response.text, call)
             
             # Validation et defaults
             if not analysis or "urgency_level" not in analysis:
@@ -117,25 +125,30 @@ class PlanningService:
                 "reasoning": "Erreur d'analyse - valeurs par défaut"
             }
     
-    def _get_upcoming_schedule(self, medecin_id: str, days: int = 14) -> Dict:
+    def _safe_duration(self, value, default: int = 20) -> int:
+        """Durée en minutes bornée aux valeurs plausibles (15-60 min)"""
+        try:
+            return max(15, min(60, int(value)))
+        except (TypeError, ValueError):
+            return default
+    
+    def _get_upcoming_schedule(self, medecin_id: str, days: int = 14,
+                               duration: int = occupancy.DEFAULT_DURATION) -> Dict[str, DaySchedule]:
         """
-        Récupère le planning des prochains jours
+        Récupère le planning des prochains jours.
+        `available_starts` ne contient que les débuts où loge une consultation de `duration` minutes.
         """
         try:
             start_date = datetime.now().date()
             end_date = start_date + timedelta(days=days)
             
-            # Récupérer tous les RDV dans cette période
-            rdv_list = list(self.rendezvous_collection.find({
-                "medecin_id": medecin_id,
-                "date_rendez_vous": {
-                    "$gte": start_date.strftime("%Y-%m-%d"),
-                    "$lte": end_date.strftime("%Y-%m-%d")
-                },
-                "statut": {"$ne": "annule"}
-            }))
-            
-            # Organiser par date
+            # Occupation matérialisée de la période : une lecture indexée, un document par jour
+            days_by_date = occupancy.get_occupancy_range(
+                medecin_id,
+                start_date.strftime("%Y-%m-%d"),
+                end_date.strftime("%Y-%m-%d")
+            )
+            
             schedule = {}
             for i in range(days):
                 current_date = start_date + timedelta(days=i)
@@ -143,14 +156,14 @@ class PlanningService:
                 
                 # Ignorer les week-ends
                 if current_date.weekday() < 5:  # 0-4 = Lundi-Vendredi
-                    daily_rdv = [rdv for rdv in rdv_list if rdv["date_rendez_vous"] == date_str]
-                    schedule[date_str] = {
-                        "date": date_str,
-                        "day_name": current_date.strftime("%A"),
-                        "appointments": [rdv["heure"] for rdv in daily_rdv],
-                        "load": len(daily_rdv),
-                        "available_slots": self._calculate_available_slots(daily_rdv)
-                    }
+                    day = days_by_date.get(date_str)
+                    schedule[date_str] = DaySchedule.build(
+                        date_str,
+                        current_date.strftime("%A"),
+                        day.get("count", 0) if day else 0,
+                        occupancy.day_intervals(day),
+                        duration
+                    )
             
             return schedule
             
@@ -158,24 +171,6 @@ class PlanningService:
             logger.error(f"Erreur récupération planning: {e}", exc_info=True)
             return {}
     
-    def _calculate_available_slots(self, daily_rdv: List) -> List[str]:
-        """
-        Calcule les créneaux disponibles pour une journée
-        """
-        occupied = [rdv["heure"] for rdv in daily_rdv]
-        all_slots = []
-        
-        # Générer tous les créneaux (8h-18h45, par 15min)
-        for hour in range(8, 19):
-            for minute in [0, 15, 30, 45]:
-                if hour == 18 and minute > 45:
-                    break
-                slot = f"{hour:02d}:{minute:02d}"
-                if slot not in occupied:
-                    all_slots.append(slot)
-        
-        return all_slots
-    
     def _generate_smart_datetime_suggestions(self, medecin_id: str, motif: str, 
                                            motif_analysis: Dict, upcoming_schedule: Dict, 
                                            historical_data: Dict, patient_info: Dict) -> Dict:
@@ -188,11 +183,13 @@ class PlanningService:
                 motif, motif_analysis, upcoming_schedule, historical_data, patient_info
             )
             
-            # Appeler Gemini
-            response = self.model.generate_content(prompt)
-            
-            # Parser la réponse
-            suggestions = self._parse_smart_datetime_response(response.text, upcoming_schedule)
+            with track_ai_call("smart_datetime") as call:
+                # Appeler Gemini
+                response = self.clients.model_for("smart_datetime").generate_content(prompt)
+                call.record_response(response)
+                
+                # Parser la réponse
+                suggestions = self._parse_smart_datetime_response(response.text, upcoming_schedule, call)
             
             return suggestions
             
@@ -209,7 +206,7 @@ class PlanningService:
         # Préparer les données de planning
         schedule_summary = []
         for date, info in list(upcoming_schedule.items())[:7]:  # 7 prochains jours
-            schedule_summary.append(f"{info['day_name']} {date}: {info['load']} RDV, {len(info['available_slots'])} créneaux libres")
+            schedule_summary.append(f"{info.day_name} {date}: {info.load} RDV, {len(info.available_starts)} créneaux libres")
         
         prompt = f"""
 Tu es un assistant IA expert en planification médicale optimale.
@@ -265,14 +262,16 @@ Réponds UNIQUEMENT en JSON:
 """
         return prompt
     
-    def _parse_smart_datetime_response(self, response_text: str, upcoming_schedule: Dict) -> Dict:
+    def _parse_smart_datetime_response(self, response_text: str, upcoming_schedule: Dict, call=None) -> Dict:
         """
         Parse la réponse JSON de l'IA pour les suggestions date+heure
         """
         try:
-            parsed_data = self._parse_json_response(response_text)
+            parsed_data = self._parse_json_response(response_text, call)
             
             if not parsed_data or "suggested_slots" not in parsed_data:
+                if call:
+                    call.mark_parsed(False)
                 raise ValueError("Format invalide")
             
             # Valider et filtrer les suggestions
@@ -289,48 +288,35 @@ Réponds UNIQUEMENT en JSON:
             logger.error(f"Erreur parsing datetime: {e}", exc_info=True)
             return self._fallback_smart_suggestions(upcoming_schedule, {})
     
-    def _validate_datetime_suggestion(self, slot: Dict, upcoming_schedule: Dict) -> bool:
+    def _validate_datetime_suggestion(self, slot: Dict, upcoming_schedule: Dict[str, DaySchedule]) -> bool:
         """
         Valide qu'une suggestion date+heure est réaliste
         """
-        try:
-            date = slot.get("date")
-            time = slot.get("time")
-            
-            if not date or not time:
-                return False
-            
-            # Vérifier que la date est dans le planning
-            if date not in upcoming_schedule:
-                return False
-            
-            # Vérifier que l'heure est disponible
-            if time not in upcoming_schedule[date]["available_slots"]:
-                return False
-            
-            # Vérifier le format de l'heure
-            datetime.strptime(time, "%H:%M")
-            
-            return True
-            
-        except:
+        date = slot.get("date")
+        day = upcoming_schedule.get(date) if date else None
+        if day is None:
             return False
+        
+        # Heure analysée une seule fois ; la consultation doit loger entière
+        parsed = Slot.parse(date, str(slot.get("time") or ""), day.duration)
+        return parsed is not None and day.fits(parsed)
     
-    def _find_next_available_slot(self, upcoming_schedule: Dict) -> Dict:
+    def _find_next_available_slot(self, upcoming_schedule: Dict[str, DaySchedule]) -> Dict:
         """
         Trouve le prochain créneau disponible
         """
         for date, info in upcoming_schedule.items():
-            if info["available_slots"]:
+            first = info.first_slot()
+            if first:
                 return {
                     "date": date,
-                    "time": info["available_slots"][0],
-                    "day_name": info["day_name"]
+                    "time": first.time,
+                    "day_name": info.day_name
                 }
         
         return {"date": None, "time": None, "day_name": None}
     
-    def _fallback_smart_suggestions(self, upcoming_schedule: Dict, motif_analysis: Dict) -> Dict:
+    def _fallback_smart_suggestions(self, upcoming_schedule: Dict[str, DaySchedule], motif_analysis: Dict) -> Dict:
         """
         Suggestions de fallback si l'IA échoue
         """
@@ -342,16 +328,17 @@ Réponds UNIQUEMENT en JSON:
             if count >= 3:
                 break
             
-            if info["available_slots"]:
+            first = info.first_slot()
+            if first:
                 # Suggérer le premier créneau disponible
                 suggestions.append({
                     "date": date,
-                    "time": info["available_slots"][0],
+                    "time": first.time,
                     "score": 70 - (count * 5),  # Score décroissant
                     "category": "acceptable",
-                    "reasoning": f"Prochain créneau disponible le {info['day_name']}",
+                    "reasoning": f"Prochain créneau disponible le {info.day_name}",
                     "workload_impact": "normal",
-                    "day_context": f"Journée avec {info['load']} RDV existants"
+                    "day_context": f"Journée avec {info.load} RDV existants"
                 })
                 count += 1
         
@@ -365,9 +352,10 @@ Réponds UNIQUEMENT en JSON:
             "optimal_strategy": "Planification basique par ordre de disponibilité"
         }
     
-    def _parse_json_response(self, response_text: str) -> Dict:
+    def _parse_json_response(self, response_text: str, call=None) -> Dict:
         """
         Parse une réponse JSON de Gemini avec nettoyage
+        `call` (optionnel) est la mesure en cours, marquée selon le succès du parsing
         """
         try:
             clean_response = response_text.strip()
@@ -376,13 +364,20 @@ Réponds UNIQUEMENT en JSON:
             if clean_response.endswith("```"):
                 clean_response = clean_response[:-3]
             
-            return json.loads(clean_response)
+            parsed_data = json.loads(clean_response)
+            if call:
+                call.mark_parsed(True)
+            return parsed_data
             
         except json.JSONDecodeError as e:
             logger.error(f"Erreur parsing JSON: {e}", extra={"response_text": response_text})
+            if call:
+                call.mark_parsed(False)
             return {}
         except Exception as e:
             logger.error(f"Erreur générale parsing: {e}", exc_info=True)
+            if call:
+                call.mark_parsed(False)
             return {}
     
     # ✅ Garder les anciennes méthodes pour compatibilité
@@ -392,7 +387,9 @@ Réponds UNIQUEMENT en JSON:
         """
         try:
             historical_data = self._get_historical_patterns(medecin_id)
-            existing_slots = self._get_existing_appointments(medecin_id, date_str)
+            day = occupancy.get_day_occupancy(medecin_id, date_str)
+            existing_slots = occupancy.occupied_times(day)
+            intervals = occupancy.day_intervals(day)
             estimated_duration = self._estimate_duration_with_ai(motif, historical_data)
             
             suggestions = self._generate_ai_suggestions(
@@ -400,6 +397,15 @@ Réponds UNIQUEMENT en JSON:
                 estimated_duration, historical_data
             )
             
+            # Ne garder que les créneaux où la durée estimée loge sans chevauchement
+            fitting = [
+                slot for slot in suggestions.get("recommended_slots", [])
+                if intervals.fits(bitmap.time_to_minutes(slot.get("time", "")), estimated_duration)
+            ]
+            if not fitting:
+                fitting = self._fallback_suggestions(intervals, estimated_duration)["recommended_slots"]
+            suggestions["recommended_slots"] = fitting
+            
             return {
                 "success": True,
                 "suggestions": suggestions,
@@ -421,141 +427,17 @@ Réponds UNIQUEMENT en JSON:
     
     # ... (garder toutes les autres méthodes existantes)
     def _get_historical_patterns(self, medecin_id: str) -> Dict:
-        """Analyse les patterns historiques du médecin"""
+        """Patterns historiques du médecin (rollup `doctor_patterns`, lecture ponctuelle)"""
         try:
-            three_months_ago = datetime.now() - timedelta(days=90)
-            date_filter = three_months_ago.strftime("%Y-%m-%d")
-            
-            historical_rdv = list(self.rendezvous_collection.find({
-                "medecin_id": medecin_id,
-                "date_rendez_vous": {"$gte": date_filter}
-            }))
-            
-            historical_consultations = list(self.consultations_collection.find({
-                "medecin_id": medecin_id,
-                "date_consultation": {"$gte": date_filter}
-            }))
-            
-            patterns = {
-                "total_appointments": len(historical_rdv),
-                "average_daily_load": self._calculate_average_daily_load(historical_rdv),
-                "preferred_hours": self._find_preferred_hours(historical_rdv),
-                "motif_durations": self._analyze_motif_durations(historical_consultations),
-                "peak_days": self._find_peak_days(historical_rdv),
-                "typical_gaps": self._analyze_typical_gaps(historical_rdv)
-            }
-            
-            return patterns
+            return doctor_patterns.get_patterns(medecin_id)
             
         except Exception as e:
             logger.error(f"Erreur analyse historique: {e}", exc_info=True)
             return {}
     
-    def _calculate_average_daily_load(self, rdv_list: List) -> float:
-        """Calcule la charge moyenne quotidienne"""
-        if not rdv_list:
-            return 0.0
-        
-        dates = {}
-        for rdv in rdv_list:
-            date = rdv["date_rendez_vous"]
-            dates[date] = dates.get(date, 0) + 1
-        
-        return sum(dates.values()) / len(dates) if dates else 0.0
-    
-    def _find_preferred_hours(self, rdv_list: List) -> List[str]:
-        """Trouve les heures préférées du médecin"""
-        hour_counts = {}
-        for rdv in rdv_list:
-            hour = rdv["heure"][:2]
-            hour_counts[hour] = hour_counts.get(hour, 0) + 1
-        
-        sorted_hours = sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)
-        return [hour for hour, count in sorted_hours[:3]]
-    
-    def _analyze_motif_durations(self, consultations: List) -> Dict:
-        """Analyse les durées par motif de consultation"""
-        motif_stats = {}
-        
-        for consultation in consultations:
-            motif = consultation.get("motif", "").lower()
-            simplified_motif = self._simplify_motif(motif)
-            
-            if simplified_motif not in motif_stats:
-                motif_stats[simplified_motif] = {
-                    "count": 0,
-                    "avg_duration": 20
-                }
-            motif_stats[simplified_motif]["count"] += 1
-        
-        return motif_stats
-    
     def _simplify_motif(self, motif: str) -> str:
         """Simplifie les motifs pour regroupement"""
-        motif = motif.lower()
-        
-        if any(word in motif for word in ["suivi", "controle", "renouvellement"]):
-            return "suivi_routine"
-        elif any(word in motif for word in ["douleur", "mal", "souffrance"]):
-            return "douleur"
-        elif any(word in motif for word in ["fievre", "grippe", "rhume"]):
-            return "infection"
-        elif any(word in motif for word in ["urgence", "urgent"]):
-            return "urgence"
-        elif any(word in motif for word in ["consultation", "premiere", "nouveau"]):
-            return "premiere_consultation"
-        else:
-            return "consultation_generale"
-    
-    def _find_peak_days(self, rdv_list: List) -> List[str]:
-        """Trouve les jours de la semaine les plus chargés"""
-        day_counts = {}
-        for rdv in rdv_list:
-            try:
-                date_obj = datetime.strptime(rdv["date_rendez_vous"], "%Y-%m-%d")
-                day_name = date_obj.strftime("%A")
-                day_counts[day_name] = day_counts.get(day_name, 0) + 1
-            except:
-                continue
-        
-        sorted_days = sorted(day_counts.items(), key=lambda x: x[1], reverse=True)
-        return [day for day, count in sorted_days[:3]]
-    
-    def _analyze_typical_gaps(self, rdv_list: List) -> int:
-        """Analyse les écarts typiques entre RDV"""
-        daily_schedules = {}
-        
-        for rdv in rdv_list:
-            date = rdv["date_rendez_vous"]
-            if date not in daily_schedules:
-                daily_schedules[date] = []
-            daily_schedules[date].append(rdv["heure"])
-        
-        gaps = []
-        for date, times in daily_schedules.items():
-            if len(times) > 1:
-                times.sort()
-                for i in range(1, len(times)):
-                    try:
-                        t1 = datetime.strptime(times[i-1], "%H:%M")
-                        t2 = datetime.strptime(times[i], "%H:%M")
-                        gap = (t2 - t1).seconds // 60
-                        if gap > 0 and gap <= 120:
-                            gaps.append(gap)
-                    except:
-                        continue
-        
-        return int(sum(gaps) / len(gaps)) if gaps else 30
-    
-    def _get_existing_appointments(self, medecin_id: str, date_str: str) -> List[str]:
-        """Récupère les créneaux déjà occupés"""
-        existing = list(self.rendezvous_collection.find({
-            "medecin_id": medecin_id,
-            "date_rendez_vous": date_str,
-            "statut": {"$ne": "annule"}
-        }))
-        
-        return [rdv["heure"] for rdv in existing]
+        return doctor_patterns.simplify_motif(motif)
     
     def _estimate_duration_with_ai(self, motif: str, historical_data: Dict) -> int:
         """Estime la durée avec IA basée sur le motif et l'historique"""
@@ -579,12 +461,16 @@ Réponds UNIQUEMENT en JSON:
                 - Urgence: 20-30 min
                 """
                 
-                response = self.model.generate_content(prompt)
-                try:
-                    base_duration = int(response.text.strip())
-                    base_duration = max(10, min(60, base_duration))
-                except:
-                    base_duration = 20
+                with track_ai_call("duration_estimate") as call:
+                    response = self.clients.model_for("duration_estimate").generate_content(prompt)
+                    call.record_response(response)
+                    try:
+                        base_duration = int(response.text.strip())
+                        base_duration = max(10, min(60, base_duration))
+                        call.mark_parsed(True)
+                    except:
+                        base_duration = 20
+                        call.mark_parsed(False)
             
             return base_duration
             
@@ -601,14 +487,18 @@ Réponds UNIQUEMENT en JSON:
                 date_str, motif, existing_slots, estimated_duration, historical_data
             )
             
-            response = self.model.generate_content(prompt)
-            suggestions = self._parse_planning_response(response.text)
+            with track_ai_call("slot_suggestion") as call:
+                response = self.clients.model_for("slot_suggestion").generate_content(prompt)
+                call.record_response(response)
+                suggestions = self._parse_planning_response(response.text, call)
             
             return suggestions
             
         except Exception as e:
             logger.error(f"Erreur génération suggestions: {e}", exc_info=True)
-            return self._fallback_suggestions(existing_slots, estimated_duration)
+            return self._fallback_suggestions(
+                DayIntervals.from_mask(bitmap.mask_from_times(existing_slots)), estimated_duration
+            )
     
     def _build_planning_prompt(self, date_str: str, motif: str, existing_slots: List[str], 
                               estimated_duration: int, historical_data: Dict) -> str:
@@ -663,7 +553,7 @@ Répondez UNIQUEMENT en JSON:
 """
         return prompt
     
-    def _parse_planning_response(self, response_text: str) -> Dict:
+    def _parse_planning_response(self, response_text: str, call=None) -> Dict:
         """Parse la réponse JSON de l'IA de planification"""
         try:
             clean_response = response_text.strip()
@@ -684,39 +574,34 @@ Répondez UNIQUEMENT en JSON:
             
             parsed_data["recommended_slots"] = valid_slots
             
+            if call:
+                call.mark_parsed(True)
             return parsed_data
             
         except Exception as e:
             logger.error(f"Erreur parsing planning: {e}", exc_info=True)
-            return self._fallback_suggestions([], 20)
+            if call:
+                call.mark_parsed(False)
+            return self._fallback_suggestions(DayIntervals(), 20)
     
     def _is_valid_time_slot(self, time_str: str) -> bool:
         """Valide qu'un créneau horaire est dans les heures de travail"""
-        try:
-            time_obj = datetime.strptime(time_str, "%H:%M").time()
-            start_time = time(8, 0)
-            end_time = time(18, 45)
-            return start_time <= time_obj <= end_time
-        except:
-            return False
+        slot = Slot.parse("", time_str or "")
+        return slot is not None and slot.in_working_hours()
     
-    def _fallback_suggestions(self, existing_slots: List[str], duration: int) -> Dict:
-        """Suggestions de fallback en cas d'erreur IA"""
-        all_slots = []
-        for hour in range(8, 19):
-            for minute in [0, 15, 30, 45]:
-                if hour == 18 and minute > 45:
-                    break
-                slot_time = f"{hour:02d}:{minute:02d}"
-                if slot_time not in existing_slots:
-                    all_slots.append({
-                        "time": slot_time,
-                        "score": 70,
-                        "reason": "Créneau disponible"
-                    })
+    def _fallback_suggestions(self, intervals: DayIntervals, duration: int) -> Dict:
+        """Suggestions de fallback en cas d'erreur IA : premiers débuts où loge la durée"""
+        all_slots = [
+            {
+                "time": minutes_to_time(start),
+                "score": 70,
+                "reason": f"Créneau disponible ({duration} min)"
+            }
+            for start in intervals.fitting_starts(duration)[:5]
+        ]
         
         return {
-            "recommended_slots": all_slots[:5],
+            "recommended_slots": all_slots,
             "workload_assessment": "normal",
             "optimization_tips": [
                 "Vérifiez les conflits d'horaires",
@@ -0,0 +1,81 @@
+# ai/schedule_bitmap.py
+"""
+Représentation compacte d'une journée de planning sous forme de masque de bits.
+
+Une journée médecin = 44 créneaux de 15 minutes (08:00 -> 18:45).
+Le bit i est à 1 si le créneau i est occupé. Les calculs de charge et de
+créneaux occupés se font par opérations sur les bits au lieu de tests
+`slot not in occupied` sur des listes de chaînes ; les créneaux libres et les
+trous sont calculés par ai.interval_index.DayIntervals.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DAY_START_MINUTES = 8 * 60
+SLOT_MINUTES = 15
+SLOT_COUNT = 44  # 08:00 -> 18:45
+FULL_MASK = (1 << SLOT_COUNT) - 1
+
+SLOT_LABELS: Tuple[str, ...] = tuple(
+    f"{(DAY_START_MINUTES + i * SLOT_MINUTES) // 60:02d}:{(DAY_START_MINUTES + i * SLOT_MINUTES) % 60:02d}"
+    for i in range(SLOT_COUNT)
+)
+SLOT_INDEX: Dict[str, int] = {label: i for i, label in enumerate(SLOT_LABELS)}
+
+
+def time_to_minutes(heure: str) -> Optional[int]:
+    """Convertit "HH:MM" en minutes depuis minuit (None si invalide)"""
+    try:
+        hours, minutes = heure.split(":")[:2]
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def slot_index(heure: str) -> Optional[int]:
+    """Index du créneau contenant l'heure donnée (None si hors horaires ou invalide)"""
+    index = SLOT_INDEX.get(heure)
+    if index is not None:
+        return index
+    minutes = time_to_minutes(heure)
+    if minutes is None:
+        return None
+    index = (minutes - DAY_START_MINUTES) // SLOT_MINUTES
+    return index if 0 <= index < SLOT_COUNT else None
+
+
+def slot_label(index: int) -> str:
+    return SLOT_LABELS[index]
+
+
+def mask_from_times(times: Iterable[str]) -> int:
+    """Masque des créneaux occupés par une liste d'heures"""
+    mask = 0
+    for heure in times:
+        index = slot_index(heure)
+        if index is not None:
+            mask |= 1 << index
+    return mask
+
+
+def iter_bits(mask: int):
+    """Itère sur les index des bits à 1, par ordre croissant"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def occupied_slots(mask: int) -> List[str]:
+    return [SLOT_LABELS[i] for i in iter_bits(mask & FULL_MASK)]
+
+
+def occupied_count(mask: int) -> int:
+    return (mask & FULL_MASK).bit_count()
+
+
+def free_count(mask: int) -> int:
+    return SLOT_COUNT - occupied_count(mask)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime
 
@@ -8,6 +8,11 @@ class DiagnosticRequest(BaseModel):
     motif: str
     symptomes: str
 
+class BatchDiagnosticRequest(BaseModel):
+    """Modèle pour une requête de diagnostic IA groupée"""
+    requests: List[DiagnosticRequest] = Field(..., min_length=1, max_length=50)
+    pack_size: int = Field(1, ge=1, le=5)  # Nombre de cas regroupés dans un même prompt
+
 class DiagnosticSuggestion(BaseModel):
     """Modèle pour une suggestion de diagnostic"""
     nom: str
@@ -20,6 +25,7 @@ class DiagnosticResponse(BaseModel):
     diagnostics: List[DiagnosticSuggestion]
     recommandations_generales: str
     niveau_urgence: str  # Faible/Modéré/Élevé
+    similarite: Optional[int] = None  # 0-100, uniquement pour une réponse issue d'un cas validé
 
 class AISuggestionCreate(BaseModel):
     """Modèle pour sauvegarder les suggestions IA"""
@@ -0,0 +1,79 @@
+# ai/workload_heatmap.py
+"""
+Carte de charge multi-médecins (tableau de bord chef de service).
+
+L'occupation de tous les médecins sur la période est lue en une seule requête
+(collection `occupancy`), puis rangée dans un tenseur NumPy
+médecins × jours × créneaux (nombre de RDV par créneau de 15 min).
+Taux d'occupation, niveaux de charge et alertes sont calculés par opérations
+vectorisées sur ce tenseur, pour toutes les cellules à la fois.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from ai import schedule_bitmap as bitmap
+from utils import occupancy
+
+# Mêmes seuils que l'analyse de charge d'une journée (taux d'occupation)
+LEVEL_THRESHOLDS = np.array([0.3, 0.6, 0.8])
+LEVELS = np.array(["leger", "normal", "charge", "surcharge"])
+
+
+def workload_level(rate: float) -> str:
+    """Niveau de charge d'une journée selon son taux d'occupation"""
+    return str(LEVELS[np.digitize(rate, LEVEL_THRESHOLDS)])
+
+
+def working_days(start: datetime, end: datetime) -> List[str]:
+    return [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end - start).days + 1)
+        if (start + timedelta(days=i)).weekday() < 5
+    ]
+
+
+def build_tensor(medecin_ids: List[str], dates: List[str]) -> np.ndarray:
+    """Tenseur (médecins, jours, créneaux) du nombre de RDV actifs, en une requête"""
+    tensor = np.zeros((len(medecin_ids), len(dates), bitmap.SLOT_COUNT), dtype=np.int16)
+    if not medecin_ids or not dates:
+        return tensor
+
+    doctor_index = {mid: i for i, mid in enumerate(medecin_ids)}
+    date_index = {d: j for j, d in enumerate(dates)}
+    for doc in occupancy.find_days(medecin_ids, dates[0], dates[-1]):
+        j = date_index.get(doc["date"])
+        if j is None:  # week-end
+            continue
+        i = doctor_index[doc["medecin_id"]]
+        for label, n in (doc.get("slots") or {}).items():
+            k = bitmap.SLOT_INDEX.get(label)
+            if k is not None:
+                tensor[i, j, k] = n
+    return tensor
+
+
+def compute_heatmap(medecin_ids: List[str], dates: List[str]) -> Dict:
+    """Indicateurs par cellule (médecin, jour) calculés sur tout le tenseur"""
+    tensor = build_tensor(medecin_ids, dates)
+
+    occupied = (tensor > 0).sum(axis=2)
+    rates = occupied / bitmap.SLOT_COUNT
+    levels = LEVELS[np.digitize(rates, LEVEL_THRESHOLDS)]
+    double_booked = (tensor > 1).any(axis=2)
+    overloaded = (levels == "surcharge") | double_booked
+
+    return {
+        "medecin_ids": medecin_ids,
+        "dates": dates,
+        "occupied_slots": occupied.tolist(),
+        "occupancy_rate": np.round(rates, 3).tolist(),
+        "load_level": levels.tolist(),
+        "overloaded": overloaded.tolist(),
+        "double_booked": double_booked.tolist(),
+        "doctor_average_rate": np.round(rates.mean(axis=1), 3).tolist() if dates else [0.0] * len(medecin_ids),
+        "day_average_rate": np.round(rates.mean(axis=0), 3).tolist() if medecin_ids else [0.0] * len(dates),
+        "overloaded_cells": int(overloaded.sum())
+    }
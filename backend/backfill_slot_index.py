@@ -0,0 +1,22 @@
+"""
+Crée l'index unique des créneaux actifs et marque (`slot_active`, `creneaux`)
+les rendez-vous existants non annulés.
+
+Au démarrage, l'API ne crée que l'index. Ce script marque tout l'historique
+(à lancer après le déploiement) et signale les chevauchements déjà présents :
+    python backfill_slot_index.py
+"""
+
+from utils.booking import ensure_slot_index, backfill_slot_active
+
+if __name__ == "__main__":
+    print("🚀 Index unique des créneaux de rendez-vous...")
+    print("=" * 50)
+
+    ensure_slot_index()
+    result = backfill_slot_active()
+
+    print(f"✅ Rendez-vous marqués: {result['marked']}")
+    if result["conflicts"]:
+        print(f"⚠️  Chevauchements existants (hors index): {result['conflicts']}")
+    print("=" * 50)
@@ -0,0 +1,138 @@
+# benchmarks/bench_photo_pipeline.py
+"""
+Benchmark du traitement des photos patients.
+
+Sur un corpus d'images (répertoire --corpus, ou images synthétiques JPEG/PNG
+générées si absent), compare :
+- "inline" : redimensionnement sans mode draft, exécuté sur la boucle
+             d'événements comme avant le pool
+- "draft"  : même chose avec le décodage JPEG en mode draft
+- "pool"   : PhotoPipeline (pool de processus + mode draft)
+
+Pour chaque variante : débit, et latence maximale de la boucle d'événements
+mesurée par une tâche témoin pendant --concurrency uploads simultanés.
+
+Aucune base de données n'est nécessaire.
+
+Usage (depuis backend/) :
+    python benchmarks/bench_photo_pipeline.py --corpus ~/photos --concurrency 8
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from utils.photo_processing import (  # noqa: E402
+    PhotoPipeline, resize_image, PHOTO_MAX_WIDTH, PHOTO_MAX_HEIGHT, PHOTO_QUALITY
+)
+
+EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def legacy_resize(image_data: bytes) -> bytes:
+    """Traitement d'avant le pool : décodage pleine résolution"""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+        image = background
+    image.thumbnail((PHOTO_MAX_WIDTH, PHOTO_MAX_HEIGHT), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=PHOTO_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def synthetic_corpus():
+    images = []
+    for size, fmt, mode in (((4000, 3000), "JPEG", "RGB"), ((3000, 2000), "JPEG", "RGB"),
+                            ((2000, 1500), "PNG", "RGBA"), ((1200, 900), "PNG", "RGB")):
+        image = Image.linear_gradient("L").resize(size).convert(mode)
+        output = io.BytesIO()
+        image.save(output, format=fmt)
+        images.append((f"synthetic_{size[0]}x{size[1]}.{fmt.lower()}", output.getvalue()))
+    return images
+
+
+def load_corpus(path):
+    if not path:
+        return synthetic_corpus()
+    images = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(EXTENSIONS):
+            with open(os.path.join(path, name), "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+async def run_variant(name, images, concurrency, pipeline=None):
+    max_lag = 0.0
+    done = False
+
+    async def heartbeat():
+        nonlocal max_lag
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - before - 0.005)
+
+    async def process(data):
+        if pipeline is not None:
+            return await pipeline.resize(data)
+        return (legacy_resize if name == "inline" else resize_image)(data)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(data):
+        async with semaphore:
+            return await process(data)
+
+    watcher = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(bounded(data) for _, data in images))
+    elapsed = time.perf_counter() - start
+    done = True
+    await watcher
+
+    size_out = sum(len(r) for r in results)
+    print(f"{name:>6}: {len(images) / elapsed:6.1f} images/s, "
+          f"latence max de la boucle {max_lag * 1000:7.1f} ms, {size_out / 1024:.0f} Kio produits")
+
+
+async def main_async(args):
+    images = load_corpus(args.corpus) * args.repeat
+    if not images:
+        print("Corpus vide")
+        return
+    print(f"{len(images)} images, {sum(len(d) for _, d in images) / 1024 / 1024:.1f} Mio")
+
+    await run_variant("inline", images, args.concurrency)
+    await run_variant("draft", images, args.concurrency)
+    pipeline = PhotoPipeline(workers=args.workers, max_pending=len(images))
+    try:
+        await pipeline.resize(images[0][1])  # Démarrage des processus hors mesure
+        await run_variant("pool", images, args.concurrency, pipeline)
+        print(pipeline.snapshot())
+    finally:
+        pipeline.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traitement des photos patients")
+    parser.add_argument("--corpus", help="Répertoire d'images JPEG/PNG")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_planning_models.py
+"""
+Micro-benchmark des structures internes du planning IA.
+
+Compare, sur un planning synthétique de 14 jours et une série de suggestions IA :
+- "dicts" : reproduction exacte du code d'avant les dataclasses (dict par
+            journée avec la liste des heures occupées, validation des
+            suggestions par datetime.strptime puis time_to_minutes)
+- "slots" : DaySchedule / Slot à __slots__, heures en minutes analysées une fois
+
+Aucune base de données n'est nécessaire.
+
+Usage (depuis backend/) :
+    python benchmarks/bench_planning_models.py --runs 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import schedule_bitmap as bitmap  # noqa: E402
+from ai.interval_index import DayIntervals, minutes_to_time  # noqa: E402
+from ai.planning_models import DaySchedule, Slot  # noqa: E402
+
+DAYS = 14
+DURATION = 30
+
+
+def synthetic_week(seed: int = 42):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 6)
+    days = []
+    for i in range(DAYS):
+        current = start + timedelta(days=i)
+        if current.weekday() < 5:
+            mask = 0
+            for index in rng.sample(range(bitmap.SLOT_COUNT), rng.randint(5, 30)):
+                mask |= 1 << index
+            # Créneaux au format des documents d'occupation ("HH:MM" -> n)
+            slots = {label: 1 for label in bitmap.occupied_slots(mask)}
+            days.append((current.strftime("%Y-%m-%d"), current.strftime("%A"), bitmap.occupied_count(mask), mask, slots))
+    suggestions = [
+        {"date": rng.choice(days)[0], "time": f"{rng.randint(7, 19):02d}:{rng.choice([0, 15, 30, 45]):02d}"}
+        for _ in range(20)
+    ]
+    return days, suggestions
+
+
+def occupied_times(slots):
+    """Équivalent de utils.occupancy.occupied_times (sans base de données)"""
+    times = []
+    for heure, n in sorted(slots.items()):
+        times.extend([heure] * max(0, n))
+    return times
+
+
+def run_dicts(days, suggestions):
+    # _get_upcoming_schedule avant les dataclasses
+    schedule = {}
+    for date, day_name, load, mask, slots in days:
+        intervals = DayIntervals.from_mask(mask)
+        schedule[date] = {
+            "date": date,
+            "day_name": day_name,
+            "appointments": occupied_times(slots),
+            "load": load,
+            "intervals": intervals,
+            "duration": DURATION,
+            "available_slots": [minutes_to_time(m) for m in intervals.fitting_starts(DURATION)]
+        }
+    # _validate_datetime_suggestion avant les dataclasses
+    valid = 0
+    for slot in suggestions:
+        try:
+            date = slot.get("date")
+            time = slot.get("time")
+            if not date or not time or date not in schedule:
+                continue
+            datetime.strptime(time, "%H:%M")
+            info = schedule[date]
+            if info["intervals"].fits(bitmap.time_to_minutes(time), info["duration"]):
+                valid += 1
+        except Exception:
+            continue
+    return valid
+
+
+def run_slots(days, suggestions):
+    schedule = {
+        date: DaySchedule.build(date, day_name, load, DayIntervals.from_mask(mask), DURATION)
+        for date, day_name, load, mask, _ in days
+    }
+    valid = 0
+    for slot in suggestions:
+        date = slot.get("date")
+        day = schedule.get(date) if date else None
+        if day is None:
+            continue
+        parsed = Slot.parse(date, str(slot.get("time") or ""), day.duration)
+        if parsed is not None and day.fits(parsed):
+            valid += 1
+    return valid
+
+
+def peak_memory(func, *args) -> int:
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structures internes du planning IA")
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    days, suggestions = synthetic_week()
+    assert run_dicts(days, suggestions) == run_slots(days, suggestions)
+
+    results = {}
+    for name, func in (("dicts", run_dicts), ("slots", run_slots)):
+        seconds = min(timeit.repeat(lambda: func(days, suggestions), number=args.runs, repeat=5))
+        results[name] = seconds / args.runs * 1e6
+        print(f"{name:>6}: {results[name]:.1f} µs par requête, "
+              f"pic mémoire {peak_memory(func, days, suggestions) / 1024:.1f} Kio")
+
+    print(f"Gain: {results['dicts'] / results['slots']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_startup.py
+"""
+Benchmark du temps de démarrage d'un worker (import de `main`).
+
+Compare :
+- "lazy"  : import de main tel quel (services IA construits au premier appel)
+- "eager" : import de main précédé de l'import du SDK google.generativeai,
+            ce que faisait l'ancienne construction des services à l'import des routes
+
+Chaque mesure est faite dans un processus Python neuf.
+
+Usage (depuis backend/) :
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "lazy": "import main",
+    "eager": "import google.generativeai; import main",
+}
+
+TIMER = (
+    "import time; _t = time.perf_counter(); {code}; "
+    "print(time.perf_counter() - _t)"
+)
+
+
+def measure(code: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMER.format(code=code)],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip().splitlines()
+        timings.append(float(output[-1]) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps de démarrage des workers")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        timings = measure(code, args.runs)
+        results[name] = statistics.median(timings)
+        print(f"{name:>6}: médiane {results[name]:.1f} ms "
+              f"(min {min(timings):.1f} ms, max {max(timings):.1f} ms, {args.runs} runs)")
+
+    saved = results["eager"] - results["lazy"]
+    print(f"Gain au démarrage: {saved:.1f} ms par worker")
+
+
+if __name__ == "__main__":
+    main()
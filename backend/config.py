@@ -17,4 +17,32 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
 # Calcul de l'expiration des tokens en timedelta
-ACCESS_TOKEN_EXPIRE_DELTA = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_DELTA = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+# IA diagnostique : index local de cas similaires validés
+# Au-dessus de ce seuil de similarité (cosinus, 0-1), le cas validé est renvoyé sans appel à Gemini
+AI_CASE_SIMILARITY_THRESHOLD = float(os.getenv("AI_CASE_SIMILARITY_THRESHOLD", "0.9"))
+AI_CASE_INDEX_DIM = int(os.getenv("AI_CASE_INDEX_DIM", "2048"))
+
+# Modèles Gemini par niveau : les tâches légères (classification du motif, durée)
+# peuvent être routées vers un modèle plus rapide, les résumés vers un modèle plus fort
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_LIGHT_MODEL = os.getenv("GEMINI_LIGHT_MODEL", GEMINI_MODEL)
+GEMINI_HEAVY_MODEL = os.getenv("GEMINI_HEAVY_MODEL", GEMINI_MODEL)
+
+# Nombre maximum d'appels IA simultanés par worker
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+
+# Cache des réponses des routes de statistiques (secondes, par worker)
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "300"))
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "1024"))
+
+# Traitement des photos patients : processus du pool et traitements en attente max (par worker)
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+PHOTO_MAX_PENDING = int(os.getenv("PHOTO_MAX_PENDING", "16"))
+
+# Cache local des fichiers GridFS (photos) : mémoire par worker, disque optionnel (GRIDFS_CACHE_DIR vide = désactivé)
+GRIDFS_CACHE_MAX_BYTES = int(os.getenv("GRIDFS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+GRIDFS_CACHE_MAX_OBJECT_BYTES = int(os.getenv("GRIDFS_CACHE_MAX_OBJECT_BYTES", str(1024 * 1024)))
+GRIDFS_CACHE_DIR = os.getenv("GRIDFS_CACHE_DIR", "")
+GRIDFS_CACHE_DISK_MAX_BYTES = int(os.getenv("GRIDFS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
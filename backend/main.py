@@ -26,12 +26,16 @@ import os
 
 from routes.auth import auth_router
 from routes.users import users_router
-from routes.patients import patients_router
+from routes.patients import patients_router, MAX_FILE_SIZE, PHOTO_UPLOAD_PATH
 from routes.consultations import consultations_router
 from routes.rendezvous import rendezvous_router
 from routes.ai_diagnostic import ai_router
 from routes.ai_planning import planning_router
 from routes.ai_patient_summary import ai_patient_summary_router
+from routes.dashboard import dashboard_router
+from utils import occupancy, booking, doctor_patterns, counters, consultation_stats
+from utils.photo_processing import photo_pipeline
+from utils.upload_limits import UploadSizeLimitMiddleware
 
 app = FastAPI(
     title="API Gestion Médicale",
@@ -39,6 +43,23 @@ app = FastAPI(
     redirect_slashes=True
 )
 
+@app.on_event("startup")
+def ensure_indexes():
+    """Créer les index : occupation des plannings, unicité des créneaux actifs, patterns médecins, compteurs, statistiques"""
+    occupancy.ensure_indexes()
+    booking.ensure_slot_index()
+    doctor_patterns.ensure_indexes()
+    counters.ensure_indexes()
+    consultation_stats.ensure_indexes()
+
+@app.on_event("shutdown")
+def stop_photo_pipeline():
+    """Arrêter les processus de traitement des photos"""
+    photo_pipeline.shutdown()
+
+# Corps des uploads de photos plafonné avant lecture (ajouté avant CORS pour que les 413 en portent les en-têtes)
+app.add_middleware(UploadSizeLimitMiddleware, path_pattern=PHOTO_UPLOAD_PATH, max_bytes=MAX_FILE_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -53,6 +74,8 @@ app.include_router(users_router, prefix="/users", tags=["Utilisateurs"])
 app.include_router(patients_router, prefix="/patients", tags=["Patients"])
 app.include_router(consultations_router, prefix="/consultations", tags=["Consultations"])
 app.include_router(rendezvous_router, prefix="/appointments", tags=["Rendez-vous"])
+# /dashboard/summary uniquement : /dashboard reste une route du frontend (SPA)
+app.include_router(dashboard_router, prefix="/dashboard", tags=["Tableau de bord"])
 app.include_router(ai_router, prefix="/api")
 app.include_router(planning_router, prefix="/api")
 app.include_router(ai_patient_summary_router, prefix="/api")
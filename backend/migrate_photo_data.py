@@ -0,0 +1,49 @@
+"""
+Migre les photos patients encore stockées en base64 (`photo_data`) vers
+GridFS (bucket `patient_photos`) et retire le champ des documents.
+
+Reprenable : relancer le script reprend là où il s'était arrêté.
+    python migrate_photo_data.py --dry-run
+    python migrate_photo_data.py --batch-size 200
+"""
+
+import argparse
+import time
+
+from utils.photo_migration import migrate_inline_photos
+
+
+def format_bytes(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} Mo"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migration des photos base64 vers GridFS")
+    parser.add_argument("--batch-size", type=int, default=100, help="Patients mis à jour par lot")
+    parser.add_argument("--limit", type=int, help="Nombre maximum de patients à traiter")
+    parser.add_argument("--dry-run", action="store_true", help="Compter sans rien écrire")
+    args = parser.parse_args()
+
+    print("🚀 Migration des photos base64 vers GridFS" + (" (simulation)" if args.dry_run else "") + "...")
+    print("=" * 50)
+
+    def progress(stats):
+        print(f"   ... {stats['migrated']} migrées, {stats['dropped']} champs retirés, "
+              f"{stats['skipped']} ignorées, {stats['errors']} erreurs, {format_bytes(stats['bytes_reclaimed'])} récupérés")
+
+    start = time.perf_counter()
+    stats = migrate_inline_photos(
+        batch_size=args.batch_size,
+        limit=args.limit,
+        dry_run=args.dry_run,
+        on_batch=progress
+    )
+
+    print(f"✅ {stats['migrated']} photo(s) migrée(s), {stats['dropped']} champ(s) inline retiré(s) "
+          f"en {time.perf_counter() - start:.2f}s")
+    print(f"✅ {format_bytes(stats['bytes_reclaimed'])} de base64 retirés des documents patients")
+    if stats["skipped"]:
+        print(f"⚠️ {stats['skipped']} photo(s) modifiée(s) pendant la migration, ignorée(s)")
+    if stats["errors"]:
+        print(f"⚠️ {stats['errors']} photo(s) illisible(s), laissée(s) en place: {', '.join(stats['failed_ids'])}")
+    print("=" * 50)
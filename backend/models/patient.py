@@ -17,7 +17,7 @@ quand on retourne les données d’un patient depuis MongoDB
 """
 
 from pydantic import BaseModel, Field, ConfigDict, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import date, datetime
 
 class PatientBase(BaseModel):
@@ -91,7 +91,6 @@ class PatientInDB(PatientBase):
     # ✅ NOUVEAUX CHAMPS POUR LA PHOTO
     photo_file_id: Optional[str] = None
     photo_url: Optional[str] = None
-    photo_data: Optional[str] = None  # Pour le stockage base64
     
     # ✅ AJOUTER les timestamps
     created_at: Optional[datetime] = None
@@ -113,5 +112,10 @@ class PhotoUploadResponse(BaseModel):
     photo_url: str
     file_id: str
 
+# Avatars d'une page de patients en une requête
+class PhotoBatchRequest(BaseModel):
+    patient_ids: List[str] = Field(..., min_length=1, max_length=100)
+    size: int = Field(48, ge=1, le=400)
+
 # ✅ ALIAS pour la compatibilité
 PatientResponse = PatientInDB
\ No newline at end of file
@@ -10,7 +10,7 @@ Ce fichier définit les modèles Pydantic pour les rendez-vous :
 
 Chaque rendez-vous est lié à un patient et un médecin
 
-Il contient la date, l'heure, le motif, et l’état du rendez-vous
+Il contient la date, l'heure, la durée (en minutes), le motif, et l’état du rendez-vous
 """
 
 from pydantic import BaseModel, Field
@@ -22,6 +22,7 @@ class RendezVousBase(BaseModel):
     medecin_id: str  # Changé de str à int pour correspondre à l'interface TS
     date_rendez_vous: str  # Ajouté pour séparer date et heure
     heure: str  # Ajouté pour correspondre à l'interface TS
+    duree: int = Field(15, ge=5, le=240)  # Durée en minutes
     motif: Optional[str] = None
     statut: str = "programme"  # Changé de "en attente" à "programme"
 
@@ -31,6 +32,7 @@ class RendezVousCreate(RendezVousBase):
 class RendezVousUpdate(BaseModel):
     date_rendez_vous: Optional[datetime] = None
     heure: Optional[str] = None
+    duree: Optional[int] = Field(None, ge=5, le=240)
     motif: Optional[str] = None
     statut: Optional[str] = None
 
@@ -0,0 +1,23 @@
+"""
+Reconstruit le rollup quotidien des consultations (collection
+`consultation_stats`) à partir des consultations existantes.
+
+L'API la construit d'elle-même à la première lecture si elle ne l'a jamais été ;
+à lancer en cas de doute sur la cohérence (ou pour la construire hors trafic) :
+    python rebuild_consultation_stats.py
+"""
+
+import time
+
+from utils.consultation_stats import ensure_indexes, rebuild_stats
+
+if __name__ == "__main__":
+    print("🚀 Reconstruction des statistiques de consultations...")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    ensure_indexes()
+    rows = rebuild_stats()
+
+    print(f"✅ {rows} lignes de rollup reconstruites en {time.perf_counter() - start:.2f}s")
+    print("=" * 50)
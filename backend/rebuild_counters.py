@@ -0,0 +1,23 @@
+"""
+Reconstruit la collection `counters` (chiffres du tableau de bord) à partir
+des patients, consultations et rendez-vous existants.
+
+L'API la construit d'elle-même à la première lecture si elle ne l'a jamais été ;
+à lancer en cas de doute sur la cohérence (ou pour la construire hors trafic) :
+    python rebuild_counters.py
+"""
+
+import time
+
+from utils.counters import ensure_indexes, rebuild_counters
+
+if __name__ == "__main__":
+    print("🚀 Reconstruction des compteurs du tableau de bord...")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    ensure_indexes()
+    documents = rebuild_counters()
+
+    print(f"✅ {documents} compteurs reconstruits en {time.perf_counter() - start:.2f}s")
+    print("=" * 50)
@@ -0,0 +1,29 @@
+"""
+Reconstruit la collection `occupancy` (occupation par médecin et par jour)
+à partir des rendez-vous existants.
+
+L'API la construit d'elle-même à la première lecture si elle ne l'a jamais été ;
+à lancer en cas de doute sur la cohérence (ou pour la construire hors trafic) :
+    python rebuild_occupancy.py
+    python rebuild_occupancy.py --medecin-id <id>
+"""
+
+import argparse
+import time
+
+from utils.occupancy import ensure_indexes, rebuild_occupancy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruction de l'occupation des plannings")
+    parser.add_argument("--medecin-id", help="Limiter la reconstruction à un médecin")
+    args = parser.parse_args()
+
+    print("🚀 Reconstruction de l'occupation des plannings...")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    ensure_indexes()
+    days = rebuild_occupancy(args.medecin_id)
+
+    print(f"✅ {days} journées reconstruites en {time.perf_counter() - start:.2f}s")
+    print("=" * 50)
@@ -0,0 +1,33 @@
+"""
+Recalcule le rollup `doctor_patterns` (statistiques historiques par médecin).
+
+Les documents sont aussi recalculés à la demande lorsqu'ils sont périmés ;
+ce script permet de les tenir à jour par une tâche planifiée (cron), par ex.
+chaque nuit :
+    python refresh_doctor_patterns.py
+    python refresh_doctor_patterns.py --medecin-id <id>
+"""
+
+import argparse
+import time
+
+from utils.doctor_patterns import ensure_indexes, refresh_all, refresh_patterns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcul des patterns historiques des médecins")
+    parser.add_argument("--medecin-id", help="Limiter le recalcul à un médecin")
+    args = parser.parse_args()
+
+    print("🚀 Recalcul des patterns historiques des médecins...")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    ensure_indexes()
+    if args.medecin_id:
+        refresh_patterns(args.medecin_id)
+        count = 1
+    else:
+        count = refresh_all()
+
+    print(f"✅ {count} médecin(s) recalculé(s) en {time.perf_counter() - start:.2f}s")
+    print("=" * 50)
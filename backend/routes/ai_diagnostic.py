@@ -1,11 +1,28 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from bson import ObjectId
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
+import json
 
 from database import db
+from config import AI_CASE_SIMILARITY_THRESHOLD
+from utils.security import get_current_user
 from ai.gemini_service import GeminiService
-from ai.schemas import DiagnosticRequest, DiagnosticResponse, AISuggestionCreate, AISuggestionInDB
+from ai.dependencies import get_gemini_service
+from ai.instrumentation import ai_metrics, track_ai_call
+from ai.case_index import similar_case_index, response_from_case
+from ai.client import run_ai_call
+from utils.response_cache import response_cache, cached_response
+from ai.schemas import (
+    DiagnosticRequest,
+    BatchDiagnosticRequest,
+    DiagnosticResponse,
+    AISuggestionCreate,
+    AISuggestionInDB,
+)
 
 import logging
 
@@ -19,9 +36,6 @@ ai_router = APIRouter(
     tags=["IA Diagnostique"]
 )
 
-# Instance du service Gemini
-gemini_service = GeminiService()
-
 def ai_suggestion_helper(doc: dict) -> dict:
     """Convertir un document MongoDB en dict pour l'API"""
     return {
@@ -37,8 +51,35 @@ def ai_suggestion_helper(doc: dict) -> dict:
         "updated_at": doc["updated_at"].isoformat() if doc.get("updated_at") else None,
     }
 
+def match_validated_case(motif: str, symptomes: str, patient_info: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Cherche un cas similaire déjà validé par un médecin, pour un patient de même
+    tranche d'âge et de même sexe. Appel bloquant (construction de l'index au
+    premier usage) : depuis une route async, passer par run_in_threadpool.
+    Retourne la réponse de diagnostic correspondante, ou None si aucun cas n'est assez proche.
+    """
+    match = similar_case_index.best_match(
+        ai_suggestions_collection,
+        motif,
+        symptomes,
+        AI_CASE_SIMILARITY_THRESHOLD,
+        patient_info
+    )
+    if not match:
+        return None
+    
+    similarity, case = match
+    with track_ai_call("diagnostic") as call:
+        call.mark_cache_hit()
+        call.mark_parsed(True)
+    logger.info(f"Cas similaire validé trouvé ({similarity:.2f}): {case['id']}")
+    return response_from_case(case, similarity)
+
 @ai_router.post("/diagnostic", response_model=DiagnosticResponse)
-async def generate_diagnostic_suggestions(request: DiagnosticRequest):
+async def generate_diagnostic_suggestions(
+    request: DiagnosticRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service)
+):
     """
     Génère des suggestions de diagnostic basées sur les symptômes et informations patient
     """
@@ -52,14 +93,22 @@ async def generate_diagnostic_suggestions(request: DiagnosticRequest):
                 detail="Le motif et les symptômes sont requis pour l'analyse IA"
             )
         
+        # Cas similaire déjà validé par un médecin : réponse immédiate sans appel à Gemini
+        cached = await run_in_threadpool(
+            match_validated_case, request.motif, request.symptomes, request.patient_info
+        )
+        if cached:
+            return DiagnosticResponse(**cached)
+        
         # Préparer les données pour Gemini
         consultation_data = {
             "motif": request.motif,
             "symptomes": request.symptomes
         }
         
-        # Appeler le service Gemini
-        result = gemini_service.generate_diagnostic_suggestions(
+        # Appeler le service Gemini (hors boucle d'événements, sous la limite de concurrence IA)
+        result = await run_ai_call(
+            gemini_service.generate_diagnostic_suggestions,
             patient_info=request.patient_info,
             consultation_data=consultation_data
         )
@@ -82,6 +131,108 @@ async def generate_diagnostic_suggestions(request: DiagnosticRequest):
             detail=f"Erreur lors de la génération des suggestions: {str(e)}"
         )
 
+def _batch_item_key(item: DiagnosticRequest) -> str:
+    """Clé de déduplication d'un élément de lot"""
+    return json.dumps({
+        "patient_info": item.patient_info,
+        "motif": " ".join(item.motif.lower().split()),
+        "symptomes": " ".join(item.symptomes.lower().split()),
+    }, sort_keys=True, default=str)
+
+def _batch_line(index: int, source: str, result: Optional[Dict] = None, error: Optional[str] = None) -> str:
+    """Ligne NDJSON renvoyée pour un élément du lot"""
+    if result is not None:
+        try:
+            result = DiagnosticResponse(**result).dict()
+        except Exception as e:
+            result, error = None, f"Réponse IA invalide: {str(e)}"
+    return json.dumps({
+        "index": index,
+        "success": result is not None,
+        "source": source,
+        "result": result,
+        "error": error,
+    }, ensure_ascii=False) + "\n"
+
+@ai_router.post("/diagnostic/batch")
+async def generate_batch_diagnostic_suggestions(
+    batch: BatchDiagnosticRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service)
+):
+    """
+    Génère des suggestions de diagnostic pour plusieurs consultations en un appel.
+    
+    Les requêtes identiques sont dédupliquées, les cas validés similaires sont servis
+    depuis l'index local, les autres sont envoyés à Gemini en parallèle (sous la limite
+    de concurrence IA), éventuellement regroupés par `pack_size` dans un même prompt.
+    Les résultats sont renvoyés en NDJSON, une ligne par élément dès qu'il est prêt.
+    """
+    logger.info(f"Requête IA groupée reçue: {len(batch.requests)} éléments")
+    
+    immediate: List[str] = []
+    groups: Dict[str, List[int]] = {}
+    unique: Dict[str, DiagnosticRequest] = {}
+    
+    for index, item in enumerate(batch.requests):
+        if not item.motif.strip() or not item.symptomes.strip():
+            immediate.append(_batch_line(
+                index, "validation",
+                error="Le motif et les symptômes sont requis pour l'analyse IA"
+            ))
+            continue
+        key = _batch_item_key(item)
+        if key not in groups:
+            groups[key] = []
+            unique[key] = item
+        groups[key].append(index)
+    
+    pending_keys = []
+    for key, item in unique.items():
+        cached = await run_in_threadpool(match_validated_case, item.motif, item.symptomes, item.patient_info)
+        if cached:
+            immediate.extend(_batch_line(i, "cas_valide", result=cached) for i in groups[key])
+        else:
+            pending_keys.append(key)
+    
+    packs = [
+        pending_keys[i:i + batch.pack_size]
+        for i in range(0, len(pending_keys), batch.pack_size)
+    ]
+    
+    async def run_pack(keys: List[str]):
+        cases = [
+            (unique[key].patient_info, {"motif": unique[key].motif, "symptomes": unique[key].symptomes})
+            for key in keys
+        ]
+        try:
+            results = await run_ai_call(gemini_service.generate_batch_diagnostic_suggestions, cases)
+        except Exception as e:
+            logger.error(f"Erreur lot diagnostic: {e}", exc_info=True)
+            results = [{"success": False, "error": str(e)} for _ in keys]
+        return keys, results
+    
+    async def stream():
+        for line in immediate:
+            yield line
+        
+        tasks = [asyncio.create_task(run_pack(keys)) for keys in packs]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                keys, results = await finished
+                for key, result in zip(keys, results):
+                    for index in groups[key]:
+                        if result.get("success"):
+                            yield _batch_line(index, "ia", result=result["suggestions"])
+                        else:
+                            yield _batch_line(index, "ia", error=f"Erreur IA: {result.get('error', 'Erreur inconnue')}")
+        finally:
+            # Client déconnecté : annuler les appels restants
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @ai_router.post("/save-suggestion", response_model=AISuggestionInDB)
 async def save_ai_suggestion(suggestion: AISuggestionCreate):
     """
@@ -106,6 +257,9 @@ async def save_ai_suggestion(suggestion: AISuggestionCreate):
                 detail="Erreur lors de la sauvegarde de la suggestion IA"
             )
         
+        similar_case_index.add(created)
+        response_cache.invalidate("ai_suggestions")
+        
         logger.info(f"Suggestion IA sauvegardée: {created}")
         return ai_suggestion_helper(created)
         
@@ -157,6 +311,12 @@ async def validate_ai_suggestion(suggestion_id: str, selected_diagnostic: str):
                 detail="Suggestion IA non trouvée"
             )
         
+        # Mise à jour incrémentale de l'index de cas similaires
+        validated_doc = ai_suggestions_collection.find_one({"_id": obj_id})
+        if validated_doc:
+            similar_case_index.add(validated_doc)
+        response_cache.invalidate("ai_suggestions")
+        
         return {"message": "Suggestion validée avec succès"}
         
     except Exception as e:
@@ -167,6 +327,7 @@ async def validate_ai_suggestion(suggestion_id: str, selected_diagnostic: str):
         )
 
 @ai_router.get("/stats/usage")
+@cached_response("ai.stats.usage", tags=lambda: ["ai_suggestions"])
 async def get_ai_usage_stats():
     """
     Statistiques d'utilisation de l'IA diagnostique
@@ -198,4 +359,18 @@ async def get_ai_usage_stats():
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur lors du calcul des statistiques: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@ai_router.get("/metrics")
+async def get_ai_call_metrics(current_user: dict = Depends(get_current_user)):
+    """
+    Mesures des appels IA par fonctionnalité (latence, tokens, parsing, cache)
+    Accessible uniquement aux administrateurs
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les administrateurs peuvent consulter les métriques IA"
+        )
+    
+    return ai_metrics.snapshot()
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from ai.planning_service import PlanningService
+from ai.dependencies import get_planning_service
+from ai import schedule_bitmap as bitmap
+from ai.availability_search import find_first_available, eligible_doctor_ids
+from ai.workload_heatmap import compute_heatmap, workload_level, working_days
+from ai.bulk_reschedule import plan_reschedule, apply_reschedule
+from utils import occupancy
+from utils.response_cache import cached_response
 from database import db
 import logging
 
@@ -50,11 +57,38 @@ class PlanningResponse(BaseModel):
     efficiency_score: int
     estimated_duration: int
 
+class FirstAvailableRequest(BaseModel):
+    medecin_ids: Optional[List[str]] = None  # Tous les médecins si absent
+    duree: int = Field(15, ge=5, le=240)  # Durée de la consultation en minutes
+    horizon_days: int = Field(14, ge=1, le=60)
+    limit: int = Field(5, ge=1, le=50)
+
+class AvailableSlot(BaseModel):
+    medecin_id: str
+    medecin_nom: str
+    date: str
+    time: str
+    duree: int
+    day_load: int
+
+class FirstAvailableResponse(BaseModel):
+    slots: List[AvailableSlot]
+    doctors_searched: int
+
+class BulkRescheduleRequest(BaseModel):
+    medecin_id: str  # Médecin absent
+    date_from: str
+    date_to: str
+    substitute_ids: Optional[List[str]] = None  # Tous les autres médecins si absent
+    horizon_days: int = Field(14, ge=1, le=60)  # Jours de recherche après l'absence
+    dry_run: bool = False  # Calculer le plan sans l'appliquer
+
 class WorkloadAnalysis(BaseModel):
     date: str
     total_appointments: int
     occupied_hours: List[str]
     available_slots: int
+    largest_free_window: int = 0  # minutes
     workload_level: str
     recommendations: List[str]
 
@@ -64,11 +98,11 @@ planning_router = APIRouter(
     tags=["Planification IA"]
 )
 
-# Instance du service
-planning_service = PlanningService()
-
 @planning_router.post("/suggest-smart-datetime", response_model=SmartDateTimeResponse)
-async def suggest_smart_datetime(request: SmartDateTimeRequest):
+async def suggest_smart_datetime(
+    request: SmartDateTimeRequest,
+    planning_service: PlanningService = Depends(get_planning_service)
+):
     """
     🆕 NOUVELLE ROUTE : Suggère automatiquement date ET heure basé sur le motif seulement
     """
@@ -123,7 +157,10 @@ async def suggest_smart_datetime(request: SmartDateTimeRequest):
         )
 
 @planning_router.post("/suggest-slots", response_model=PlanningResponse)
-async def suggest_optimal_slots(request: PlanningRequest):
+async def suggest_optimal_slots(
+    request: PlanningRequest,
+    planning_service: PlanningService = Depends(get_planning_service)
+):
     """
     Suggère les créneaux optimaux pour un rendez-vous
     """
@@ -185,6 +222,110 @@ async def suggest_optimal_slots(request: PlanningRequest):
             detail=f"Erreur lors de la génération des suggestions: {str(e)}"
         )
 
+@planning_router.post("/first-available", response_model=FirstAvailableResponse)
+def first_available(request: FirstAvailableRequest):
+    """
+    Premiers créneaux disponibles tous médecins confondus (ex: motif urgent)
+    """
+    try:
+        result = find_first_available(
+            medecin_ids=request.medecin_ids,
+            duree=request.duree,
+            horizon_days=request.horizon_days,
+            limit=request.limit
+        )
+        logger.info(
+            f"Premiers créneaux: {len(result['slots'])} trouvés sur {result['doctors_searched']} médecins"
+        )
+        return FirstAvailableResponse(**result)
+        
+    except Exception as e:
+        logger.error(f"Erreur recherche premier créneau: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la recherche de créneaux: {str(e)}"
+        )
+
+# Durée maximale d'absence traitée en une requête (taille du plan en mémoire)
+MAX_RESCHEDULE_DAYS = 31
+
+@planning_router.post("/reschedule-bulk")
+def reschedule_bulk(request: BulkRescheduleRequest):
+    """
+    Reprogramme tous les RDV d'un médecin absent sur une période
+    (même médecin après l'absence ou remplaçants, selon l'urgence du motif)
+    """
+    try:
+        try:
+            start = datetime.strptime(request.date_from, "%Y-%m-%d")
+            end = datetime.strptime(request.date_to, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Format de date invalide. Utilisez YYYY-MM-DD"
+            )
+        if end < start:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La date de fin doit suivre la date de début"
+            )
+        if (end - start).days >= MAX_RESCHEDULE_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Période invalide (maximum {MAX_RESCHEDULE_DAYS} jours)"
+            )
+        
+        plan = plan_reschedule(
+            request.medecin_id,
+            request.date_from,
+            request.date_to,
+            substitute_ids=request.substitute_ids,
+            horizon_days=request.horizon_days
+        )
+        assignments = plan["assignments"]
+        
+        result = {"moved": [], "failed": []}
+        if not request.dry_run:
+            result = apply_reschedule(assignments)
+        
+        logger.info(
+            f"Reprogrammation médecin {request.medecin_id}: {len(assignments)} planifiés, "
+            f"{len(result['moved'])} déplacés, {len(plan['unassigned'])} sans créneau"
+        )
+        return {
+            "dry_run": request.dry_run,
+            "planned": [
+                {
+                    "rendezvous_id": str(item["rendezvous"]["_id"]),
+                    "from": {
+                        "medecin_id": str(item["rendezvous"]["medecin_id"]),
+                        "date_rendez_vous": occupancy.format_rdv_date(item["rendezvous"]["date_rendez_vous"]),
+                        "heure": item["rendezvous"].get("heure")
+                    },
+                    "to": {
+                        "medecin_id": item["medecin_id"],
+                        "date_rendez_vous": item["date_rendez_vous"],
+                        "heure": item["heure"]
+                    },
+                    "urgency": item["urgency"],
+                    "cost": item["cost"]
+                }
+                for item in assignments
+            ],
+            "moved": result["moved"],
+            "failed": result["failed"],
+            "unassigned": plan["unassigned"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur reprogrammation: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la reprogrammation: {str(e)}"
+        )
+
 @planning_router.get("/workload-analysis/{medecin_id}/{date}", response_model=WorkloadAnalysis)
 async def analyze_daily_workload(medecin_id: str, date: str):
     """
@@ -202,48 +343,31 @@ async def analyze_daily_workload(medecin_id: str, date: str):
                 detail="Format de date invalide"
             )
         
-        # Récupérer les RDV existants
-        rendezvous_collection = db["rendezvous"]
-        existing_rdv = list(rendezvous_collection.find({
-            "medecin_id": medecin_id,
-            "date_rendez_vous": date,
-            "statut": {"$ne": "annule"}
-        }).sort("heure", 1))
+        # Occupation de la journée (lecture ponctuelle indexée)
+        day = occupancy.get_day_occupancy(medecin_id, date)
         
         # Calculer les statistiques
-        total_appointments = len(existing_rdv)
-        occupied_hours = [rdv["heure"] for rdv in existing_rdv]
-        
-        # Générer tous les créneaux possibles (8h-18h45, par 15min)
-        all_possible_slots = []
-        for hour in range(8, 19):
-            for minute in [0, 15, 30, 45]:
-                if hour == 18 and minute > 45:
-                    break
-                all_possible_slots.append(f"{hour:02d}:{minute:02d}")
-        
-        available_slots = len([slot for slot in all_possible_slots if slot not in occupied_hours])
-        
-        # Déterminer le niveau de charge
-        occupancy_rate = total_appointments / len(all_possible_slots)
-        if occupancy_rate < 0.3:
-            workload_level = "leger"
-        elif occupancy_rate < 0.6:
-            workload_level = "normal"
-        elif occupancy_rate < 0.8:
-            workload_level = "charge"
-        else:
-            workload_level = "surcharge"
+        total_appointments = day.get("count", 0) if day else 0
+        occupied_hours = occupancy.start_times(medecin_id, date) if total_appointments else []
+        
+        # Masque des créneaux occupés (8h-18h45, par 15min), durées des RDV comprises
+        mask = occupancy.day_mask(day)
+        available_slots = bitmap.free_count(mask)
+        largest_free_window = occupancy.day_intervals(day).largest_free_window()
+        
+        # Déterminer le niveau de charge (part de la journée occupée)
+        occupancy_rate = bitmap.occupied_count(mask) / bitmap.SLOT_COUNT
+        level = workload_level(occupancy_rate)
         
         # Générer des recommandations
         recommendations = []
-        if workload_level == "leger":
+        if level == "leger":
             recommendations.append("Journée légère - Possibilité d'ajouter des RDV")
             recommendations.append("Idéal pour les consultations longues ou complexes")
-        elif workload_level == "normal":
+        elif level == "normal":
             recommendations.append("Charge équilibrée")
             recommendations.append("Maintenir les pauses pour optimiser la qualité")
-        elif workload_level == "charge":
+        elif level == "charge":
             recommendations.append("Journée bien remplie")
             recommendations.append("Éviter les nouveaux RDV non urgents")
             recommendations.append("Prévoir des pauses courtes entre consultations")
@@ -257,7 +381,8 @@ async def analyze_daily_workload(medecin_id: str, date: str):
             total_appointments=total_appointments,
             occupied_hours=occupied_hours,
             available_slots=available_slots,
-            workload_level=workload_level,
+            largest_free_window=largest_free_window,
+            workload_level=level,
             recommendations=recommendations
         )
         
@@ -270,62 +395,138 @@ async def analyze_daily_workload(medecin_id: str, date: str):
             detail=f"Erreur lors de l'analyse: {str(e)}"
         )
 
+MAX_HEATMAP_DAYS = 92
+
+@planning_router.get("/workload-heatmap")
+def get_workload_heatmap(
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    medecin_ids: Optional[str] = Query(None, description="Identifiants séparés par des virgules (tous si absent)")
+):
+    """
+    Carte de charge médecins × jours ouvrés : taux d'occupation, niveau de charge
+    et alertes de surcharge par cellule, en un seul appel
+    """
+    try:
+        today = datetime.now()
+        try:
+            start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else datetime(today.year, today.month, today.day)
+            end = datetime.strptime(date_to, "%Y-%m-%d") if date_to else start + timedelta(days=29)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Format de date invalide. Utilisez YYYY-MM-DD"
+            )
+        if end < start or (end - start).days >= MAX_HEATMAP_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Période invalide (maximum {MAX_HEATMAP_DAYS} jours)"
+            )
+        
+        requested = [mid.strip() for mid in medecin_ids.split(",") if mid.strip()] if medecin_ids else None
+        doctors = eligible_doctor_ids(requested)
+        
+        heatmap = compute_heatmap(list(doctors), working_days(start, end))
+        heatmap["medecin_noms"] = list(doctors.values())
+        return heatmap
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur carte de charge: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors du calcul de la carte de charge: {str(e)}"
+        )
+
+MAX_REPORT_DAYS = 366
+
 @planning_router.get("/optimization-report/{medecin_id}")
-async def get_weekly_optimization_report(medecin_id: str):
+@cached_response("planning.optimization_report", tags=lambda medecin_id, **_: [f"rendezvous:{medecin_id}"])
+async def get_weekly_optimization_report(
+    medecin_id: str,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to")
+):
     """
-    Génère un rapport d'optimisation hebdomadaire
+    Génère un rapport d'optimisation sur une période (semaine en cours par défaut).
+    Une seule agrégation sur `rendezvous` pour toute la période.
     """
     try:
         print(f"📈 Génération rapport d'optimisation pour médecin {medecin_id}")
         
-        # Analyser la semaine actuelle (lundi à vendredi)
+        # Période : semaine actuelle (lundi à vendredi) par défaut
         today = datetime.now()
-        monday = today - timedelta(days=today.weekday())
+        try:
+            start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else today - timedelta(days=today.weekday())
+            end = datetime.strptime(date_to, "%Y-%m-%d") if date_to else start + timedelta(days=4)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Format de date invalide. Utilisez YYYY-MM-DD"
+            )
+        if end < start or (end - start).days >= MAX_REPORT_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Période invalide (maximum {MAX_REPORT_DAYS} jours)"
+            )
+        start_str = start.strftime("%Y-%m-%d")
+        end_str = end.strftime("%Y-%m-%d")
         
-        weekly_analysis = []
-        for i in range(5):  # Lundi à vendredi
-            day = monday + timedelta(days=i)
-            date_str = day.strftime("%Y-%m-%d")
-            
-            # Analyser chaque jour
-            rendezvous_collection = db["rendezvous"]
-            daily_rdv = list(rendezvous_collection.find({
+        # Tous les RDV de la période, regroupés par jour avec les heures triées
+        rendezvous_collection = db["rendezvous"]
+        rows = rendezvous_collection.aggregate([
+            {"$match": {
                 "medecin_id": medecin_id,
-                "date_rendez_vous": date_str,
+                "date_rendez_vous": {"$gte": start_str, "$lte": end_str},
                 "statut": {"$ne": "annule"}
-            }))
+            }},
+            {"$sort": {"date_rendez_vous": 1, "heure": 1}},
+            {"$group": {
+                "_id": "$date_rendez_vous",
+                "times": {"$push": "$heure"}
+            }}
+        ])
+        times_by_day = {row["_id"]: row["times"] for row in rows}
+        
+        weekly_analysis = []
+        for i in range((end - start).days + 1):  # Jours ouvrés de la période
+            day = start + timedelta(days=i)
+            if day.weekday() >= 5:
+                continue
+            date_str = day.strftime("%Y-%m-%d")
+            times = times_by_day.get(date_str, [])
             
             daily_analysis = {
                 "date": date_str,
                 "day_name": day.strftime("%A"),
-                "appointments_count": len(daily_rdv),
-                "first_appointment": daily_rdv[0]["heure"] if daily_rdv else None,
-                "last_appointment": daily_rdv[-1]["heure"] if daily_rdv else None,
+                "appointments_count": len(times),
+                "first_appointment": times[0] if times else None,
+                "last_appointment": times[-1] if times else None,
                 "gaps": []
             }
             
-            # Analyser les gaps
-            if len(daily_rdv) > 1:
-                times = sorted([rdv["heure"] for rdv in daily_rdv])
-                for j in range(1, len(times)):
-                    try:
-                        t1 = datetime.strptime(times[j-1], "%H:%M")
-                        t2 = datetime.strptime(times[j], "%H:%M")
-                        gap_minutes = (t2 - t1).seconds // 60
-                        if gap_minutes > 30:  # Gaps > 30 min
-                            daily_analysis["gaps"].append({
-                                "start": times[j-1],
-                                "end": times[j],
-                                "duration": gap_minutes
-                            })
-                    except:
-                        continue
+            # Analyser les gaps (heures déjà triées par l'agrégation)
+            for j in range(1, len(times)):
+                try:
+                    t1 = datetime.strptime(times[j-1], "%H:%M")
+                    t2 = datetime.strptime(times[j], "%H:%M")
+                    gap_minutes = (t2 - t1).seconds // 60
+                    if gap_minutes > 30:  # Gaps > 30 min
+                        daily_analysis["gaps"].append({
+                            "start": times[j-1],
+                            "end": times[j],
+                            "duration": gap_minutes
+                        })
+                except:
+                    continue
             
             weekly_analysis.append(daily_analysis)
         
         # Générer des recommandations globales
         total_appointments = sum(day["appointments_count"] for day in weekly_analysis)
-        avg_daily_load = total_appointments / 5 if total_appointments > 0 else 0
+        day_count = len(weekly_analysis)
+        avg_daily_load = total_appointments / day_count if total_appointments > 0 else 0
         
         global_recommendations = []
         if avg_daily_load < 5:
@@ -335,11 +536,12 @@ async def get_weekly_optimization_report(medecin_id: str):
         
         # Identifier les jours déséquilibrés
         loads = [day["appointments_count"] for day in weekly_analysis]
-        if max(loads) - min(loads) > 8:
+        if loads and max(loads) - min(loads) > 8:
             global_recommendations.append("Répartition déséquilibrée - Rééquilibrer la charge")
         
         return {
-            "week_start": monday.strftime("%Y-%m-%d"),
+            "week_start": start_str,
+            "period": {"from": start_str, "to": end_str, "working_days": day_count},
             "total_appointments": total_appointments,
             "average_daily_load": round(avg_daily_load, 1),
             "daily_analysis": weekly_analysis,
@@ -351,6 +553,8 @@ async def get_weekly_optimization_report(medecin_id: str):
             ]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur génération rapport: {e}", exc_info=True)
         raise HTTPException(
@@ -19,7 +19,7 @@ Récupérer une consultation par son ID
 
 from fastapi import APIRouter, HTTPException, status, Body, Query
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 from datetime import datetime, date
 from pydantic import BaseModel
 import math
@@ -29,6 +29,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 from database import db
+from utils import counters, consultation_stats
+from utils.response_cache import response_cache, cached_response
 from models.consultation import (
     ConsultationCreate,
     ConsultationUpdate,
@@ -164,6 +166,9 @@ def create_consultation(consultation: ConsultationCreate):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Erreur lors de la création de la consultation"
             )
+        counters.apply_consultation(created, +1)
+        consultation_stats.apply_consultation(created, +1)
+        response_cache.invalidate("consultations", str(created["medecin_id"]))
             
         return consultation_helper(created)
         
@@ -314,6 +319,9 @@ def update_consultation(consultation_id: str, updates: ConsultationUpdate = Body
 
     # Récupérer le document mis à jour
     updated = consultations_collection.find_one({"_id": obj_id})
+    counters.replace_consultation(existing, updated)
+    consultation_stats.replace_consultation(existing, updated)
+    response_cache.invalidate("consultations", str(existing.get("medecin_id") or ""), str(updated.get("medecin_id") or ""))
     return consultation_helper(updated)
 
 # Route : Supprimer une consultation
@@ -336,6 +344,9 @@ def delete_consultation(consultation_id: str):
     result = consultations_collection.delete_one({"_id": obj_id})
     
     if result.deleted_count == 1:
+        counters.apply_consultation(existing, -1)
+        consultation_stats.apply_consultation(existing, -1)
+        response_cache.invalidate("consultations", str(existing.get("medecin_id") or ""))
         logger.info(f"Consultation {consultation_id} supprimée avec succès")
         return {"message": "Consultation supprimée avec succès"}
     else:
@@ -367,35 +378,41 @@ def search_consultations(
 
 # Route : Statistiques des consultations
 @consultations_router.get("/stats/general")
+@cached_response("consultations.stats.general", tags=lambda: ["consultations"])
 def get_consultation_stats():
-    """Obtenir des statistiques générales sur les consultations"""
+    """Obtenir des statistiques générales sur les consultations (rollup quotidien)"""
     try:
-        # Nombre total de consultations
-        total_consultations = consultations_collection.count_documents({})
-        
-        # Consultations par mois (derniers 6 mois)
-        from datetime import datetime, timedelta
-        six_months_ago = datetime.utcnow() - timedelta(days=180)
-        
-        recent_consultations = consultations_collection.count_documents({
-            "created_at": {"$gte": six_months_ago}
-        })
-        
-        # Consultations par médecin (top 10)
-        pipeline = [
-            {"$group": {"_id": "$medecin_id", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ]
-        
-        consultations_by_medecin = list(consultations_collection.aggregate(pipeline))
-        
-        return {
-            "total_consultations": total_consultations,
-            "recent_consultations": recent_consultations,
-            "consultations_by_medecin": consultations_by_medecin
-        }
+        # Total, consultations des 6 derniers mois et top 10 des médecins
+        return consultation_stats.general_stats(recent_days=180, top=10)
         
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des statistiques: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Erreur lors du calcul des statistiques")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Erreur lors du calcul des statistiques")
+
+# Route : Statistiques sur une période (par jour, semaine ou mois)
+@consultations_router.get("/stats/range")
+@cached_response(
+    "consultations.stats.range",
+    tags=lambda medecin_id=None, **_: [f"consultations:{medecin_id}" if medecin_id else "consultations"]
+)
+def get_consultation_stats_range(
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    granularity: str = Query("day"),
+    medecin_id: Optional[str] = Query(None)
+):
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d")
+        end = datetime.strptime(date_to, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Format de date invalide. Utilisez YYYY-MM-DD")
+    if end < start:
+        raise HTTPException(status_code=400, detail="La date de fin doit suivre la date de début")
+    if granularity not in consultation_stats.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularité invalide (day, week ou month)")
+
+    try:
+        return consultation_stats.query_stats(date_from, date_to, granularity, medecin_id)
+    except Exception as e:
+        logger.error(f"Erreur lors du calcul des statistiques: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur lors du calcul des statistiques")
@@ -0,0 +1,54 @@
+# routes/dashboard.py
+"""
+Route du tableau de bord.
+
+Rôle dans le projet :
+Ce fichier expose en un seul appel tous les chiffres du tableau de bord
+(patients, consultations du jour et du mois, rendez-vous à venir par statut),
+lus dans les compteurs précalculés (utils/counters.py) au lieu de listes
+paginées et de comptages à chaque affichage.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+
+from utils.security import get_current_user
+from utils import counters
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+dashboard_router = APIRouter()
+
+
+@dashboard_router.get("/summary")
+def get_dashboard_summary(
+    medecin_id: Optional[str] = Query(None, description="Admin uniquement : périmètre d'un médecin"),
+    current_user: dict = Depends(get_current_user)
+):
+    # ✅ DÉTERMINER LE PÉRIMÈTRE SELON LE RÔLE
+    if current_user['role'] == 'medecin':
+        scope = current_user['id']
+    elif current_user['role'] == 'secretaire':
+        scope = current_user.get('medecin_id')
+        if not scope:
+            raise HTTPException(status_code=400, detail="Secrétaire sans médecin associé")
+    elif current_user['role'] == 'admin':
+        scope = medecin_id or counters.GLOBAL_SCOPE
+    else:
+        raise HTTPException(status_code=403, detail="Rôle non autorisé")
+
+    try:
+        summary = counters.get_summary(scope)
+    except Exception as e:
+        logger.error(f"Erreur tableau de bord: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur lors du chargement du tableau de bord")
+
+    summary["user"] = {
+        "id": current_user.get("id"),
+        "nom": current_user.get("nom"),
+        "role": current_user.get("role"),
+        "medecin_id": current_user.get("medecin_id"),
+    }
+    return summary
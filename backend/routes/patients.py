@@ -19,19 +19,27 @@ Supprimer un patient (optionnel)
 Chaque route utilise les modèles Pydantic définis dans models/patient.py et la base MongoDB via database.py.
 """
 
-from fastapi import APIRouter, HTTPException, status, Body, Query, Depends, UploadFile, Form, File
+from fastapi import APIRouter, HTTPException, status, Body, Query, Depends, UploadFile, Form, File, Request
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime, date
 from database import db, get_database
-from models.patient import PatientCreate, PatientUpdate, PatientInDB, PhotoUploadResponse
+from models.patient import PatientCreate, PatientUpdate, PatientInDB, PhotoUploadResponse, PhotoBatchRequest
 from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
 from utils.security import get_current_user
-from fastapi.responses import StreamingResponse
+from utils import counters
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from bson.errors import InvalidId
 import io
-from PIL import Image
+import asyncio
+import base64
+from utils.photo_processing import (
+    photo_pipeline, PhotoProcessingError, PipelineBusy,
+    VARIANT_FORMATS, MAIN_VARIANT, variant_key, pick_variant
+)
+from utils.upload_limits import read_capped
+from utils.gridfs_cache import gridfs_cache, CachedFile
+from utils.gridfs_http import etag_for, etag_matches, not_modified, gridfs_response
 import logging
 
 patients_collection = db["patients"]
@@ -42,11 +50,9 @@ users_collection = db["users"]
 logger = logging.getLogger(__name__)
 
 # Configuration pour les photos
-ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-PHOTO_MAX_WIDTH = 800
-PHOTO_MAX_HEIGHT = 600
-PHOTO_QUALITY = 85
+# Chemin d'upload, plafonné avant l'analyse multipart (voir UploadSizeLimitMiddleware)
+PHOTO_UPLOAD_PATH = r"^/patients/id/[^/]+/photo$"
 
 patients_router = APIRouter(
     tags=["Patients"]
@@ -77,7 +83,6 @@ def patient_helper(patient: dict) -> dict:
         # ✅ AJOUTER TOUS LES CHAMPS PHOTO
         "photo_file_id": patient.get("photo_file_id"),
         "photo_url": patient.get("photo_url"),
-        "photo_data": patient.get("photo_data"),
         "photo_filename": patient.get("photo_filename"),
         "photo_content_type": patient.get("photo_content_type"),
         
@@ -286,6 +291,7 @@ def create_patient(patient: PatientCreate, current_user: dict = Depends(get_curr
     # Insérer le patient
     result = patients_collection.insert_one(patient_data)
     created = patients_collection.find_one({"_id": result.inserted_id})
+    counters.apply_patient(created, +1)
     
     return patient_helper(created)
 
@@ -380,6 +386,7 @@ def delete_patient(patient_id: str, current_user: dict = Depends(get_current_use
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Impossible de supprimer le patient")
+    counters.apply_patient(patient, -1)
     
 @patients_router.get("/id/{patient_id}", response_model=PatientInDB)
 def get_patient_by_id(patient_id: str, current_user: dict = Depends(get_current_user)):    
@@ -537,40 +544,112 @@ def get_patients_by_medecin(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
     
-def allowed_file(filename: str) -> bool:
-    """Vérifier si l'extension du fichier est autorisée"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def resize_image(image_data: bytes, max_width: int = PHOTO_MAX_WIDTH, max_height: int = PHOTO_MAX_HEIGHT) -> bytes:
-    """Redimensionner l'image pour optimiser l'espace de stockage"""
-    try:
-        # Ouvrir l'image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convertir en RGB si nécessaire (pour PNG avec transparence)
-        if image.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        
-        # Redimensionner en gardant les proportions
-        image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Sauvegarder dans un buffer
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=PHOTO_QUALITY, optimize=True)
-        output.seek(0)
-        
-        return output.getvalue()
-    except Exception as e:
-        logger.error(f"Erreur lors du redimensionnement de l'image: {e}")
-        raise HTTPException(status_code=400, detail="Erreur lors du traitement de l'image")
+def photo_file_ids(patient: dict) -> set:
+    """Fichiers GridFS d'un patient : photo principale et variantes"""
+    ids = set((patient.get("photo_variants") or {}).values())
+    if patient.get("photo_file_id"):
+        ids.add(patient["photo_file_id"])
+    return ids
 
 # ✅ ROUTES POUR LES PHOTOS avec le bon type de db
 
+@patients_router.get("/photos/metrics")
+async def get_photo_pipeline_metrics(current_user: dict = Depends(get_current_user)):
+    """Mesures du traitement des photos (file d'attente, durées) et du cache GridFS - administrateurs uniquement"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les administrateurs peuvent consulter ces métriques"
+        )
+    return {**photo_pipeline.snapshot(), "cache": gridfs_cache.snapshot()}
+
+@patients_router.post("/photos/batch")
+async def get_patient_photos_batch(
+    batch: PhotoBatchRequest,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Avatars de plusieurs patients en une requête (data URI base64).
+    Une requête d'autorisation ($in) et une lecture groupée des chunks GridFS.
+    Les patients inaccessibles ou sans photo sont listés dans `missing`.
+    """
+    user_role = current_user.get("role")
+    if user_role == "medecin":
+        medecin_id = str(current_user["id"])
+    elif user_role == "secretaire":
+        medecin_id = str(current_user.get("medecin_id") or "")
+    else:
+        raise HTTPException(status_code=403, detail="Rôle non autorisé")
+    
+    object_ids = []
+    for patient_id in dict.fromkeys(batch.patient_ids):
+        try:
+            object_ids.append(ObjectId(patient_id))
+        except InvalidId:
+            continue
+    
+    # Autorisation : seuls les patients du médecin sont retournés
+    accept = request.headers.get("accept", "")
+    selected = {}  # file_id -> (patient_id, content_type)
+    async for patient in db.patients.find(
+        {"_id": {"$in": object_ids}, "medecin_id": medecin_id},
+        {"photo_file_id": 1, "photo_variants": 1}
+    ):
+        if not patient.get("photo_file_id"):
+            continue
+        variants = patient.get("photo_variants") or {}
+        key = pick_variant(variants, batch.size, accept)
+        if key:
+            selected[variants[key]] = (str(patient["_id"]), VARIANT_FORMATS[key.split(".", 1)[1]])
+        else:
+            selected[patient["photo_file_id"]] = (str(patient["_id"]), "image/jpeg")
+    
+    # Cache local d'abord, puis le reste en une lecture de la collection des chunks
+    contents = {}
+    for file_id in selected:
+        cached = await gridfs_cache.lookup(file_id)
+        if cached is not None:
+            contents[file_id] = cached.data
+    file_ids = [ObjectId(file_id) for file_id in selected if file_id not in contents]
+    if file_ids:
+        chunks = {}
+        cursor = db["patient_photos.chunks"].find(
+            {"files_id": {"$in": file_ids}},
+            {"files_id": 1, "n": 1, "data": 1}
+        ).sort([("files_id", 1), ("n", 1)])
+        async for chunk in cursor:
+            chunks.setdefault(str(chunk["files_id"]), []).append(bytes(chunk["data"]))
+        # Date d'upload et métadonnées : l'entrée en cache sert aussi le GET unitaire (Last-Modified)
+        files = {}
+        async for grid_file in db["patient_photos.files"].find(
+            {"_id": {"$in": file_ids}},
+            {"uploadDate": 1, "metadata": 1}
+        ):
+            files[str(grid_file["_id"])] = grid_file
+        for file_id, parts in chunks.items():
+            contents[file_id] = b"".join(parts)
+            grid_file = files.get(file_id) or {}
+            await gridfs_cache.store(CachedFile(
+                file_id,
+                contents[file_id],
+                upload_date=grid_file.get("uploadDate"),
+                metadata=grid_file.get("metadata") or {"content_type": selected[file_id][1]}
+            ))
+    
+    photos = {}
+    for file_id, (patient_id, content_type) in selected.items():
+        if file_id in contents:
+            encoded = base64.b64encode(contents[file_id]).decode("ascii")
+            photos[patient_id] = f"data:{content_type};base64,{encoded}"
+    
+    return {
+        "size": batch.size,
+        "photos": photos,
+        "missing": [patient_id for patient_id in dict.fromkeys(batch.patient_ids) if patient_id not in photos]
+    }
+
 @patients_router.post("/id/{patient_id}/photo", response_model=PhotoUploadResponse)
 async def upload_patient_photo(
     patient_id: str,
@@ -607,57 +686,68 @@ async def upload_patient_photo(
         if not photo.filename:
             raise HTTPException(status_code=400, detail="Aucun fichier sélectionné")
         
-        if not allowed_file(photo.filename):
-            raise HTTPException(
-                status_code=400, 
-                detail="Format de fichier non supporté. Utilisez JPG, JPEG ou PNG."
-            )
+        # Lire le fichier par blocs : 413 dès le dépassement, type vérifié sur les octets
+        content, _ = await read_capped(photo, MAX_FILE_SIZE)
         
-        # Lire le contenu du fichier
-        content = await photo.read()
-        if len(content) > MAX_FILE_SIZE:
+        # Variantes (tailles x JPEG/WebP), calculées hors de la boucle d'événements
+        try:
+            variants = await photo_pipeline.variants(content)
+        except PhotoProcessingError as e:
+            logger.error(f"Erreur lors du redimensionnement de l'image: {e}")
+            raise HTTPException(status_code=400, detail="Erreur lors du traitement de l'image")
+        except PipelineBusy:
             raise HTTPException(
-                status_code=400, 
-                detail=f"Fichier trop volumineux. Taille maximum: {MAX_FILE_SIZE // (1024*1024)}MB"
+                status_code=503,
+                detail="Trop de photos en cours de traitement, réessayez dans quelques instants"
             )
         
-        # Redimensionner l'image
-        processed_image = resize_image(content)
-        
         # ✅ Initialiser GridFS avec la base de données
         fs = AsyncIOMotorGridFSBucket(db, bucket_name="patient_photos")
         
-        # Supprimer l'ancienne photo si elle existe
-        if patient.get("photo_file_id"):
+        # Supprimer l'ancienne photo et ses variantes si elles existent
+        gridfs_cache.invalidate(*photo_file_ids(patient))
+        for old_id in photo_file_ids(patient):
             try:
-                await fs.delete(ObjectId(patient["photo_file_id"]))
-                logger.info(f"Ancienne photo supprimée pour le patient {patient_id}")
+                await fs.delete(ObjectId(old_id))
             except Exception as e:
-                logger.warning(f"Impossible de supprimer l'ancienne photo: {e}")
-        
-        # Uploader la nouvelle photo
-        file_id = await fs.upload_from_stream(
-            filename=f"patient_{patient_id}_{photo.filename}",
-            source=io.BytesIO(processed_image),
-            metadata={
-                "patient_id": patient_id,
-                "original_filename": photo.filename,
-                "content_type": "image/jpeg",
-                "uploaded_by": str(current_user["id"]),
-                "file_size": len(processed_image)
-            }
-        )
+                logger.warning(f"Impossible de supprimer l'ancienne photo {old_id}: {e}")
+        
+        # Uploader les variantes en parallèle
+        async def upload_variant(size: int, fmt: str, data: bytes):
+            return await fs.upload_from_stream(
+                filename=f"patient_{patient_id}_{size}.{fmt}",
+                source=io.BytesIO(data),
+                metadata={
+                    "patient_id": patient_id,
+                    "original_filename": photo.filename,
+                    "content_type": VARIANT_FORMATS[fmt],
+                    "variant": variant_key(size, fmt),
+                    "size": size,
+                    "uploaded_by": str(current_user["id"]),
+                    "file_size": len(data)
+                }
+            )
         
-        # Mettre à jour le document patient avec l'ID du fichier
+        uploaded = await asyncio.gather(*(upload_variant(*variant) for variant in variants))
+        photo_variants = {
+            variant_key(size, fmt): str(file_id)
+            for (size, fmt, _), file_id in zip(variants, uploaded)
+        }
+        file_id = photo_variants[MAIN_VARIANT]
+        
+        # Mettre à jour le document patient : photo principale (800 px JPEG) et variantes
         photo_url = f"/patients/id/{patient_id}/photo"
         await db.patients.update_one(
             {"_id": patient_obj_id},
             {
                 "$set": {
-                    "photo_file_id": str(file_id),
+                    "photo_file_id": file_id,
+                    "photo_variants": photo_variants,
                     "photo_url": photo_url,
                     "updated_at": datetime.utcnow()
-                }
+                },
+                # Ancienne photo inline (base64) remplacée par GridFS
+                "$unset": {"photo_data": ""}
             }
         )
         
@@ -678,10 +768,15 @@ async def upload_patient_photo(
 @patients_router.get("/id/{patient_id}/photo")
 async def get_patient_photo(
     patient_id: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, description="Taille d'affichage souhaitée (px)"),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: dict = Depends(get_current_user)
 ):
-    """Récupérer la photo d'un patient"""
+    """
+    Récupérer la photo d'un patient (streaming, ETag, Range).
+    `size` et l'en-tête Accept choisissent la variante (taille, WebP ou JPEG).
+    """
     try:
         # Vérifier que le patient existe et appartient au bon médecin
         try:
@@ -708,29 +803,39 @@ async def get_patient_photo(
         if not patient.get("photo_file_id"):
             raise HTTPException(status_code=404, detail="Aucune photo trouvée pour ce patient")
         
-        # Récupérer la photo depuis GridFS
+        # Variante demandée ; photo principale pour les photos sans variantes
+        variants = patient.get("photo_variants") or {}
+        key = pick_variant(variants, size, request.headers.get("accept", ""))
+        photo_file_id = variants[key] if key else patient["photo_file_id"]
+        vary = {"Vary": "Accept"} if variants else None
+        
+        # Photo inchangée depuis le dernier affichage : 304 sans ouvrir GridFS
+        etag = etag_for(photo_file_id)
+        if etag_matches(request, etag):
+            return not_modified(etag, vary)
+        
+        # Récupérer la photo depuis GridFS (envoyée chunk par chunk)
         fs = AsyncIOMotorGridFSBucket(db, bucket_name="patient_photos")
         
         try:
-            file_id = ObjectId(patient["photo_file_id"])
-            grid_out = await fs.open_download_stream(file_id)
-            
-            # Lire le contenu du fichier
-            content = await grid_out.read()
-            
-            # Retourner l'image
-            return StreamingResponse(
-                io.BytesIO(content),
-                media_type="image/jpeg",
-                headers={
-                    "Content-Disposition": f"inline; filename=patient_{patient_id}_photo.jpg"
-                }
-            )
-            
+            file_id = ObjectId(photo_file_id)
+            # Cache local (mémoire, puis disque) ; les gros fichiers restent en streaming
+            grid_out = await gridfs_cache.get(fs, file_id)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de la photo: {e}")
             raise HTTPException(status_code=404, detail="Photo non trouvée")
         
+        metadata = grid_out.metadata or {}
+        extension = "webp" if metadata.get("content_type") == "image/webp" else "jpg"
+        return gridfs_response(
+            request,
+            grid_out,
+            etag,
+            media_type=metadata.get("content_type", "image/jpeg"),
+            filename=f"patient_{patient_id}_photo.{extension}",
+            extra_headers=vary
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -773,10 +878,12 @@ async def delete_patient_photo(
         # Supprimer la photo de GridFS
         fs = AsyncIOMotorGridFSBucket(db, bucket_name="patient_photos")
         
-        try:
-            await fs.delete(ObjectId(patient["photo_file_id"]))
-        except Exception as e:
-            logger.warning(f"Erreur lors de la suppression du fichier GridFS: {e}")
+        gridfs_cache.invalidate(*photo_file_ids(patient))
+        for file_id in photo_file_ids(patient):
+            try:
+                await fs.delete(ObjectId(file_id))
+            except Exception as e:
+                logger.warning(f"Erreur lors de la suppression du fichier GridFS: {e}")
         
         # Mettre à jour le document patient
         await db.patients.update_one(
@@ -784,7 +891,9 @@ async def delete_patient_photo(
             {
                 "$unset": {
                     "photo_file_id": "",
-                    "photo_url": ""
+                    "photo_variants": "",
+                    "photo_url": "",
+                    "photo_data": ""
                 },
                 "$set": {
                     "updated_at": datetime.utcnow()
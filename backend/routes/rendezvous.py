@@ -20,12 +20,18 @@ from datetime import datetime, date
 import math
 import re
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 from models.rendezvous import (
     RendezVousCreate,
     RendezVousUpdate,
     RendezVousInDB,
 )
+from utils.occupancy import apply_rendezvous, replace_rendezvous
+from utils.booking import slot_conflict, slot_fields
+from utils.doctor_patterns import mark_stale
+from utils import counters
+from utils.response_cache import response_cache
 
 
 rendezvous_collection = db["rendezvous"]
@@ -55,6 +61,7 @@ def rendezvous_helper(doc: dict) -> dict:
         "medecin_id": str(doc["medecin_id"]),
         "date_rendez_vous": format_date(doc["date_rendez_vous"]),  # ← Conversion
         "heure": doc["heure"],
+        "duree": doc.get("duree", 15),
         "motif": doc.get("motif"),
         "statut": doc.get("statut", "programme"),
     }
@@ -94,8 +101,20 @@ def get_all_rendezvous(page: int = Query(1, ge=1), size: int = Query(10, ge=1)):
 # Créer un rendez-vous
 @rendezvous_router.post("", response_model=RendezVousInDB, status_code=status.HTTP_201_CREATED)
 def create_rendezvous(rdv: RendezVousCreate):
-    inserted = rendezvous_collection.insert_one(rdv.dict())
+    rdv_data = rdv.dict()
+    # Créneaux recouverts par la durée, protégés par l'index unique : pas de chevauchement
+    to_set, _ = slot_fields(rdv_data)
+    rdv_data.update(to_set)
+    
+    try:
+        inserted = rendezvous_collection.insert_one(rdv_data)
+    except DuplicateKeyError:
+        raise slot_conflict(rdv.medecin_id, rdv.date_rendez_vous, rdv.heure, rdv.duree)
     new_doc = rendezvous_collection.find_one({"_id": inserted.inserted_id})
+    apply_rendezvous(new_doc, +1)
+    counters.apply_rendezvous(new_doc, +1)
+    mark_stale(new_doc["medecin_id"])
+    response_cache.invalidate("rendezvous", str(new_doc["medecin_id"]))
     return rendezvous_helper(new_doc)
 
 # Lister les rendez-vous d’un patient (avec pagination)
@@ -171,8 +190,32 @@ def update_rendezvous(rendezvous_id: str, updates: RendezVousUpdate = Body(...))
         raise HTTPException(status_code=404, detail="Rendez-vous non trouvé")
 
     update_data = {k: v for k, v in updates.dict().items() if v is not None}
-    rendezvous_collection.update_one({"_id": obj_id}, {"$set": update_data})
+    
+    # Garder le format YYYY-MM-DD utilisé à la création (et par le planning)
+    if isinstance(update_data.get("date_rendez_vous"), (datetime, date)):
+        update_data["date_rendez_vous"] = update_data["date_rendez_vous"].strftime("%Y-%m-%d")
+    
+    # Le marqueur et les créneaux suivent statut, heure et durée (retirés à l'annulation)
+    merged = {**existing, **update_data}
+    to_set, to_unset = slot_fields(merged)
+    update_ops = {"$set": {**update_data, **to_set}}
+    if to_unset:
+        update_ops["$unset"] = to_unset
+    
+    try:
+        rendezvous_collection.update_one({"_id": obj_id}, update_ops)
+    except DuplicateKeyError:
+        raise slot_conflict(
+            str(merged["medecin_id"]),
+            str(merged["date_rendez_vous"]),
+            merged["heure"],
+            merged.get("duree", 15)
+        )
     updated = rendezvous_collection.find_one({"_id": obj_id})
+    replace_rendezvous(existing, updated)
+    counters.replace_rendezvous(existing, updated)
+    mark_stale(existing["medecin_id"], updated["medecin_id"])
+    response_cache.invalidate("rendezvous", str(existing["medecin_id"]), str(updated["medecin_id"]))
     return rendezvous_helper(updated)
 
 # Supprimer un rendez-vous
@@ -183,9 +226,13 @@ def delete_rendezvous(rendezvous_id: str):
     except:
         raise HTTPException(status_code=400, detail="ID rendez-vous invalide")
 
-    result = rendezvous_collection.delete_one({"_id": obj_id})
-    if result.deleted_count == 0:
+    deleted = rendezvous_collection.find_one_and_delete({"_id": obj_id})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Rendez-vous non trouvé")
+    apply_rendezvous(deleted, -1)
+    counters.apply_rendezvous(deleted, -1)
+    mark_stale(deleted["medecin_id"])
+    response_cache.invalidate("rendezvous", str(deleted["medecin_id"]))
     
 
 @rendezvous_router.get("/calendar/{year}/{month}", response_model=List[dict])
@@ -233,6 +280,7 @@ def get_appointments_by_month(year: int, month: int):
                 "id": str(apt["_id"]),
                 "date_rendez_vous": apt["date_rendez_vous"],
                 "heure": apt["heure"],
+                "duree": apt.get("duree", 15),
                 "patient_nom": patient.get("nom", "Patient inconnu") if patient else "Patient inconnu",
                 "medecin_nom": medecin.get("nom", "Médecin inconnu") if medecin else "Médecin inconnu",
                 "motif": apt.get("motif", ""),
@@ -277,6 +325,7 @@ def get_appointments_by_date(year: int, month: int, day: int):
                 "id": str(apt["_id"]),
                 "date_rendez_vous": apt["date_rendez_vous"],
                 "heure": apt["heure"],
+                "duree": apt.get("duree", 15),
                 "patient_nom": patient.get("nom", "Patient inconnu") if patient else "Patient inconnu",
                 "medecin_nom": medecin.get("nom", "Médecin inconnu") if medecin else "Médecin inconnu",
                 "motif": apt.get("motif", ""),
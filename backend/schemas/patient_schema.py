@@ -35,7 +35,6 @@ def patient_helper(patient: dict) -> dict:
         # AJOUTER TOUS LES CHAMPS PHOTO
         "photo_file_id": patient.get("photo_file_id"),
         "photo_url": patient.get("photo_url"),
-        "photo_data": patient.get("photo_data"),
         "photo_filename": patient.get("photo_filename"),
         "photo_content_type": patient.get("photo_content_type"),
         
@@ -29,6 +29,7 @@ def rendezvous_helper(doc: dict) -> dict:
         "medecin_id": str(doc["medecin_id"]),
         "date_rendez_vous": format_date(doc["date_rendez_vous"]),  # ← Conversion
         "heure": doc["heure"],
+        "duree": doc.get("duree", 15),
         "motif": doc.get("motif"),
         "statut": doc.get("statut", "programme"),
     }
\ No newline at end of file
@@ -0,0 +1,151 @@
+# utils/booking.py
+"""
+Prévention atomique des doubles réservations.
+
+Chaque RDV actif porte `creneaux`, la liste des créneaux de 15 min que recouvre
+sa durée. Un index unique partiel (multiclé) sur
+(medecin_id, date_rendez_vous, creneaux) ne couvre que les RDV actifs, marqués
+`slot_active: true` (MongoDB n'accepte pas `$ne` dans un
+partialFilterExpression, d'où ce champ explicite retiré à l'annulation).
+Deux réservations concurrentes qui se chevauchent : la seconde échoue sur
+l'index (DuplicateKeyError), quelle que soit la charge, sans lecture préalable.
+En cas de conflit, l'API répond 409 avec les débuts libres les plus proches
+où loge la durée demandée.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from ai import schedule_bitmap as bitmap
+from ai.interval_index import minutes_to_time
+from utils import occupancy
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+rendezvous_collection = db["rendezvous"]
+
+SLOT_INDEX_NAME = "unique_active_creneaux"
+ALTERNATIVES_HORIZON_DAYS = 14
+
+
+def slot_fields(rdv: dict) -> Tuple[dict, dict]:
+    """
+    Champs d'index d'un RDV selon son statut, son heure et sa durée :
+    retourne ($set, $unset)
+    """
+    if not occupancy.is_active(rdv):
+        return {}, {"slot_active": "", "creneaux": "", "hors_horaires": ""}
+    creneaux = occupancy.covered_slots(rdv.get("heure", ""), occupancy.rdv_duration(rdv))
+    if not creneaux:
+        # Entièrement hors horaires : pas de créneau à protéger (un tableau vide serait indexé) ;
+        # `hors_horaires` évite de le réexaminer à chaque marquage
+        return {"slot_active": True, "hors_horaires": True}, {"creneaux": ""}
+    return {"slot_active": True, "creneaux": creneaux}, {"hors_horaires": ""}
+
+
+def nearest_free_alternatives(medecin_id: str, date_str: str, heure: str,
+                              duree: int = occupancy.DEFAULT_DURATION, limit: int = 3) -> List[Dict]:
+    """
+    Débuts libres les plus proches du créneau demandé où loge un RDV de `duree` minutes :
+    d'abord le même jour (par écart croissant), puis les jours ouvrés suivants
+    """
+    try:
+        start = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return []
+
+    end = start + timedelta(days=ALTERNATIVES_HORIZON_DAYS)
+    days = occupancy.get_occupancy_range(medecin_id, date_str, end.strftime("%Y-%m-%d"))
+
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    now_minutes = now.hour * 60 + now.minute
+    requested = bitmap.time_to_minutes(heure) or bitmap.DAY_START_MINUTES
+
+    alternatives = []
+    for offset in range(ALTERNATIVES_HORIZON_DAYS + 1):
+        current = start + timedelta(days=offset)
+        if current.weekday() >= 5:
+            continue
+        current_str = current.strftime("%Y-%m-%d")
+        if current_str < today:
+            continue
+
+        intervals = occupancy.day_intervals(days.get(current_str))
+        after = now_minutes + 1 if current_str == today else bitmap.DAY_START_MINUTES
+        starts = intervals.fitting_starts(duree, after)
+        if offset == 0:
+            starts.sort(key=lambda m: (abs(m - requested), m))
+
+        for minutes in starts:
+            alternatives.append({"date": current_str, "heure": minutes_to_time(minutes)})
+            if len(alternatives) >= limit:
+                return alternatives
+    return alternatives
+
+
+def slot_conflict(medecin_id: str, date_str: str, heure: str,
+                  duree: int = occupancy.DEFAULT_DURATION) -> HTTPException:
+    """Erreur 409 accompagnée des alternatives libres les plus proches"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "message": "Ce créneau chevauche un rendez-vous déjà réservé pour ce médecin",
+            "medecin_id": medecin_id,
+            "date_rendez_vous": date_str,
+            "heure": heure,
+            "duree": duree,
+            "alternatives": nearest_free_alternatives(medecin_id, date_str, heure, duree),
+        }
+    )
+
+
+def backfill_slot_active(from_date: Optional[str] = None) -> Dict[str, int]:
+    """
+    Pose `slot_active` et `creneaux` sur les RDV actifs qui n'ont pas encore
+    leurs créneaux (à partir de `from_date` si fourni). Les RDV entièrement
+    hors horaires sont marqués `hors_horaires` et ne sont plus relus ensuite. Les
+    chevauchements existants sont laissés hors index et comptés comme conflits.
+    """
+    query = {
+        "creneaux": {"$exists": False},
+        "hors_horaires": {"$ne": True},
+        "statut": {"$ne": occupancy.CANCELLED_STATUS}
+    }
+    if from_date:
+        query["date_rendez_vous"] = {"$gte": from_date}
+
+    marked = conflicts = 0
+    projection = {"heure": 1, "duree": 1, "statut": 1}
+    for rdv in rendezvous_collection.find(query, projection).sort("_id", 1):
+        to_set, _ = slot_fields(rdv)
+        if "creneaux" not in to_set:
+            rendezvous_collection.update_one({"_id": rdv["_id"]}, {"$set": to_set})
+            continue
+        try:
+            rendezvous_collection.update_one({"_id": rdv["_id"]}, {"$set": to_set})
+            marked += 1
+        except DuplicateKeyError:
+            conflicts += 1
+            logger.warning(f"Chevauchement existant laissé hors index: {rdv['_id']}")
+    return {"marked": marked, "conflicts": conflicts}
+
+
+def ensure_slot_index() -> None:
+    """
+    Index unique partiel des créneaux actifs. Le marquage des RDV existants
+    (backfill_slot_active) est laissé à backfill_slot_index.py pour ne pas
+    parcourir les rendez-vous à chaque démarrage.
+    """
+    rendezvous_collection.create_index(
+        [("medecin_id", 1), ("date_rendez_vous", 1), ("creneaux", 1)],
+        unique=True,
+        partialFilterExpression={"slot_active": True, "creneaux": {"$exists": True}},
+        name=SLOT_INDEX_NAME
+    )
@@ -0,0 +1,177 @@
+# utils/consultation_stats.py
+"""
+Rollup quotidien des consultations (collection `consultation_stats`).
+
+Un document par (date, medecin_id, categorie) où `categorie` est le motif
+normalisé (voir doctor_patterns.simplify_motif), avec le nombre de
+consultations. Il est maintenu par `$inc` à chaque création, modification et
+suppression de consultation, et reconstruit par rebuild_consultation_stats.py
+(ou à la première lecture s'il n'a jamais été construit, voir utils.materialized).
+
+Les statistiques sur une période quelconque, par jour, semaine ou mois,
+se calculent en sommant quelques centaines de lignes de rollup au lieu de
+parcourir la collection `consultations`.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import db
+from utils import materialized
+from utils.occupancy import format_rdv_date
+from utils.doctor_patterns import simplify_motif
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+stats_collection = db["consultation_stats"]
+consultations_collection = db["consultations"]
+
+GRANULARITIES = ("day", "week", "month")
+VIEW_NAME = "consultation_stats"
+
+
+def _row_key(consultation: dict) -> Optional[dict]:
+    day = format_rdv_date(consultation.get("date_consultation") or consultation.get("created_at") or "")
+    if not day:
+        return None
+    return {
+        "date": day,
+        "medecin_id": str(consultation.get("medecin_id") or ""),
+        "categorie": simplify_motif(consultation.get("motif") or "")
+    }
+
+
+def apply_consultation(consultation: Optional[dict], delta: int) -> None:
+    """Ajoute (delta=+1) ou retire (delta=-1) une consultation du rollup"""
+    key = _row_key(consultation) if consultation else None
+    if not key:
+        return
+    stats_collection.update_one(key, {"$inc": {"count": delta}}, upsert=True)
+
+
+def replace_consultation(old: Optional[dict], new: Optional[dict]) -> None:
+    fields = ("medecin_id", "date_consultation", "motif")
+    if old and new and all(old.get(f) == new.get(f) for f in fields):
+        return
+    apply_consultation(old, -1)
+    apply_consultation(new, +1)
+
+
+def _bucket(day: str, granularity: str) -> str:
+    if granularity == "month":
+        return day[:7]
+    if granularity == "week":
+        current = datetime.strptime(day, "%Y-%m-%d")
+        return (current - timedelta(days=current.weekday())).strftime("%Y-%m-%d")
+    return day
+
+
+def query_stats(start: str, end: str, granularity: str = "day",
+                medecin_id: Optional[str] = None) -> Dict:
+    """
+    Consultations entre deux dates incluses (YYYY-MM-DD), regroupées par
+    période (jour, semaine commençant le lundi, ou mois), médecin et catégorie
+    """
+    materialized.ensure_built(VIEW_NAME, rebuild_stats)
+    query = {"date": {"$gte": start, "$lte": end}, "count": {"$gt": 0}}
+    if medecin_id:
+        query["medecin_id"] = medecin_id
+
+    series: Dict[str, int] = {}
+    by_medecin: Dict[str, int] = {}
+    by_category: Dict[str, int] = {}
+    total = 0
+    for row in stats_collection.find(query, {"_id": 0, "date": 1, "medecin_id": 1, "categorie": 1, "count": 1}):
+        n = row["count"]
+        period = _bucket(row["date"], granularity)
+        series[period] = series.get(period, 0) + n
+        by_medecin[row["medecin_id"]] = by_medecin.get(row["medecin_id"], 0) + n
+        by_category[row["categorie"]] = by_category.get(row["categorie"], 0) + n
+        total += n
+
+    return {
+        "from": start,
+        "to": end,
+        "granularity": granularity,
+        "total": total,
+        "series": [{"period": period, "count": series[period]} for period in sorted(series)],
+        "by_medecin": sorted(
+            ({"medecin_id": mid, "count": n} for mid, n in by_medecin.items()),
+            key=lambda item: -item["count"]
+        ),
+        "by_category": by_category
+    }
+
+
+def general_stats(recent_days: int = 180, top: int = 10) -> Dict:
+    """Total, consultations récentes et top médecins, calculés sur le rollup"""
+    materialized.ensure_built(VIEW_NAME, rebuild_stats)
+    since = (datetime.utcnow() - timedelta(days=recent_days)).strftime("%Y-%m-%d")
+    facets = next(stats_collection.aggregate([
+        {"$facet": {
+            "total": [{"$group": {"_id": None, "n": {"$sum": "$count"}}}],
+            "recent": [
+                {"$match": {"date": {"$gte": since}}},
+                {"$group": {"_id": None, "n": {"$sum": "$count"}}}
+            ],
+            "by_medecin": [
+                {"$group": {"_id": "$medecin_id", "count": {"$sum": "$count"}}},
+                {"$match": {"count": {"$gt": 0}}},
+                {"$sort": {"count": -1}},
+                {"$limit": top}
+            ]
+        }}
+    ]), {})
+
+    def first(name: str) -> int:
+        rows = facets.get(name) or []
+        return rows[0]["n"] if rows else 0
+
+    return {
+        "total_consultations": first("total"),
+        "recent_consultations": first("recent"),
+        "consultations_by_medecin": facets.get("by_medecin", [])
+    }
+
+
+def rebuild_stats() -> int:
+    """Reconstruit le rollup depuis la collection `consultations`"""
+    rows: Dict[tuple, int] = {}
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "medecin_id": "$medecin_id",
+                "date": {"$ifNull": ["$date_consultation", "$created_at"]},
+                "motif": {"$toLower": {"$ifNull": ["$motif", ""]}}
+            },
+            "n": {"$sum": 1}
+        }}
+    ]
+    for row in consultations_collection.aggregate(pipeline, allowDiskUse=True):
+        key = _row_key({
+            "medecin_id": row["_id"].get("medecin_id"),
+            "date_consultation": row["_id"].get("date"),
+            "motif": row["_id"].get("motif")
+        })
+        if key:
+            index = (key["date"], key["medecin_id"], key["categorie"])
+            rows[index] = rows.get(index, 0) + row["n"]
+
+    stats_collection.delete_many({})
+    documents: List[dict] = [
+        {"date": day, "medecin_id": medecin_id, "categorie": categorie, "count": n}
+        for (day, medecin_id, categorie), n in rows.items()
+    ]
+    if documents:
+        stats_collection.insert_many(documents, ordered=False)
+    materialized.mark_built(VIEW_NAME)
+    logger.info(f"Rollup des consultations reconstruit: {len(documents)} lignes")
+    return len(documents)
+
+
+def ensure_indexes() -> None:
+    """Une ligne par (date, médecin, catégorie) ; lecture par période et par médecin"""
+    stats_collection.create_index([("date", 1), ("medecin_id", 1), ("categorie", 1)], unique=True)
+    stats_collection.create_index([("medecin_id", 1), ("date", 1)])
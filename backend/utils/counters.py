@@ -0,0 +1,288 @@
+# utils/counters.py
+"""
+Compteurs précalculés du tableau de bord (collection `counters`).
+
+Chaque document est identifié par (scope, kind, period) :
+- scope  : identifiant du médecin, ou "all" pour l'établissement
+- kind   : "totals" (patients, consultations, rendez-vous),
+           "consultations_day" / "consultations_month" (par date de consultation),
+           "rendezvous_day" (rendez-vous par statut, par date de rendez-vous),
+           "rendezvous_upcoming" (rendez-vous à venir par statut)
+- period : "YYYY-MM-DD", "YYYY-MM" ou None pour les totaux et les RDV à venir
+
+Le document "rendezvous_upcoming" couvre les RDV datés à partir de `as_of` :
+une écriture ne l'incrémente que si la date du RDV n'est pas antérieure à
+`as_of`, et la première lecture d'une nouvelle journée en retire une seule
+fois les journées écoulées (lues dans "rendezvous_day") en avançant `as_of`.
+
+Ils sont maintenus par `$inc` atomiques à chaque création, modification et
+suppression, et peuvent être reconstruits (rebuild_counters.py, ou à la
+première lecture s'ils ne l'ont jamais été, voir utils.materialized). Le
+tableau de bord lit ainsi quelques documents au lieu de lancer des comptages.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne, ReturnDocument
+
+from database import db
+from utils import materialized
+from utils.occupancy import format_rdv_date
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+counters_collection = db["counters"]
+patients_collection = db["patients"]
+consultations_collection = db["consultations"]
+rendezvous_collection = db["rendezvous"]
+
+GLOBAL_SCOPE = "all"
+UPCOMING_KIND = "rendezvous_upcoming"
+VIEW_NAME = "counters"
+
+
+def _scopes(medecin_id) -> List[str]:
+    return [str(medecin_id), GLOBAL_SCOPE] if medecin_id else [GLOBAL_SCOPE]
+
+
+def _inc(scope: str, kind: str, period: Optional[str], increments: Dict[str, int]) -> UpdateOne:
+    return UpdateOne(
+        {"scope": scope, "kind": kind, "period": period},
+        {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def _write(operations: List[UpdateOne], ordered: bool = False) -> None:
+    if operations:
+        counters_collection.bulk_write(operations, ordered=ordered)
+
+
+def apply_patient(patient: Optional[dict], delta: int) -> None:
+    """Ajoute (delta=+1) ou retire (delta=-1) un patient des compteurs"""
+    if not patient:
+        return
+    _write([
+        _inc(scope, "totals", None, {"patients": delta})
+        for scope in _scopes(patient.get("medecin_id"))
+    ])
+
+
+def apply_consultation(consultation: Optional[dict], delta: int) -> None:
+    """Ajoute ou retire une consultation (totaux, jour et mois de consultation)"""
+    if not consultation:
+        return
+    day = format_rdv_date(consultation.get("date_consultation") or consultation.get("created_at") or "")
+    operations = []
+    for scope in _scopes(consultation.get("medecin_id")):
+        operations.append(_inc(scope, "totals", None, {"consultations": delta}))
+        if day:
+            operations.append(_inc(scope, "consultations_day", day, {"count": delta}))
+            operations.append(_inc(scope, "consultations_month", day[:7], {"count": delta}))
+    _write(operations)
+
+
+def apply_rendezvous(rdv: Optional[dict], delta: int) -> None:
+    """Ajoute ou retire un rendez-vous (totaux et statuts du jour du RDV)"""
+    if not rdv:
+        return
+    day = format_rdv_date(rdv.get("date_rendez_vous") or "")
+    statut = rdv.get("statut", "programme")
+    operations = []
+    for scope in _scopes(rdv.get("medecin_id")):
+        operations.append(_inc(scope, "totals", None, {"rendezvous": delta}))
+        if day:
+            operations.append(_inc(scope, "rendezvous_day", day, {"count": delta, f"statuts.{statut}": delta}))
+    if day:
+        # Après le document du jour : une journée retirée des RDV à venir l'a été avec ce RDV
+        for scope in _scopes(rdv.get("medecin_id")):
+            operations.append(UpdateOne(
+                {"scope": scope, "kind": UPCOMING_KIND, "period": None, "as_of": {"$lte": day}},
+                {"$inc": {f"statuts.{statut}": delta}, "$set": {"updated_at": datetime.utcnow()}}
+            ))
+    _write(operations, ordered=True)
+
+
+def replace_consultation(old: Optional[dict], new: Optional[dict]) -> None:
+    fields = ("medecin_id", "date_consultation")
+    if old and new and all(old.get(f) == new.get(f) for f in fields):
+        return
+    apply_consultation(old, -1)
+    apply_consultation(new, +1)
+
+
+def replace_rendezvous(old: Optional[dict], new: Optional[dict]) -> None:
+    fields = ("medecin_id", "date_rendez_vous", "statut")
+    if old and new and all(old.get(f) == new.get(f) for f in fields):
+        return
+    apply_rendezvous(old, -1)
+    apply_rendezvous(new, +1)
+
+
+def _sum_rendezvous_days(scope: str, period: Dict) -> Dict[str, int]:
+    """Statuts cumulés des documents "rendezvous_day" d'un intervalle de dates"""
+    sums: Dict[str, int] = {}
+    for doc in counters_collection.find(
+        {"scope": scope, "kind": "rendezvous_day", "period": period}, {"statuts": 1}
+    ):
+        for statut, n in (doc.get("statuts") or {}).items():
+            sums[statut] = sums.get(statut, 0) + n
+    return sums
+
+
+def _roll_upcoming(scope: str, doc: Optional[dict], day: str) -> dict:
+    """
+    Amène le document des RDV à venir à `day` : création depuis les journées
+    à venir s'il n'existe pas, sinon retrait des journées écoulées depuis `as_of`.
+    Un seul worker applique le retrait (condition sur l'ancien `as_of`).
+    """
+    now = datetime.utcnow()
+    if doc is None:
+        statuts = _sum_rendezvous_days(scope, {"$gte": day})
+        return counters_collection.find_one_and_update(
+            {"scope": scope, "kind": UPCOMING_KIND, "period": None},
+            {"$setOnInsert": {"as_of": day, "statuts": statuts, "updated_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    expired = _sum_rendezvous_days(scope, {"$gte": doc.get("as_of") or "", "$lt": day})
+    update = {"$set": {"as_of": day, "updated_at": now}}
+    if expired:
+        update["$inc"] = {f"statuts.{statut}": -n for statut, n in expired.items()}
+    rolled = counters_collection.find_one_and_update(
+        {"_id": doc["_id"], "as_of": doc.get("as_of")},
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+    return rolled or counters_collection.find_one({"_id": doc["_id"]})
+
+
+def get_summary(scope: str, today: Optional[datetime] = None) -> Dict:
+    """Chiffres du tableau de bord d'un périmètre, en une seule lecture (plus le passage quotidien des RDV à venir)"""
+    materialized.ensure_built(VIEW_NAME, rebuild_counters)
+    today = today or datetime.now()
+    day = today.strftime("%Y-%m-%d")
+    month = today.strftime("%Y-%m")
+
+    docs = counters_collection.find({
+        "scope": scope,
+        "$or": [
+            {"kind": "totals"},
+            {"kind": "consultations_day", "period": day},
+            {"kind": "consultations_month", "period": month},
+            {"kind": "rendezvous_day", "period": day},
+            {"kind": UPCOMING_KIND}
+        ]
+    })
+
+    totals: Dict = {}
+    consultations_today = consultations_month = 0
+    upcoming_doc = None
+    today_by_status: Dict[str, int] = {}
+    for doc in docs:
+        kind = doc["kind"]
+        if kind == "totals":
+            totals = doc
+        elif kind == "consultations_day":
+            consultations_today = doc.get("count", 0)
+        elif kind == "consultations_month":
+            consultations_month = doc.get("count", 0)
+        elif kind == UPCOMING_KIND:
+            upcoming_doc = doc
+        else:
+            today_by_status = {s: n for s, n in (doc.get("statuts") or {}).items() if n > 0}
+
+    # Première lecture de la journée : retrait des journées écoulées
+    if upcoming_doc is None or (upcoming_doc.get("as_of") or "") < day:
+        upcoming_doc = _roll_upcoming(scope, upcoming_doc, day)
+    upcoming = {statut: n for statut, n in (upcoming_doc.get("statuts") or {}).items() if n > 0}
+    return {
+        "scope": scope,
+        "patients": totals.get("patients", 0),
+        "consultations": {
+            "total": totals.get("consultations", 0),
+            "today": consultations_today,
+            "month": consultations_month
+        },
+        "rendezvous": {
+            "total": totals.get("rendezvous", 0),
+            "today": sum(today_by_status.values()),
+            "today_by_status": today_by_status,
+            "upcoming_total": sum(upcoming.values()),
+            "upcoming_by_status": upcoming
+        }
+    }
+
+
+def rebuild_counters() -> int:
+    """Reconstruit tous les compteurs depuis les collections sources"""
+    values: Dict[tuple, Dict[str, int]] = {}
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def add(medecin_id, kind, period, field, n):
+        for scope in _scopes(medecin_id):
+            bucket = values.setdefault((scope, kind, period), {})
+            bucket[field] = bucket.get(field, 0) + n
+
+    for row in patients_collection.aggregate([
+        {"$group": {"_id": "$medecin_id", "n": {"$sum": 1}}}
+    ]):
+        add(row["_id"], "totals", None, "patients", row["n"])
+
+    for row in consultations_collection.aggregate([
+        {"$group": {
+            "_id": {"medecin_id": "$medecin_id", "date": {"$ifNull": ["$date_consultation", "$created_at"]}},
+            "n": {"$sum": 1}
+        }}
+    ], allowDiskUse=True):
+        medecin_id = row["_id"].get("medecin_id")
+        day = format_rdv_date(row["_id"].get("date") or "")
+        add(medecin_id, "totals", None, "consultations", row["n"])
+        if day:
+            add(medecin_id, "consultations_day", day, "count", row["n"])
+            add(medecin_id, "consultations_month", day[:7], "count", row["n"])
+
+    for row in rendezvous_collection.aggregate([
+        {"$group": {
+            "_id": {"medecin_id": "$medecin_id", "date": "$date_rendez_vous", "statut": "$statut"},
+            "n": {"$sum": 1}
+        }}
+    ], allowDiskUse=True):
+        medecin_id = row["_id"].get("medecin_id")
+        day = format_rdv_date(row["_id"].get("date") or "")
+        statut = row["_id"].get("statut") or "programme"
+        add(medecin_id, "totals", None, "rendezvous", row["n"])
+        if day:
+            add(medecin_id, "rendezvous_day", day, "count", row["n"])
+            add(medecin_id, "rendezvous_day", day, f"statuts.{statut}", row["n"])
+            if day >= today:
+                add(medecin_id, UPCOMING_KIND, None, f"statuts.{statut}", row["n"])
+
+    documents = []
+    now = datetime.utcnow()
+    for (scope, kind, period), fields in values.items():
+        doc = {"scope": scope, "kind": kind, "period": period, "updated_at": now}
+        if kind == UPCOMING_KIND:
+            doc["as_of"] = today
+        for field, n in fields.items():
+            if field.startswith("statuts."):
+                doc.setdefault("statuts", {})[field.split(".", 1)[1]] = n
+            else:
+                doc[field] = n
+        documents.append(doc)
+
+    counters_collection.delete_many({})
+    if documents:
+        counters_collection.insert_many(documents, ordered=False)
+    materialized.mark_built(VIEW_NAME)
+    logger.info(f"Compteurs reconstruits: {len(documents)} documents")
+    return len(documents)
+
+
+def ensure_indexes() -> None:
+    """Un document par (scope, kind, period)"""
+    counters_collection.create_index([("scope", 1), ("kind", 1), ("period", 1)], unique=True)
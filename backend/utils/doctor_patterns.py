@@ -0,0 +1,207 @@
+# utils/doctor_patterns.py
+"""
+Statistiques historiques matérialisées par médecin (collection `doctor_patterns`).
+
+Les statistiques utilisées par le planning IA (charge moyenne, heures
+préférées, jours chargés, écarts typiques, motifs) sont calculées côté MongoDB
+par des pipelines `$group` sur les 90 derniers jours, puis stockées dans un
+document par médecin. Obtenir les patterns d'un médecin devient une lecture
+ponctuelle.
+
+Rafraîchissement :
+- chaque écriture de rendez-vous marque le document `stale` (update ciblé) ;
+  il est recalculé à la lecture suivante, au plus une fois par
+  PATTERNS_MIN_REFRESH (une écriture change peu une statistique sur 90 jours) ;
+- au-delà de PATTERNS_MAX_AGE le document est recalculé (fenêtre glissante) ;
+- refresh_doctor_patterns.py recalcule tous les médecins (tâche planifiée).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import db
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+patterns_collection = db["doctor_patterns"]
+rendezvous_collection = db["rendezvous"]
+consultations_collection = db["consultations"]
+users_collection = db["users"]
+
+WINDOW_DAYS = 90
+PATTERNS_MIN_REFRESH = timedelta(minutes=10)
+PATTERNS_MAX_AGE = timedelta(hours=24)
+
+# $dayOfWeek : 1 = dimanche ... 7 = samedi (noms anglais, comme strftime("%A"))
+WEEKDAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+
+def _to_int(expression) -> dict:
+    return {"$convert": {"input": expression, "to": "int", "onError": None, "onNull": None}}
+
+
+def _appointment_facets() -> dict:
+    """Sous-pipelines calculant toutes les statistiques de RDV en un seul passage"""
+    minutes = {"$add": [
+        {"$multiply": [_to_int({"$substrCP": ["$heure", 0, 2]}), 60]},
+        _to_int({"$substrCP": ["$heure", 3, 2]})
+    ]}
+    weekday = {"$dayOfWeek": {"$dateFromString": {
+        "dateString": "$date_rendez_vous",
+        "format": "%Y-%m-%d",
+        "onError": None,
+        "onNull": None
+    }}}
+    return {
+        "days": [
+            {"$group": {"_id": "$date_rendez_vous", "n": {"$sum": 1}}},
+            {"$group": {"_id": None, "days": {"$sum": 1}, "total": {"$sum": "$n"}}}
+        ],
+        "hours": [
+            {"$group": {"_id": {"$substrCP": ["$heure", 0, 2]}, "n": {"$sum": 1}}},
+            {"$sort": {"n": -1, "_id": 1}},
+            {"$limit": 3}
+        ],
+        "weekdays": [
+            {"$group": {"_id": weekday, "n": {"$sum": 1}}},
+            {"$match": {"_id": {"$ne": None}}},
+            {"$sort": {"n": -1, "_id": 1}},
+            {"$limit": 3}
+        ],
+        "gaps": [
+            {"$project": {"date_rendez_vous": 1, "minutes": minutes}},
+            {"$match": {"minutes": {"$ne": None}}},
+            {"$setWindowFields": {
+                "partitionBy": "$date_rendez_vous",
+                "sortBy": {"minutes": 1},
+                "output": {"previous": {"$shift": {"output": "$minutes", "by": -1}}}
+            }},
+            {"$project": {"gap": {"$subtract": ["$minutes", "$previous"]}}},
+            {"$match": {"gap": {"$gt": 0, "$lte": 120}}},
+            {"$group": {"_id": None, "avg": {"$avg": "$gap"}}}
+        ]
+    }
+
+
+def _motif_counts(medecin_id: str, since: datetime) -> Dict[str, int]:
+    """Nombre de consultations par motif (en minuscules) sur la période"""
+    pipeline = [
+        {"$match": {
+            "medecin_id": medecin_id,
+            # Dates stockées en datetime (création) ou en chaîne (anciennes données)
+            "$or": [
+                {"date_consultation": {"$gte": since}},
+                {"date_consultation": {"$gte": since.strftime("%Y-%m-%d")}}
+            ]
+        }},
+        {"$group": {"_id": {"$toLower": {"$ifNull": ["$motif", ""]}}, "n": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["n"] for row in consultations_collection.aggregate(pipeline)}
+
+
+def simplify_motif(motif: str) -> str:
+    """Simplifie les motifs pour regroupement"""
+    motif = motif.lower()
+
+    if any(word in motif for word in ["suivi", "controle", "renouvellement"]):
+        return "suivi_routine"
+    elif any(word in motif for word in ["douleur", "mal", "souffrance"]):
+        return "douleur"
+    elif any(word in motif for word in ["fievre", "grippe", "rhume"]):
+        return "infection"
+    elif any(word in motif for word in ["urgence", "urgent"]):
+        return "urgence"
+    elif any(word in motif for word in ["consultation", "premiere", "nouveau"]):
+        return "premiere_consultation"
+    else:
+        return "consultation_generale"
+
+
+def compute_patterns(medecin_id: str, now: Optional[datetime] = None) -> Dict:
+    """Calcule les statistiques d'un médecin sur la fenêtre glissante (agrégations MongoDB)"""
+    now = now or datetime.now()
+    since = now - timedelta(days=WINDOW_DAYS)
+
+    facets = next(rendezvous_collection.aggregate([
+        {"$match": {
+            "medecin_id": medecin_id,
+            "date_rendez_vous": {"$gte": since.strftime("%Y-%m-%d")}
+        }},
+        {"$facet": _appointment_facets()}
+    ]), {})
+
+    days = (facets.get("days") or [{}])[0]
+    total = days.get("total", 0)
+    gaps = (facets.get("gaps") or [{}])[0]
+
+    motif_durations: Dict[str, Dict] = {}
+    for motif, n in _motif_counts(medecin_id, since).items():
+        stats = motif_durations.setdefault(simplify_motif(motif), {"count": 0, "avg_duration": 20})
+        stats["count"] += n
+
+    return {
+        "total_appointments": total,
+        "average_daily_load": total / days["days"] if days.get("days") else 0.0,
+        "preferred_hours": [row["_id"] for row in facets.get("hours", []) if row["_id"]],
+        "motif_durations": motif_durations,
+        "peak_days": [WEEKDAY_NAMES[row["_id"] - 1] for row in facets.get("weekdays", [])],
+        "typical_gaps": int(gaps["avg"]) if gaps.get("avg") is not None else 30
+    }
+
+
+def refresh_patterns(medecin_id: str) -> Dict:
+    """Recalcule et enregistre le rollup d'un médecin"""
+    patterns = compute_patterns(medecin_id)
+    patterns_collection.update_one(
+        {"medecin_id": medecin_id},
+        {"$set": {
+            "patterns": patterns,
+            "window_days": WINDOW_DAYS,
+            "computed_at": datetime.utcnow(),
+            "stale": False
+        }},
+        upsert=True
+    )
+    return patterns
+
+
+def _needs_refresh(doc: Optional[dict], now: datetime) -> bool:
+    if not doc or "patterns" not in doc:
+        return True
+    age = now - doc.get("computed_at", datetime.min)
+    if age > PATTERNS_MAX_AGE:
+        return True
+    return bool(doc.get("stale")) and age > PATTERNS_MIN_REFRESH
+
+
+def get_patterns(medecin_id: str) -> Dict:
+    """Patterns d'un médecin : lecture ponctuelle, recalcul si absent ou périmé"""
+    doc = patterns_collection.find_one({"medecin_id": medecin_id})
+    if _needs_refresh(doc, datetime.utcnow()):
+        return refresh_patterns(medecin_id)
+    return doc["patterns"]
+
+
+def mark_stale(*medecin_ids: str) -> None:
+    """Signale qu'un rendez-vous des médecins donnés a changé"""
+    ids = list({str(mid) for mid in medecin_ids if mid})
+    if ids:
+        patterns_collection.update_many({"medecin_id": {"$in": ids}}, {"$set": {"stale": True}})
+
+
+def refresh_all() -> int:
+    """Recalcule le rollup de tous les médecins (tâche planifiée)"""
+    medecin_ids: List[str] = [
+        str(user["_id"]) for user in users_collection.find({"role": "medecin"}, {"_id": 1})
+    ]
+    for medecin_id in medecin_ids:
+        refresh_patterns(medecin_id)
+    logger.info(f"Patterns recalculés: {len(medecin_ids)} médecins")
+    return len(medecin_ids)
+
+
+def ensure_indexes() -> None:
+    """Lecture ponctuelle par médecin"""
+    patterns_collection.create_index("medecin_id", unique=True)
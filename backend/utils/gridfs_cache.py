@@ -0,0 +1,271 @@
+# utils/gridfs_cache.py
+"""
+Cache local des fichiers GridFS fréquemment lus (photos patients, ...).
+
+- Niveau mémoire : LRU borné en octets (GRIDFS_CACHE_MAX_BYTES).
+- Niveau disque optionnel : un fichier par objet sous GRIDFS_CACHE_DIR,
+  borné par GRIDFS_CACHE_DISK_MAX_BYTES pour la machine entière ; il survit
+  aux redémarrages et est partagé par les workers d'une même machine.
+- Clé : identifiant du fichier GridFS. Un fichier GridFS n'est jamais modifié
+  (un nouvel upload crée un nouvel _id), une entrée ne peut donc pas être
+  périmée ; `invalidate` libère la place des fichiers remplacés ou supprimés.
+- Les fichiers plus gros que GRIDFS_CACHE_MAX_OBJECT_BYTES ne sont pas mis en
+  cache et restent servis en streaming depuis GridFS.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    GRIDFS_CACHE_MAX_BYTES,
+    GRIDFS_CACHE_MAX_OBJECT_BYTES,
+    GRIDFS_CACHE_DIR,
+    GRIDFS_CACHE_DISK_MAX_BYTES,
+)
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reparcours du répertoire du cache disque au plus tard après ce délai
+DISK_RESCAN_SECONDS = 60
+# Après éviction, le cache disque redescend à cette fraction de sa borne
+DISK_LOW_WATERMARK = 0.9
+
+
+class CachedFile:
+    """Contenu et métadonnées d'un fichier GridFS (interface proche de GridOut)"""
+    __slots__ = ("file_id", "data", "upload_date", "metadata")
+
+    def __init__(self, file_id: str, data: bytes, upload_date: Optional[datetime] = None,
+                 metadata: Optional[Dict] = None):
+        self.file_id = file_id
+        self.data = data
+        self.upload_date = upload_date
+        self.metadata = metadata or {}
+
+    @property
+    def length(self) -> int:
+        return len(self.data)
+
+
+class _DiskTier:
+    """
+    Niveau disque : <dir>/<file_id>.bin et <file_id>.json (date, métadonnées).
+    Le répertoire est partagé par tous les workers : la borne vaut pour la
+    machine. Chaque worker tient un total approché (dernier parcours du
+    répertoire + ses propres écritures) et ne reparcourt le répertoire que
+    lorsque ce total dépasse la borne ou que le dernier parcours date de plus
+    de DISK_RESCAN_SECONDS (écritures des autres workers). L'éviction retire
+    les fichiers les moins récemment lus (mtime, rafraîchi à chaque lecture)
+    jusqu'à DISK_LOW_WATERMARK de la borne.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._enforce_limit()
+
+    def _paths(self, file_id: str):
+        base = os.path.join(self.directory, file_id)
+        return base + ".bin", base + ".json"
+
+    def read(self, file_id: str) -> Optional[CachedFile]:
+        data_path, meta_path = self._paths(file_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                data = f.read()
+            # Lecture récente : le fichier passe en fin d'ordre d'éviction
+            os.utime(data_path)
+        except (OSError, ValueError):
+            return None
+        upload_date = datetime.fromisoformat(meta["upload_date"]) if meta.get("upload_date") else None
+        return CachedFile(file_id, data, upload_date, meta.get("metadata"))
+
+    def write(self, entry: CachedFile) -> None:
+        data_path, meta_path = self._paths(entry.file_id)
+        meta = {
+            "upload_date": entry.upload_date.isoformat() if entry.upload_date else None,
+            "metadata": entry.metadata,
+        }
+        try:
+            # Écriture atomique : un autre worker ne lit jamais un fichier partiel
+            for path, content, mode in ((data_path, entry.data, "wb"),
+                                        (meta_path, json.dumps(meta, default=str), "w")):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, mode) as f:
+                    f.write(content)
+                os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Cache disque GridFS: écriture impossible ({e})")
+            return
+        with self._lock:
+            self._total += entry.length
+            rescan = (self._total > self.max_bytes
+                      or time.monotonic() - self._scanned_at > DISK_RESCAN_SECONDS)
+        if rescan:
+            self._enforce_limit()
+
+    def _enforce_limit(self) -> None:
+        """Mesure le répertoire et, au-delà de la borne, retire les fichiers les moins récemment lus"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".bin"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue  # supprimé entre-temps par un autre worker
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            total = sum(size for _, _, size in entries)
+            if total > self.max_bytes:
+                target = self.max_bytes * DISK_LOW_WATERMARK
+                for _, file_id, size in sorted(entries):
+                    if total <= target:
+                        break
+                    self._delete_files(file_id)
+                    total -= size
+            self._total = total
+            self._scanned_at = time.monotonic()
+
+    def remove(self, file_id: str) -> None:
+        data_path, _ = self._paths(file_id)
+        try:
+            size = os.path.getsize(data_path)
+        except OSError:
+            size = 0
+        self._delete_files(file_id)
+        with self._lock:
+            self._total = max(0, self._total - size)
+
+    def _delete_files(self, file_id: str) -> None:
+        for path in self._paths(file_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class GridFSCache:
+    def __init__(self, max_bytes: int = GRIDFS_CACHE_MAX_BYTES,
+                 max_object_bytes: int = GRIDFS_CACHE_MAX_OBJECT_BYTES,
+                 disk_dir: str = GRIDFS_CACHE_DIR,
+                 disk_max_bytes: int = GRIDFS_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._disk: Optional[_DiskTier] = None
+        if disk_dir:
+            try:
+                self._disk = _DiskTier(disk_dir, disk_max_bytes)
+            except OSError as e:
+                logger.warning(f"Cache disque GridFS désactivé ({disk_dir}): {e}")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def _remember(self, entry: CachedFile) -> None:
+        with self._lock:
+            previous = self._entries.pop(entry.file_id, None)
+            if previous is not None:
+                self._total -= previous.length
+            self._entries[entry.file_id] = entry
+            self._total += entry.length
+            while self._total > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= evicted.length
+                self.evictions += 1
+
+    async def lookup(self, file_id: str) -> Optional[CachedFile]:
+        """Entrée en mémoire ou sur disque, sans accès à GridFS"""
+        file_id = str(file_id)
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                self._entries.move_to_end(file_id)
+                self.memory_hits += 1
+                return entry
+        if self._disk is not None:
+            entry = await run_in_threadpool(self._disk.read, file_id)
+            if entry is not None:
+                self.disk_hits += 1
+                self._remember(entry)
+                return entry
+        return None
+
+    async def store(self, entry: CachedFile) -> None:
+        if entry.length > self.max_object_bytes:
+            return
+        self._remember(entry)
+        if self._disk is not None:
+            await run_in_threadpool(self._disk.write, entry)
+
+    async def get(self, bucket, file_id):
+        """
+        Fichier depuis le cache, ou lu dans GridFS puis mis en cache.
+        Un fichier trop gros n'est pas lu : le flux GridFS déjà ouvert est
+        retourné tel quel, et l'appelant le sert en streaming.
+        Les erreurs GridFS (fichier absent...) sont propagées.
+        """
+        entry = await self.lookup(file_id)
+        if entry is not None:
+            return entry
+
+        self.misses += 1
+        grid_out = await bucket.open_download_stream(file_id)
+        if grid_out.length > self.max_object_bytes:
+            self.bypassed += 1
+            return grid_out
+        entry = CachedFile(str(file_id), await grid_out.read(), grid_out.upload_date, grid_out.metadata)
+        await self.store(entry)
+        return entry
+
+    def invalidate(self, *file_ids) -> None:
+        for file_id in map(str, file_ids):
+            with self._lock:
+                entry = self._entries.pop(file_id, None)
+                if entry is not None:
+                    self._total -= entry.length
+            if self._disk is not None:
+                self._disk.remove(file_id)
+
+    def snapshot(self) -> Dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups * 100, 1) if lookups else 0,
+            "disk": {
+                "directory": self._disk.directory,
+                "bytes": self._disk._total,
+                "max_bytes": self._disk.max_bytes,
+            } if self._disk is not None else None,
+        }
+
+
+gridfs_cache = GridFSCache()
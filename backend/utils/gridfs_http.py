@@ -0,0 +1,134 @@
+# utils/gridfs_http.py
+"""
+Envoi HTTP de fichiers GridFS : streaming par chunks, validation et plages.
+
+- Un fichier GridFS n'est jamais modifié (un nouvel upload crée un nouvel
+  _id) : son identifiant est un ETag fort. Il est connu dès la lecture du
+  document propriétaire, si bien qu'un `If-None-Match` correspondant reçoit
+  un 304 sans ouvrir GridFS.
+- Le contenu est envoyé chunk par chunk (taille des chunks GridFS), sans
+  jamais charger tout le fichier en mémoire.
+- Les requêtes `Range: bytes=...` (une seule plage) reçoivent un 206.
+- Un fichier déjà en cache local (utils.gridfs_cache.CachedFile) est servi
+  depuis la mémoire avec les mêmes en-têtes.
+"""
+
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from utils.gridfs_cache import CachedFile
+
+# Cache navigateur privé, revalidé à chaque affichage (304 sans contenu si inchangé)
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(file_id) -> str:
+    return f'"{file_id}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """`If-None-Match` contient-il l'ETag (ou `*`) ?"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    # Comparaison faible pour If-None-Match (RFC 9110) : W/"x" équivaut à "x"
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+def not_modified(etag: str, extra_headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL, **(extra_headers or {})}
+    )
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage demandée (début, fin incluse), None pour le fichier entier.
+    Seules les plages simples sont gérées ; une plage mal formée est ignorée,
+    416 si elle commence après la fin du fichier.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_str, _, end_str = header[6:].strip().partition("-")
+    try:
+        if not start_str:
+            # Suffixe : les N derniers octets
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(0, length - suffix), length - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else length - 1
+            # Dernier octet avant le premier : en-tête invalide, ignoré (RFC 9110)
+            if end < start:
+                return None
+            end = min(end, length - 1)
+    except ValueError:
+        return None
+    if start >= length:
+        raise HTTPException(
+            status_code=416,
+            detail="Plage demandée invalide",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+
+async def iter_gridfs(grid_out, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Lit [start, end] chunk par chunk"""
+    end = grid_out.length - 1 if end is None else end
+    if isinstance(grid_out, CachedFile):
+        yield grid_out.data[start:end + 1]
+        return
+    remaining = end - start + 1
+    if start:
+        grid_out.seek(start)
+    chunk_size = grid_out.chunk_size or 255 * 1024
+    while remaining > 0:
+        data = await grid_out.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def gridfs_response(request: Request, grid_out, etag: str, media_type: str,
+                    filename: Optional[str] = None,
+                    extra_headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Réponse 200 ou 206 (Range) en streaming, avec en-têtes de cache"""
+    length = grid_out.length
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PRIVATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+    if grid_out.upload_date:
+        headers["Last-Modified"] = grid_out.upload_date.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if filename:
+        headers["Content-Disposition"] = f"inline; filename={filename}"
+
+    byte_range = None
+    # If-Range : la plage n'est servie que si le fichier n'a pas changé
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), length)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(iter_gridfs(grid_out), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_gridfs(grid_out, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
@@ -0,0 +1,57 @@
+# utils/materialized.py
+"""
+Suivi de construction des collections matérialisées (`occupancy`, `counters`,
+`consultation_stats`).
+
+Chaque reconstruction complète enregistre sa date dans `materialized_views`.
+Tant qu'une collection n'a jamais été construite (premier déploiement, base
+restaurée...), la première lecture la reconstruit depuis les collections
+sources : sans cela, toutes les journées paraîtraient libres et les compteurs
+resteraient à zéro jusqu'au lancement manuel des scripts rebuild_*.py.
+Rien n'est fait au démarrage : la vérification a lieu à la première lecture,
+puis au plus une fois par CHECK_INTERVAL_SECONDS et par worker.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+from database import db
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+views_collection = db["materialized_views"]
+
+CHECK_INTERVAL_SECONDS = 60
+
+_checked_at: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def mark_built(name: str) -> None:
+    """Enregistre la reconstruction complète d'une collection"""
+    views_collection.update_one(
+        {"_id": name},
+        {"$set": {"built_at": datetime.utcnow()}},
+        upsert=True
+    )
+    _checked_at[name] = time.monotonic()
+
+
+def ensure_built(name: str, rebuild: Callable[[], int]) -> None:
+    """
+    Reconstruit la collection `name` si elle ne l'a jamais été.
+    `rebuild` doit appeler mark_built une fois terminé.
+    """
+    if time.monotonic() - _checked_at.get(name, float("-inf")) < CHECK_INTERVAL_SECONDS:
+        return
+    with _lock:
+        if time.monotonic() - _checked_at.get(name, float("-inf")) < CHECK_INTERVAL_SECONDS:
+            return
+        if views_collection.find_one({"_id": name}, {"_id": 1}) is None:
+            logger.info(f"Collection matérialisée '{name}' jamais construite : reconstruction")
+            rebuild()
+        _checked_at[name] = time.monotonic()
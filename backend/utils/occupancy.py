@@ -0,0 +1,301 @@
+# utils/occupancy.py
+"""
+Occupation matérialisée des plannings : un document par (medecin_id, date).
+
+Chaque document de la collection `occupancy` contient :
+- `slots` : nombre de RDV actifs par créneau de 15 min ("HH:MM" -> n) ;
+  un RDV de `duree` minutes compte dans chacun des créneaux qu'il recouvre
+- `count` : nombre total de RDV actifs de la journée
+
+Il est maintenu par `$inc` atomiques à chaque création, modification et
+suppression de rendez-vous, et peut être reconstruit depuis `rendezvous`
+(voir rebuild_occupancy.py). Les requêtes de disponibilité deviennent ainsi
+une lecture ponctuelle indexée au lieu d'un parcours des rendez-vous.
+
+Toutes les lectures passent par find_days :
+- une collection jamais construite (premier déploiement) est reconstruite à
+  la première lecture (utils.materialized) ;
+- le `$inc` suit l'écriture du rendez-vous sans transaction (MongoDB autonome).
+  S'il échoue, la journée est marquée `stale` (ou retenue en mémoire si la
+  marque ne peut pas être écrite) et recalculée depuis `rendezvous` à sa
+  prochaine lecture. Un arrêt du processus entre les deux écritures n'est pas
+  couvert : rebuild_occupancy.py reste la référence.
+"""
+
+from datetime import datetime, date
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from database import db
+from utils import materialized
+from ai import schedule_bitmap as bitmap
+from ai.interval_index import DayIntervals
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+occupancy_collection = db["occupancy"]
+rendezvous_collection = db["rendezvous"]
+
+CANCELLED_STATUS = "annule"
+DEFAULT_DURATION = 15  # minutes (RDV antérieurs sans `duree`)
+VIEW_NAME = "occupancy"
+
+# Journées dont le `$inc` et la marque `stale` ont échoué : (medecin_id, date)
+_pending_days = set()
+
+
+def format_rdv_date(value) -> str:
+    """Normalise la date d'un RDV au format YYYY-MM-DD"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def is_active(rdv: dict) -> bool:
+    """Un RDV occupe un créneau tant qu'il n'est pas annulé"""
+    return rdv.get("statut", "programme") != CANCELLED_STATUS
+
+
+def occupancy_key(rdv: dict) -> tuple:
+    return (str(rdv["medecin_id"]), format_rdv_date(rdv["date_rendez_vous"]))
+
+
+def rdv_duration(rdv: dict) -> int:
+    """Durée d'un RDV en minutes"""
+    try:
+        return max(1, int(rdv.get("duree") or DEFAULT_DURATION))
+    except (TypeError, ValueError):
+        return DEFAULT_DURATION
+
+
+def covered_slots(heure: str, duree: int = DEFAULT_DURATION) -> List[str]:
+    """
+    Créneaux de 15 min recouverts par un RDV commençant à `heure` et durant
+    `duree` minutes, limités à la journée de travail : un RDV à 07:45 de 30 min
+    occupe 08:00. Vide si le RDV est entièrement hors horaires.
+    """
+    start = bitmap.time_to_minutes(heure)
+    if start is None:
+        return []
+    first = max(0, (start - bitmap.DAY_START_MINUTES) // bitmap.SLOT_MINUTES)
+    last = min(-(-(start + duree - bitmap.DAY_START_MINUTES) // bitmap.SLOT_MINUTES), bitmap.SLOT_COUNT)
+    return [bitmap.slot_label(i) for i in range(first, last)]
+
+
+def apply_rendezvous(rdv: dict, delta: int) -> None:
+    """
+    Ajoute (delta=+1) ou retire (delta=-1) un RDV de l'occupation de sa journée.
+    Les RDV annulés n'occupent aucun créneau.
+    """
+    if not rdv or not is_active(rdv):
+        return
+
+    medecin_id, date_str = occupancy_key(rdv)
+    increments = {"count": delta}
+    for label in covered_slots(rdv.get("heure", ""), rdv_duration(rdv)):
+        increments[f"slots.{label}"] = delta
+
+    try:
+        occupancy_collection.update_one(
+            {"medecin_id": medecin_id, "date": date_str},
+            {
+                "$inc": increments,
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+    except PyMongoError as e:
+        logger.error(f"Occupation non mise à jour ({medecin_id} {date_str}), journée à recalculer: {e}")
+        _mark_stale(medecin_id, date_str)
+
+
+def _mark_stale(medecin_id: str, date_str: str) -> None:
+    try:
+        occupancy_collection.update_one(
+            {"medecin_id": medecin_id, "date": date_str},
+            {"$set": {"stale": True}},
+            upsert=True
+        )
+    except PyMongoError:
+        _pending_days.add((medecin_id, date_str))
+
+
+def replace_rendezvous(old: Optional[dict], new: Optional[dict]) -> None:
+    """Répercute la modification d'un RDV (déplacement, changement de statut)"""
+    fields = ("medecin_id", "date_rendez_vous", "heure", "duree", "statut")
+    if old and new and all(old.get(f) == new.get(f) for f in fields):
+        return
+    apply_rendezvous(old, -1)
+    apply_rendezvous(new, +1)
+
+
+def day_mask(doc: Optional[dict]) -> int:
+    """Masque des créneaux occupés d'un document d'occupation"""
+    if not doc:
+        return 0
+    return bitmap.mask_from_times(
+        heure for heure, n in (doc.get("slots") or {}).items() if n > 0
+    )
+
+
+def day_intervals(doc: Optional[dict]) -> DayIntervals:
+    """Index des intervalles occupés d'un document d'occupation"""
+    return DayIntervals.from_mask(day_mask(doc))
+
+
+def occupied_times(doc: Optional[dict]) -> List[str]:
+    """
+    Créneaux de 15 min couverts par les RDV, triés (répétés si plusieurs RDV
+    recouvrent le même créneau) ; un RDV de 30 min y figure deux fois.
+    Pour les heures de début des RDV, voir start_times.
+    """
+    if not doc:
+        return []
+    times = []
+    for heure, n in sorted((doc.get("slots") or {}).items()):
+        times.extend([heure] * max(0, n))
+    return times
+
+
+def start_times(medecin_id: str, date_str: str) -> List[str]:
+    """Heures de début des RDV actifs d'une journée, triées"""
+    cursor = rendezvous_collection.find(
+        {
+            "medecin_id": medecin_id,
+            "date_rendez_vous": date_str,
+            "statut": {"$ne": CANCELLED_STATUS}
+        },
+        {"heure": 1, "_id": 0}
+    )
+    return sorted(rdv["heure"] for rdv in cursor if rdv.get("heure"))
+
+
+def find_days(medecin_ids: List[str], start: str, end: str) -> Iterator[dict]:
+    """
+    Documents d'occupation de plusieurs médecins entre deux dates incluses.
+    Construit la collection au premier usage et recalcule les journées marquées `stale`.
+    """
+    materialized.ensure_built(VIEW_NAME, rebuild_occupancy)
+    for medecin_id, date_str in list(_pending_days):
+        try:
+            rebuild_day(medecin_id, date_str)
+            _pending_days.discard((medecin_id, date_str))
+        except PyMongoError as e:
+            logger.warning(f"Journée {medecin_id} {date_str} toujours à recalculer: {e}")
+
+    cursor = occupancy_collection.find({
+        "medecin_id": {"$in": list(medecin_ids)},
+        "date": {"$gte": start, "$lte": end}
+    })
+    for doc in cursor:
+        if doc.get("stale"):
+            doc = rebuild_day(doc["medecin_id"], doc["date"])
+            if doc is None:
+                continue
+        yield doc
+
+
+def get_day_occupancy(medecin_id: str, date_str: str) -> Optional[dict]:
+    """Lecture ponctuelle de l'occupation d'une journée"""
+    return next(find_days([medecin_id], date_str, date_str), None)
+
+
+def get_occupancy_range(medecin_id: str, start: str, end: str) -> Dict[str, dict]:
+    """Occupation d'un médecin entre deux dates incluses : {date: document}"""
+    return {doc["date"]: doc for doc in find_days([medecin_id], start, end)}
+
+
+def _aggregate_days(match: dict) -> Dict[tuple, dict]:
+    """Occupation calculée depuis `rendezvous` : {(medecin_id, date): {"slots", "count"}}"""
+    match = {**match, "statut": {"$ne": CANCELLED_STATUS}}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "medecin_id": "$medecin_id",
+                "date": {
+                    "$cond": [
+                        {"$eq": [{"$type": "$date_rendez_vous"}, "date"]},
+                        {"$dateToString": {"format": "%Y-%m-%d", "date": "$date_rendez_vous"}},
+                        "$date_rendez_vous"
+                    ]
+                },
+                "heure": "$heure",
+                "duree": "$duree"
+            },
+            "n": {"$sum": 1}
+        }}
+    ]
+
+    days: Dict[tuple, dict] = {}
+    for row in rendezvous_collection.aggregate(pipeline, allowDiskUse=True):
+        key = (str(row["_id"]["medecin_id"]), format_rdv_date(row["_id"]["date"]))
+        day = days.setdefault(key, {"slots": {}, "count": 0})
+        day["count"] += row["n"]
+        duree = rdv_duration(row["_id"])
+        for label in covered_slots(row["_id"].get("heure") or "", duree):
+            day["slots"][label] = day["slots"].get(label, 0) + row["n"]
+    return days
+
+
+def rebuild_day(medecin_id: str, date_str: str) -> Optional[dict]:
+    """Recalcule l'occupation d'une journée ; retourne le document (None si plus aucun RDV actif)"""
+    day_start = datetime.strptime(date_str, "%Y-%m-%d")
+    day = _aggregate_days({
+        "medecin_id": medecin_id,
+        "date_rendez_vous": {"$in": [date_str, day_start]}
+    }).get((medecin_id, date_str))
+    key = {"medecin_id": medecin_id, "date": date_str}
+    if not day:
+        occupancy_collection.delete_one(key)
+        return None
+    doc = {**key, "slots": day["slots"], "count": day["count"], "updated_at": datetime.utcnow()}
+    occupancy_collection.replace_one(key, doc, upsert=True)
+    return doc
+
+
+def rebuild_occupancy(medecin_id: Optional[str] = None) -> int:
+    """
+    Reconstruit l'occupation depuis la collection `rendezvous`
+    (tous les médecins, ou un seul). Retourne le nombre de journées écrites.
+    """
+    days = _aggregate_days({"medecin_id": medecin_id} if medecin_id else {})
+
+    now = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"medecin_id": medecin, "date": date_str},
+            {
+                "medecin_id": medecin,
+                "date": date_str,
+                "slots": day["slots"],
+                "count": day["count"],
+                "updated_at": now
+            },
+            upsert=True
+        )
+        for (medecin, date_str), day in days.items()
+    ]
+
+    if operations:
+        occupancy_collection.bulk_write(operations, ordered=False)
+
+    # Les journées sans plus aucun RDV actif (non réécrites ci-dessus) sont supprimées
+    stale_filter = {"updated_at": {"$lt": now}}
+    if medecin_id:
+        stale_filter["medecin_id"] = medecin_id
+    occupancy_collection.delete_many(stale_filter)
+
+    if not medecin_id:
+        materialized.mark_built(VIEW_NAME)
+    logger.info(f"Occupation reconstruite: {len(operations)} journées")
+    return len(operations)
+
+
+def ensure_indexes() -> None:
+    """Index de lecture ponctuelle (medecin_id, date)"""
+    occupancy_collection.create_index([("medecin_id", 1), ("date", 1)], unique=True)
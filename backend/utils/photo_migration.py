@@ -0,0 +1,187 @@
+# utils/photo_migration.py
+"""
+Migration des photos stockées en base64 dans les documents patients
+(`photo_data`) vers le bucket GridFS `patient_photos`.
+
+Pour chaque patient ayant un champ `photo_data` :
+- si une photo GridFS existe déjà (`photo_file_id`), elle fait foi et le
+  champ inline est simplement retiré ;
+- sinon l'image est décodée, déclinée en variantes (comme à l'upload), les
+  fichiers sont écrits dans GridFS puis le document reçoit `photo_file_id`,
+  `photo_variants` et `photo_url`, et perd `photo_data`.
+
+Les mises à jour sont appliquées par lots (`bulk_write`). La migration est
+reprenable : seuls les documents ayant encore `photo_data` sont lus, et les
+fichiers d'une exécution interrompue avant la mise à jour du patient
+(marqués `metadata.source = "photo_data"`) sont supprimés avant réécriture.
+Si une photo a été uploadée entre-temps, la mise à jour ne correspond à aucun
+document : les variantes écrites pour ce patient sont alors supprimées et le
+patient compté comme ignoré. Les images illisibles sont laissées en place et
+comptées en erreur ; en simulation, les variantes sont calculées sans être
+écrites, si bien que les mêmes images y sont signalées.
+"""
+
+import base64
+import binascii
+import io
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from bson import ObjectId
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import UpdateOne
+
+from database import db
+from utils.photo_processing import (
+    render_variants, PhotoProcessingError, VARIANT_FORMATS, MAIN_VARIANT, variant_key
+)
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+patients_collection = db["patients"]
+photos_bucket = GridFSBucket(db, bucket_name="patient_photos")
+photo_files_collection = db["patient_photos.files"]
+
+SOURCE = "photo_data"
+
+
+def decode_photo_data(photo_data: str) -> bytes:
+    """Contenu d'un champ base64, avec ou sans préfixe data URI"""
+    if photo_data.startswith("data:"):
+        photo_data = photo_data.split(",", 1)[-1]
+    return base64.b64decode(photo_data, validate=False)
+
+
+def _discard_partial_upload(patient_id: str) -> None:
+    for orphan in photo_files_collection.find(
+        {"metadata.patient_id": patient_id, "metadata.source": SOURCE}, {"_id": 1}
+    ):
+        photos_bucket.delete(orphan["_id"])
+
+
+def _store_variants(patient: dict, content: bytes) -> Dict[str, str]:
+    patient_id = str(patient["_id"])
+    _discard_partial_upload(patient_id)
+    photo_variants = {}
+    for size, fmt, data in render_variants(content):
+        file_id = photos_bucket.upload_from_stream(
+            f"patient_{patient_id}_{size}.{fmt}",
+            io.BytesIO(data),
+            metadata={
+                "patient_id": patient_id,
+                "original_filename": patient.get("photo_filename"),
+                "content_type": VARIANT_FORMATS[fmt],
+                "variant": variant_key(size, fmt),
+                "size": size,
+                "uploaded_by": "migration",
+                "source": SOURCE,
+                "file_size": len(data)
+            }
+        )
+        photo_variants[variant_key(size, fmt)] = str(file_id)
+    return photo_variants
+
+
+def _delete_variants(photo_variants: Dict[str, str]) -> None:
+    for file_id in photo_variants.values():
+        try:
+            photos_bucket.delete(ObjectId(file_id))
+        except NoFile:
+            pass
+
+
+def migrate_inline_photos(batch_size: int = 100, limit: Optional[int] = None,
+                          dry_run: bool = False,
+                          on_batch: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Migre les photos inline ; retourne les compteurs (patients migrés, champs
+    seulement retirés, patients ignorés car modifiés pendant la migration,
+    erreurs, octets base64 retirés des documents)
+    """
+    stats = {"migrated": 0, "dropped": 0, "skipped": 0, "errors": 0, "bytes_reclaimed": 0}
+    failed = []
+    operations = []
+    pending = []  # (patient_id, variantes écrites ou None, octets base64) par opération
+
+    def release_unmatched(items):
+        # Seuls les patients qui portent désormais nos variantes ont été mis à jour
+        migrated = [(patient_id, variants, size) for patient_id, variants, size in items if variants]
+        if not migrated:
+            return
+        linked = {
+            doc["_id"] for doc in patients_collection.find(
+                {
+                    "_id": {"$in": [patient_id for patient_id, _, _ in migrated]},
+                    "photo_file_id": {"$in": [variants[MAIN_VARIANT] for _, variants, _ in migrated]}
+                },
+                {"_id": 1}
+            )
+        }
+        for patient_id, variants, size in migrated:
+            if patient_id in linked:
+                continue
+            logger.warning(f"Photo du patient {patient_id} modifiée pendant la migration, variantes supprimées")
+            _delete_variants(variants)
+            stats["migrated"] -= 1
+            stats["skipped"] += 1
+            stats["bytes_reclaimed"] -= size
+
+    def flush():
+        if operations and not dry_run:
+            result = patients_collection.bulk_write(operations, ordered=False)
+            if result.matched_count < len(operations):
+                release_unmatched(pending)
+        operations.clear()
+        pending.clear()
+        if on_batch:
+            on_batch(stats)
+
+    query = {"photo_data": {"$exists": True}}
+    cursor = patients_collection.find(
+        query,
+        {"photo_data": 1, "photo_file_id": 1, "photo_filename": 1}
+    ).sort("_id", 1).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    for patient in cursor:
+        photo_data = patient.get("photo_data") or ""
+        now = datetime.utcnow()
+        update = {"$unset": {"photo_data": ""}, "$set": {"updated_at": now}}
+        photo_variants = None
+
+        if patient.get("photo_file_id") or not photo_data:
+            stats["dropped"] += 1
+        else:
+            try:
+                content = decode_photo_data(photo_data)
+                if dry_run:
+                    # Mêmes traitements qu'en migration réelle, sans écriture
+                    render_variants(content)
+                else:
+                    photo_variants = _store_variants(patient, content)
+                    update["$set"].update({
+                        "photo_file_id": photo_variants[MAIN_VARIANT],
+                        "photo_variants": photo_variants,
+                        "photo_url": f"/patients/id/{patient['_id']}/photo",
+                    })
+                stats["migrated"] += 1
+            except (binascii.Error, ValueError, PhotoProcessingError) as e:
+                logger.warning(f"Photo inline illisible pour le patient {patient['_id']}: {e}")
+                stats["errors"] += 1
+                failed.append(str(patient["_id"]))
+                continue
+
+        stats["bytes_reclaimed"] += len(photo_data)
+        # Une photo uploadée pendant la migration n'est pas écrasée
+        operations.append(UpdateOne({"_id": patient["_id"], "photo_file_id": patient.get("photo_file_id")}, update))
+        pending.append((patient["_id"], photo_variants, len(photo_data)))
+        if len(operations) >= batch_size:
+            flush()
+
+    flush()
+    stats["failed_ids"] = failed
+    return stats
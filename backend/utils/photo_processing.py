@@ -0,0 +1,251 @@
+# utils/photo_processing.py
+"""
+Traitement des photos patients hors de la boucle d'événements.
+
+Le décodage, la mise à plat de la transparence, le redimensionnement LANCZOS
+et l'encodage JPEG sont exécutés dans un pool de processus borné :
+- PHOTO_WORKERS processus (créés à la première photo, arrêtés à l'extinction) ;
+- au plus PHOTO_MAX_PENDING traitements en cours ou en attente par worker
+  FastAPI, au-delà l'upload est refusé (503) plutôt que d'empiler la mémoire.
+
+Les JPEG sont décodés en mode « draft » : libjpeg réduit l'image d'un facteur
+1/2, 1/4 ou 1/8 pendant le décodage, ce qui évite de décoder une photo de
+12 Mpx en pleine résolution avant de la ramener à 800x600.
+
+À l'upload, une photo est déclinée en variantes (VARIANT_SIZES x JPEG/WebP)
+à partir d'un seul décodage : chaque taille est réduite depuis la précédente.
+
+Les mesures (profondeur de file, temps d'attente et de traitement) sont
+exposées par `photo_pipeline.snapshot()`.
+"""
+
+import asyncio
+import io
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from config import PHOTO_WORKERS, PHOTO_MAX_PENDING
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+PHOTO_MAX_WIDTH = 800
+PHOTO_MAX_HEIGHT = 600
+PHOTO_QUALITY = 85
+WEBP_QUALITY = 80
+
+# Variantes générées à l'upload : plus grand côté (px) ; la plus grande garde
+# le cadre 800x600 de la photo principale
+VARIANT_SIZES = (800, 400, 128, 48)
+VARIANT_FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp"}
+MAIN_VARIANT = "800.jpeg"
+
+# Nombre de durées conservées pour le calcul des percentiles
+LATENCY_WINDOW = 500
+
+
+class PhotoProcessingError(ValueError):
+    """Image illisible ou format non géré"""
+
+
+class PipelineBusy(RuntimeError):
+    """File de traitement pleine"""
+
+
+def variant_key(size: int, fmt: str) -> str:
+    return f"{size}.{fmt}"
+
+
+def _load(image_data: bytes, max_width: int, max_height: int) -> "Image.Image":
+    """Décode l'image à la taille cible, fond blanc sous la transparence"""
+    image = Image.open(io.BytesIO(image_data))
+
+    # JPEG : réduction à la volée pendant le décodage (facteur 1/2 à 1/8),
+    # la taille obtenue reste supérieure ou égale à la cible
+    if image.format == "JPEG":
+        image.draft("RGB", (max_width, max_height))
+
+    # Convertir en RGB si nécessaire (pour PNG avec transparence)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    # Redimensionner en gardant les proportions
+    image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+    return image
+
+
+def _encode(image: "Image.Image", fmt: str) -> bytes:
+    output = io.BytesIO()
+    if fmt == "webp":
+        image.save(output, format='WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(output, format='JPEG', quality=PHOTO_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def resize_image(image_data: bytes, max_width: int = PHOTO_MAX_WIDTH,
+                 max_height: int = PHOTO_MAX_HEIGHT) -> bytes:
+    """Redimensionner l'image (JPEG optimisé, fond blanc sous la transparence)"""
+    try:
+        return _encode(_load(image_data, max_width, max_height), "jpeg")
+    except Exception as e:
+        raise PhotoProcessingError(str(e)) from e
+
+
+def render_variants(image_data: bytes) -> List[Tuple[int, str, bytes]]:
+    """Toutes les variantes (taille, format, contenu), de la plus grande à la plus petite"""
+    try:
+        image = _load(image_data, PHOTO_MAX_WIDTH, PHOTO_MAX_HEIGHT)
+        variants = []
+        for size in VARIANT_SIZES:
+            if size < PHOTO_MAX_WIDTH:
+                image = image.copy()
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for fmt in VARIANT_FORMATS:
+                variants.append((size, fmt, _encode(image, fmt)))
+        return variants
+    except Exception as e:
+        raise PhotoProcessingError(str(e)) from e
+
+
+def pick_variant(variants: Dict[str, str], size: Optional[int], accept: str) -> Optional[str]:
+    """
+    Variante à servir : la plus petite taille couvrant `size` (la plus grande
+    sinon), en WebP si le client l'accepte
+    """
+    fmt = "webp" if "image/webp" in (accept or "") else "jpeg"
+    candidates = sorted(s for s in VARIANT_SIZES if variant_key(s, fmt) in variants)
+    if not candidates:
+        return None
+    chosen = next((s for s in candidates if size and s >= size), candidates[-1])
+    return variant_key(chosen, fmt)
+
+
+def _timed(func, *args):
+    """Exécuté dans un processus du pool : retourne le résultat et la durée (ms)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+class PhotoPipeline:
+    """Pool de processus borné pour le traitement des photos, avec mesures"""
+
+    def __init__(self, workers: int = PHOTO_WORKERS, max_pending: int = PHOTO_MAX_PENDING):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.running = 0
+        self.processed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._processing_ms = deque(maxlen=LATENCY_WINDOW)
+        self._wait_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._semaphore = asyncio.Semaphore(self.workers)
+            logger.info(f"Pool de traitement des photos démarré ({self.workers} processus)")
+        return self._executor
+
+    async def resize(self, image_data: bytes, max_width: int = PHOTO_MAX_WIDTH,
+                     max_height: int = PHOTO_MAX_HEIGHT) -> bytes:
+        """Redimensionne une image dans le pool"""
+        return await self._run(resize_image, image_data, max_width, max_height)
+
+    async def variants(self, image_data: bytes) -> List[Tuple[int, str, bytes]]:
+        """Génère toutes les variantes d'une photo dans le pool"""
+        return await self._run(render_variants, image_data)
+
+    async def _run(self, func, *args):
+        """Exécute `func(*args)` dans le pool ; PipelineBusy si la file est pleine"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PipelineBusy(f"{self.pending} photos en cours de traitement")
+
+        executor = self._get_executor()
+        self.pending += 1
+        self.max_depth = max(self.max_depth, self.pending)
+        queued_at = time.perf_counter()
+        try:
+            # Au plus un traitement soumis par processus : l'attente reste ici, mesurable
+            async with self._semaphore:
+                self._wait_ms.append((time.perf_counter() - queued_at) * 1000)
+                self.running += 1
+                try:
+                    result, elapsed_ms = await asyncio.get_running_loop().run_in_executor(
+                        executor, _timed, func, *args
+                    )
+                finally:
+                    self.running -= 1
+        except BrokenProcessPool:
+            # Processus tué (mémoire...) : le pool sera recréé à la prochaine photo
+            logger.error("Pool de traitement des photos interrompu, redémarrage")
+            self.errors += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.processed += 1
+        self._processing_ms.append(elapsed_ms)
+        return result
+
+    def snapshot(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "queue_depth": self.pending - self.running,
+            "running": self.running,
+            "max_queue_depth": self.max_depth,
+            "max_pending": self.max_pending,
+            "processed": self.processed,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "processing_ms": {
+                "avg": round(sum(self._processing_ms) / len(self._processing_ms), 1) if self._processing_ms else 0,
+                "p50": _percentile(self._processing_ms, 0.50),
+                "p95": _percentile(self._processing_ms, 0.95),
+                "max": round(max(self._processing_ms), 1) if self._processing_ms else 0,
+            },
+            "wait_ms": {
+                "p50": _percentile(self._wait_ms, 0.50),
+                "p95": _percentile(self._wait_ms, 0.95),
+            },
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._semaphore = None
+
+
+photo_pipeline = PhotoPipeline()
@@ -0,0 +1,141 @@
+# utils/response_cache.py
+"""
+Cache des réponses des routes de statistiques, avec invalidation par tags.
+
+- Chaque entrée a une durée de vie (TTL) et une liste de tags, par ex.
+  "consultations" (périmètre global) ou "consultations:<medecin_id>".
+- Les routes d'écriture appellent `invalidate(kind, medecin_id)` : les tags
+  du médecin et le tag global du même type sont invalidés.
+- L'invalidation incrémente une version par tag (O(nombre de tags)) ; une
+  entrée n'est valide que si les versions de ses tags n'ont pas bougé depuis
+  son calcul. Un calcul concurrent d'une invalidation n'est donc jamais servi.
+- Les requêtes simultanées sur une même clé attendent un seul calcul.
+
+Le cache est local au processus : dans un déploiement multi-workers, les
+invalidations des autres workers sont bornées par le TTL.
+"""
+
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config import STATS_CACHE_TTL, STATS_CACHE_MAX_ENTRIES
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = STATS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[Tuple[str, int], ...], Any]]" = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()  # Invalidations depuis les routes synchrones (threadpool)
+        self.hits = 0
+        self.misses = 0
+
+    def _snapshot(self, tags: Iterable[str]) -> Tuple[Tuple[str, int], ...]:
+        return tuple((tag, self._tag_versions.get(tag, 0)) for tag in sorted(set(tags)))
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, snapshot, value = entry
+            fresh = expires_at > time.monotonic() and all(
+                self._tag_versions.get(tag, 0) == version for tag, version in snapshot
+            )
+            if not fresh:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def _store(self, key: str, ttl: float, snapshot, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, snapshot, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, ttl: float, tags: Iterable[str],
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        with self._lock:
+            snapshot = self._snapshot(tags)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Marquée comme consultée si personne n'attend
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self._store(key, ttl, snapshot, value)
+        future.set_result(value)
+        return value
+
+    def invalidate_tags(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    def invalidate(self, kind: str, *medecin_ids: Optional[str]) -> None:
+        """Invalide le périmètre global d'un type de données et ceux des médecins donnés"""
+        self.invalidate_tags(kind, *(f"{kind}:{mid}" for mid in medecin_ids if mid))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(namespace: str, tags: Callable[..., Iterable[str]],
+                    ttl: float = STATS_CACHE_TTL):
+    """
+    Décorateur de route FastAPI : met en cache la réponse selon les paramètres
+    de la route. `tags` reçoit les mêmes paramètres et retourne les tags de l'entrée.
+    Les routes synchrones sont exécutées dans le threadpool, comme par FastAPI.
+    """
+    def decorator(func):
+        is_async = asyncio.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            key = f"{namespace}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+
+            async def compute():
+                if is_async:
+                    return await func(**kwargs)
+                return await run_in_threadpool(func, **kwargs)
+
+            return await response_cache.get_or_compute(key, ttl, tags(**kwargs), compute)
+
+        return wrapper
+    return decorator
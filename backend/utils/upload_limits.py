@@ -0,0 +1,112 @@
+# utils/upload_limits.py
+"""
+Uploads à taille bornée.
+
+- `UploadSizeLimitMiddleware` plafonne le corps des requêtes d'upload avant
+  l'analyse multipart : un `Content-Length` trop grand reçoit un 413 sans
+  lecture du corps, et le flux (y compris en transfert chunked) est compté
+  au fil de la réception, interrompu par un 413 dès que le plafond est franchi.
+- `read_capped` lit ensuite le fichier par blocs avec le plafond exact du
+  fichier, et identifie le type réel de l'image par ses octets magiques au
+  lieu de se fier à l'extension.
+"""
+
+import re
+from typing import Optional, Pattern, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+# En-têtes multipart (boundary, Content-Disposition...) autour du fichier
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Octets magiques des formats d'image acceptés
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+
+def too_large_detail(max_bytes: int) -> str:
+    return f"Fichier trop volumineux. Taille maximum: {max_bytes // (1024 * 1024)}MB"
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Type MIME d'après les premiers octets, None si le format n'est pas accepté"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+async def read_capped(upload: UploadFile, max_bytes: int) -> Tuple[bytes, str]:
+    """
+    Lit un fichier uploadé par blocs : 413 dès que `max_bytes` est dépassé,
+    400 si le premier bloc n'est pas une image JPEG ou PNG.
+    Retourne le contenu et le type détecté.
+    """
+    chunks = []
+    total = 0
+    content_type = None
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        if content_type is None:
+            content_type = sniff_image_type(chunk)
+            if content_type is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Format de fichier non supporté. Utilisez JPG, JPEG ou PNG."
+                )
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(status_code=413, detail=too_large_detail(max_bytes))
+        chunks.append(chunk)
+
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="Fichier vide")
+    return b"".join(chunks), content_type
+
+
+class UploadSizeLimitMiddleware:
+    """Middleware ASGI : plafonne le corps des requêtes POST/PUT sur les chemins donnés"""
+
+    def __init__(self, app, path_pattern: str, max_bytes: int):
+        self.app = app
+        self.path_pattern: Pattern = re.compile(path_pattern)
+        self.max_body = max_bytes + MULTIPART_OVERHEAD
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in ("POST", "PUT")
+                or not self.path_pattern.match(scope["path"])):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_body:
+            logger.warning(f"Upload refusé ({int(declared)} octets annoncés): {scope['path']}")
+            response = JSONResponse({"detail": too_large_detail(self.max_bytes)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Remonte à travers l'analyse du formulaire jusqu'au gestionnaire d'exceptions
+                    raise HTTPException(status_code=413, detail=too_large_detail(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
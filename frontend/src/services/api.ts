@@ -207,6 +207,31 @@ export const patientsApi = {
     return `${API_BASE_URL}/patients/id/${patientId}/photo`;
   },
 
+  // Avatars de plusieurs patients en une requête (data URI par patient)
+  async getPhotosBatch(
+    patientIds: string[],
+    size = 48,
+  ): Promise<{ size: number; photos: Record<string, string>; missing: string[] }> {
+    const response = await fetch(`${API_BASE_URL}/patients/photos/batch`, {
+      method: "POST",
+      headers: {
+        Authorization: `Bearer ${getAuthToken()}`,
+        "Content-Type": "application/json",
+        Accept: "application/json, image/webp",
+      },
+      body: JSON.stringify({ patient_ids: patientIds, size }),
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(
+        errorData.detail || "Erreur lors de la récupération des photos",
+      );
+    }
+
+    return response.json();
+  },
+
   // Méthode pour supprimer une photo
   async deletePhoto(patientId: string): Promise<{ message: string }> {
     // ✅ URL CORRIGÉE avec /id/